@@ -0,0 +1,234 @@
+"""In-process job queue that runs graph generation on a bounded pool of background workers."""
+
+from __future__ import annotations
+
+import asyncio
+import re
+import shutil
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import abort_manager
+import graph_generator as gg
+import llm_api
+
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = {COMPLETED, FAILED, CANCELLED}
+
+# "[1/3] Building graph  45%  (4 in flight, limit 8)" -> "[1/3] Building graph"
+_PROGRESS_VALUE = re.compile(r"\s*\d+%.*$", re.DOTALL)
+
+
+def progress_stage(message: str) -> str:
+    """Returns the part of a progress message that names the stage, without its percentage."""
+    return _PROGRESS_VALUE.sub("", message).strip()
+
+
+class QueueFullError(Exception):
+    """Raised when no more jobs can be queued."""
+
+
+class Job:
+    """One generation request: its uploaded files, runtime config, progress log and outputs.
+
+    Log and error messages are kept in order. Progress messages only update the latest line
+    of their stage, so a stage that reports every page costs one dict entry, not a log entry
+    per update. Every change bumps `revision` and wakes the listeners in wait_for_change().
+    """
+
+    def __init__(self, files: List[Path], config: Dict, upload_dir: Path, outputs_url: str) -> None:
+        self.id = uuid.uuid4().hex
+        self.status = QUEUED
+        self.files = files
+        self.upload_dir = upload_dir
+        # Every job writes into its own folder, so its outputs are exactly the files in it.
+        self.config = dict(config, output_folder=str(Path(config["output_folder"]) / self.id))
+        self.outputs_url = f"{outputs_url}/{self.id}"
+        self.logs: List[Dict[str, str]] = []
+        self.outputs: List[str] = []
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.cancel_token = abort_manager.CancellationToken()
+        self.progress_lines: Dict[str, str] = {}
+        self.revision = 0
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+        self._wake_pending = False
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def progress(self, message: str, type_name: str = "progress") -> None:
+        """progress_callback for the pipeline; may be called from worker threads."""
+        # Avoid leaking API keys or other sensitive values
+        if type_name == "log" and "api_key" in message.lower():
+            return
+        if type_name == "progress":
+            self.progress_lines[progress_stage(message)] = message
+        else:
+            self.logs.append({"type": type_name, "message": message})
+        self.mark_changed()
+
+    def mark_changed(self) -> None:
+        self.revision += 1
+        # At most one wake-up is scheduled at a time, however often the pipeline reports.
+        if not self._wake_pending:
+            self._wake_pending = True
+            self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self) -> None:
+        self._wake_pending = False
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait_for_change(self, revision: int, timeout: float) -> None:
+        """Returns once the job has changed since `revision`, or after `timeout` seconds."""
+        if self.revision != revision:
+            return
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def summary(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "documents": [path.name for path in self.files],
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "log_entries": len(self.logs),
+            "progress": list(self.progress_lines.values()),
+            "outputs": self.outputs,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """Queues jobs and runs at most `workers` of them at once.
+
+    Each job runs in its own asyncio task with its own config and cancellation token, so
+    cancelling it, or a failure inside it, stops its in-flight requests and worker threads
+    without touching the other jobs. Finished jobs are kept for status
+    queries until more than `max_finished` have piled up.
+    """
+
+    def __init__(self, workers: int = 2, max_queued: int = 50, max_finished: int = 200) -> None:
+        self.worker_count = max(1, workers)
+        self.max_queued = max(1, max_queued)
+        self.max_finished = max_finished
+        self.jobs: Dict[str, Job] = {}
+        self.queue: Optional[asyncio.Queue] = None
+        self.workers: List[asyncio.Task] = []
+        self._finished_ids: deque = deque()
+
+    async def start(self) -> None:
+        self.queue = asyncio.Queue(maxsize=self.max_queued)
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self) -> None:
+        for job in self.jobs.values():
+            if job.task is not None:
+                job.task.cancel()
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def is_full(self) -> bool:
+        return self.queue is None or self.queue.full()
+
+    def submit(self, files: List[Path], config: Dict, upload_dir: Path, outputs_url: str) -> Job:
+        """Queues a job; its HTML files are written below config["output_folder"] and served under outputs_url."""
+        if self.is_full():
+            raise QueueFullError("Too many queued jobs, try again later.")
+
+        job = Job(files, config, upload_dir, outputs_url)
+        self.queue.put_nowait(job)
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def queue_position(self, job: Job) -> Optional[int]:
+        if job.status != QUEUED:
+            return None
+        queued = [other for other in self.jobs.values() if other.status == QUEUED]
+        return queued.index(job) + 1
+
+    def cancel(self, job: Job) -> None:
+        if job.finished:
+            return
+        if job.status == QUEUED:
+            # The worker skips it when it comes up.
+            self._finish(job, CANCELLED)
+        else:
+            job.cancel_token.cancel("Cancelled by the user.")
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self.queue.get()
+            try:
+                if job.status == QUEUED:
+                    job.task = asyncio.create_task(self._run(job))
+                    await asyncio.wait([job.task])
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        job.status = RUNNING
+        job.started_at = time.time()
+        job.mark_changed()
+        # Token counting during chunking reads the config of the task it runs in.
+        llm_api.use_llm_config(job.config)
+
+        try:
+            await gg.generate_graph_async(
+                [str(path) for path in job.files], job.config, job.progress, job.cancel_token)
+        except asyncio.CancelledError:
+            job.progress("Job cancelled.", "log")
+            self._finish(job, CANCELLED)
+        except Exception as exc:
+            job.progress(f"{exc}", "error")
+            job.error = "Graph generation failed."
+            self._finish(job, FAILED)
+        else:
+            errors = [entry["message"] for entry in job.logs if entry["type"] == "error"]
+            if errors:
+                job.error = errors[-1]
+            self._collect_outputs(job)
+            if errors:
+                self._finish(job, FAILED)
+            elif job.cancel_token.cancelled:
+                job.progress("Job cancelled.", "log")
+                self._finish(job, CANCELLED)
+            else:
+                self._finish(job, COMPLETED)
+
+    def _collect_outputs(self, job: Job) -> None:
+        output_dir = Path(job.config["output_folder"])
+        job.outputs = [f"{job.outputs_url}/{path.name}" for path in sorted(output_dir.glob("*.html"))]
+
+    def _finish(self, job: Job, status: str) -> None:
+        job.status = status
+        job.finished_at = time.time()
+        shutil.rmtree(job.upload_dir, ignore_errors=True)
+        job.mark_changed()
+
+        self._finished_ids.append(job.id)
+        while len(self._finished_ids) > self.max_finished:
+            self.jobs.pop(self._finished_ids.popleft(), None)
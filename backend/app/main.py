@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import asyncio
 import json
 import os
 import shutil
@@ -9,8 +10,9 @@ import tempfile
 from pathlib import Path
 from typing import Dict, List
 
-from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 
@@ -25,17 +27,21 @@ if str(GRAPH_SRC) not in os.sys.path:
     os.sys.path.insert(0, str(GRAPH_SRC))
 
 
-import abort_manager  # noqa: E402  (import after sys.path mutation)
-import config as cfg  # noqa: E402
-import graph_generator as gg  # noqa: E402
+import config as cfg  # noqa: E402  (import after sys.path mutation)
 import llm_api  # noqa: E402
 
+from .jobs import JobManager, QueueFullError  # noqa: E402
+
 
 load_dotenv(dotenv_path=REPO_ROOT / ".env", override=False)
 
 
 API_DESCRIPTION = """REST API for the Knowledge Graph generator."""
 
+# Progress events are sent at most this often; updates in between are coalesced per stage.
+EVENT_INTERVAL_SECONDS = 0.5
+HEARTBEAT_INTERVAL_SECONDS = 15.0
+
 
 def _load_json_field(raw_value: str | None, field_name: str) -> Dict:
     """Safely parse a JSON field from a multipart request."""
@@ -111,6 +117,23 @@ OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 app.mount("/outputs", StaticFiles(directory=str(OUTPUT_DIR)), name="outputs")
 
 
+job_manager = JobManager(
+    workers=int(os.getenv("GENERATION_WORKERS", "2")),
+    max_queued=int(os.getenv("GENERATION_QUEUE_SIZE", "50")),
+)
+
+
+@app.on_event("startup")
+async def start_job_workers() -> None:
+    await job_manager.start()
+
+
+@app.on_event("shutdown")
+async def close_llm_clients() -> None:
+    await job_manager.stop()
+    await llm_api.close_async_clients()
+
+
 @app.get("/health")
 async def health_check() -> Dict[str, str]:
     return {"status": "ok"}
@@ -131,36 +154,38 @@ async def get_defaults() -> Dict[str, Dict[str, str] | List[str]]:
     }
 
 
-def _progress_logger(logs: List[Dict[str, str]]):
-    def wrapper(message: str, type_name: str = "progress") -> None:
-        # Avoid leaking API keys or other sensitive values
-        if type_name == "log" and "api_key" in message.lower():
-            return
-        logs.append({"type": type_name, "message": message})
+def _get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
 
-    return wrapper
 
+def _job_status(job) -> Dict:
+    summary = job.summary()
+    summary["queue_position"] = job_manager.queue_position(job)
+    return summary
 
-@app.post("/generate")
+
+@app.post("/generate", status_code=status.HTTP_202_ACCEPTED)
 async def generate_graphs(
     files: List[UploadFile] = File(description="One or more PDF documents."),
     config: str | None = Form(default=None, description="JSON encoded configuration overrides."),
     options: str | None = Form(default=None, description="JSON encoded UI flags."),
 ):
+    """Queues a generation job and returns its id; poll /jobs/{job_id} for progress."""
+
     if not files:
         raise HTTPException(status_code=400, detail="At least one PDF file must be provided.")
 
+    if job_manager.is_full():
+        raise HTTPException(status_code=503, detail="Too many queued jobs, try again later.")
+
     config_payload = _load_json_field(config, "config")
     options_payload = _load_json_field(options, "options")
 
     runtime_config = _build_runtime_config(config_payload, options_payload)
 
-    abort_manager.ABORT_FLAG = False
-    llm_api.set_llm_config(runtime_config)
-
-    progress_entries: List[Dict[str, str]] = []
-    callback = _progress_logger(progress_entries)
-
     upload_dir = Path(tempfile.mkdtemp(prefix="uploads_", dir=runtime_config["internal_data_dir"]))
 
     stored_files: List[Path] = []
@@ -178,27 +203,112 @@ async def generate_graphs(
 
             stored_files.append(destination)
 
-        existing_outputs = {p.name for p in Path(runtime_config["output_folder"]).glob("*.html")}
-
-        await gg.generate_graph_async([str(path) for path in stored_files], runtime_config, callback)
-
-        new_outputs = [
-            str(Path("/outputs") / path.name)
-            for path in Path(runtime_config["output_folder"]).glob("*.html")
-            if path.name not in existing_outputs
-        ]
-
-        return {
-            "status": "completed",
-            "outputs": new_outputs,
-            "logs": progress_entries,
-        }
+        job = job_manager.submit(stored_files, runtime_config, upload_dir, "/outputs")
     except HTTPException:
+        shutil.rmtree(upload_dir, ignore_errors=True)
         raise
-    except Exception as exc:  # pragma: no cover - executed in runtime, not during tests
-        callback(f"{exc}", "error")
-        raise HTTPException(status_code=500, detail="Graph generation failed.") from exc
-    finally:
+    except QueueFullError as exc:
         shutil.rmtree(upload_dir, ignore_errors=True)
-        abort_manager.ABORT_FLAG = False
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+
+    return _job_status(job)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str) -> Dict:
+    return _job_status(_get_job(job_id))
+
+
+@app.get("/jobs/{job_id}/logs")
+async def get_job_logs(job_id: str, offset: int = 0) -> Dict:
+    """Returns the log entries from `offset` on; pass next_offset back to only get new ones."""
+
+    job = _get_job(job_id)
+    offset = max(0, offset)
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "logs": job.logs[offset:],
+        "next_offset": len(job.logs),
+        "progress": list(job.progress_lines.values()),
+    }
+
+
+def _sse(event: str, data: Dict, event_id: int | None = None) -> str:
+    lines = [] if event_id is None else [f"id: {event_id}"]
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request) -> StreamingResponse:
+    """Streams the job as server-sent events until it finishes.
+
+    `status` is sent when the job state changes, `log` for every log or error entry (its id is
+    the entry count, so a reconnecting EventSource resumes after Last-Event-ID), `progress`
+    with the latest message of each stage that changed and finally `result`.
+    """
+
+    job = _get_job(job_id)
+    last_event_id = request.headers.get("last-event-id", "")
+    start_offset = int(last_event_id) if last_event_id.isdigit() else 0
+
+    async def events():
+        offset = start_offset
+        sent_status = None
+        sent_progress: Dict[str, str] = {}
+        yield "retry: 2000\n\n"
+
+        while True:
+            revision = job.revision
+            if job.status != sent_status:
+                sent_status = job.status
+                yield _sse("status", _job_status(job))
+
+            logs = job.logs[offset:]
+            for index, entry in enumerate(logs, start=offset + 1):
+                yield _sse("log", entry, index)
+            offset += len(logs)
+
+            progress = dict(job.progress_lines)
+            for stage, message in progress.items():
+                if sent_progress.get(stage) != message:
+                    yield _sse("progress", {"stage": stage, "message": message})
+            sent_progress = progress
+
+            if job.finished:
+                yield _sse("result", {"job_id": job.id, "status": job.status, "outputs": job.outputs, "error": job.error})
+                return
+
+            if await request.is_disconnected():
+                return
+
+            await asyncio.sleep(EVENT_INTERVAL_SECONDS)
+            await job.wait_for_change(revision, HEARTBEAT_INTERVAL_SECONDS)
+            if job.revision == revision:
+                yield ": keep-alive\n\n"
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str) -> Dict:
+    job = _get_job(job_id)
+    if not job.finished:
+        raise HTTPException(status_code=409, detail=f"Job is still {job.status}.")
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "outputs": job.outputs,
+        "error": job.error,
+    }
+
 
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str) -> Dict:
+    job = _get_job(job_id)
+    job_manager.cancel(job)
+    return _job_status(job)
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+_data_dir = tempfile.mkdtemp(prefix="backend_tests_")
+os.environ.setdefault("OUTPUT_DIR", os.path.join(_data_dir, "output"))
+os.environ.setdefault("INTERNAL_DATA_DIR", os.path.join(_data_dir, "internal"))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import backend.app.main as main  # noqa: E402
+from backend.app import jobs  # noqa: E402
+
+
+CONFIG = json.dumps({"api": "openai", "api_key": "sk-test", "model": "gpt-4o-mini"})
+
+
+class FakePipeline:
+    """Stands in for generate_graph_async; a document named fail.pdf raises, block.pdf runs until cancelled."""
+
+    def __init__(self):
+        self.started = []
+
+    async def __call__(self, paths, config, progress_callback, cancel_token=None):
+        names = [Path(path).name for path in paths]
+        self.started.append(names)
+        for i in range(5):
+            progress_callback(f"step {i}", "log")
+        if "fail.pdf" in names:
+            raise RuntimeError("Extraction failed.")
+        while "block.pdf" in names and not cancel_token.cancelled:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+
+
+class TestJobsApi(unittest.TestCase):
+    def setUp(self):
+        self.pipeline = FakePipeline()
+        patches = [
+            mock.patch.object(jobs.gg, "generate_graph_async", self.pipeline),
+            mock.patch.object(main, "job_manager", jobs.JobManager(workers=1, max_queued=1)),
+            mock.patch.object(main, "EVENT_INTERVAL_SECONDS", 0.01),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.client = TestClient(main.app)
+        self.client.__enter__()
+        self.addCleanup(self.client.__exit__, None, None, None)
+
+    def _submit(self, name):
+        return self.client.post("/generate", files=[("files", (name, b"%PDF", "application/pdf"))],
+                                data={"config": CONFIG, "options": "{}"})
+
+    def _wait_for(self, job_id, statuses, timeout=5.0):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = self.client.get(f"/jobs/{job_id}").json()
+            if job["status"] in statuses:
+                return job
+            time.sleep(0.01)
+        self.fail(f"Job {job_id} did not reach {statuses}, it is {job['status']}")
+
+    def test_full_queue_returns_503(self):
+        running = self._submit("block.pdf").json()["job_id"]
+        self._wait_for(running, {jobs.RUNNING})
+        queued = self._submit("a.pdf")
+        self.assertEqual(queued.status_code, 202)
+        self.assertEqual(queued.json()["queue_position"], 1)
+
+        rejected = self._submit("b.pdf")
+        self.assertEqual(rejected.status_code, 503)
+
+        self.client.post(f"/jobs/{running}/cancel")
+        self._wait_for(queued.json()["job_id"], {jobs.COMPLETED})
+
+    def test_cancel_while_queued_and_while_running(self):
+        running = self._submit("block.pdf").json()["job_id"]
+        self._wait_for(running, {jobs.RUNNING})
+        queued = self._submit("a.pdf").json()["job_id"]
+
+        self.assertEqual(self.client.post(f"/jobs/{queued}/cancel").json()["status"], jobs.CANCELLED)
+        self.client.post(f"/jobs/{running}/cancel")
+        self.assertEqual(self._wait_for(running, jobs.FINISHED_STATES)["status"], jobs.CANCELLED)
+
+        # The worker skips the cancelled job instead of starting it.
+        after = self._submit("c.pdf").json()["job_id"]
+        self._wait_for(after, {jobs.COMPLETED})
+        self.assertEqual(self.pipeline.started, [["block.pdf"], ["c.pdf"]])
+        self.assertEqual(self.client.get(f"/jobs/{queued}").json()["started_at"], None)
+
+    def test_failed_job_does_not_affect_the_next(self):
+        failed = self._submit("fail.pdf").json()["job_id"]
+        self.assertEqual(self._wait_for(failed, jobs.FINISHED_STATES)["status"], jobs.FAILED)
+        succeeded = self._submit("a.pdf").json()["job_id"]
+
+        job = self._wait_for(succeeded, jobs.FINISHED_STATES)
+        self.assertEqual(job["status"], jobs.COMPLETED)
+        self.assertIsNone(job["error"])
+        self.assertEqual(self.client.get(f"/jobs/{failed}").json()["error"], "Graph generation failed.")
+
+    def test_events_resume_after_last_event_id(self):
+        job_id = self._submit("a.pdf").json()["job_id"]
+        self._wait_for(job_id, {jobs.COMPLETED})
+
+        def event_ids(headers):
+            with self.client.stream("GET", f"/jobs/{job_id}/events", headers=headers) as response:
+                lines = list(response.iter_lines())
+            self.assertIn("event: result", lines)
+            return [int(line[len("id: "):]) for line in lines if line.startswith("id: ")]
+
+        self.assertEqual(event_ids({}), [1, 2, 3, 4, 5])
+        self.assertEqual(event_ids({"Last-Event-ID": "3"}), [4, 5])
+
+
+class TestJobManager(unittest.TestCase):
+    def test_failure_in_one_running_job_leaves_the_other_running(self):
+        pipeline = FakePipeline()
+
+        async def run():
+            manager = jobs.JobManager(workers=2)
+            await manager.start()
+            upload_dir = Path(tempfile.mkdtemp(dir=_data_dir))
+            config = {"output_folder": os.path.join(_data_dir, "output")}
+            blocked = manager.submit([upload_dir / "block.pdf"], config, upload_dir, "/outputs")
+            failed = manager.submit([upload_dir / "fail.pdf"], config, upload_dir, "/outputs")
+            while not failed.finished:
+                await asyncio.sleep(0.01)
+            status = blocked.status
+            manager.cancel(blocked)
+            while not blocked.finished:
+                await asyncio.sleep(0.01)
+            await manager.stop()
+            return status, failed.status, blocked.status, blocked.cancel_token.reason
+
+        with mock.patch.object(jobs.gg, "generate_graph_async", pipeline):
+            statuses = asyncio.run(run())
+
+        self.assertEqual(statuses, (jobs.RUNNING, jobs.FAILED, jobs.CANCELLED, "Cancelled by the user."))
+
+
+def tearDownModule():
+    shutil.rmtree(_data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
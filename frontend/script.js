@@ -3,12 +3,15 @@ const API_BASE = `${window.location.protocol}//${window.location.hostname}:8000`
 const healthIndicator = document.getElementById("health-indicator");
 const form = document.getElementById("generate-form");
 const submitButton = document.getElementById("submit-button");
+const cancelButton = document.getElementById("cancel-button");
 const logOutput = document.getElementById("log-output");
 const resultsHelp = document.getElementById("results-help");
 const resultsList = document.getElementById("results-list");
 const apiKeyInput = document.getElementById("api-key");
 const modelSelect = document.getElementById("model");
 
+let currentJobId = null;
+
 async function checkHealth() {
   try {
     const response = await fetch(`${API_BASE}/health`);
@@ -30,17 +33,77 @@ function resetLogs() {
   resultsList.innerHTML = "";
 }
 
-function appendLogs(entries) {
-  if (!entries || entries.length === 0) {
-    logOutput.textContent = "No log entries were returned.";
-    return;
+function renderLogs(entries, progress) {
+  const lines = entries.map(({ type, message }) => `[${type.toUpperCase()}] ${message}`);
+  lines.push(...Array.from(progress.values()).map((message) => `[PROGRESS] ${message}`));
+
+  logOutput.textContent = lines.length > 0 ? lines.join("\n") : "No log entries were returned.";
+}
+
+async function fetchJson(url, options) {
+  const response = await fetch(url, options);
+  const data = await response.json();
+
+  if (!response.ok) {
+    throw new Error(data.detail || "Request failed");
   }
 
-  const content = entries
-    .map(({ type, message }) => `[${type.toUpperCase()}] ${message}`)
-    .join("\n");
+  return data;
+}
+
+function waitForJob(jobId) {
+  // Log entries arrive one event each; progress events carry the latest line of one stage,
+  // so the view shows the full log followed by the current state of every stage.
+  const entries = [];
+  const progress = new Map();
+
+  return new Promise((resolve, reject) => {
+    const source = new EventSource(`${API_BASE}/jobs/${jobId}/events`);
+
+    source.addEventListener("status", (event) => {
+      const data = JSON.parse(event.data);
+      if (data.status === "queued" && entries.length === 0) {
+        logOutput.textContent = `Job is queued at position ${data.queue_position}, waiting for a free worker…`;
+      }
+    });
+
+    source.addEventListener("log", (event) => {
+      entries.push(JSON.parse(event.data));
+      renderLogs(entries, progress);
+    });
+
+    source.addEventListener("progress", (event) => {
+      const { stage, message } = JSON.parse(event.data);
+      progress.set(stage, message);
+      renderLogs(entries, progress);
+    });
+
+    source.addEventListener("result", (event) => {
+      source.close();
+      resolve(JSON.parse(event.data));
+    });
+
+    source.onerror = () => {
+      // The browser reconnects by itself unless the job is gone.
+      if (source.readyState === EventSource.CLOSED) {
+        reject(new Error("Lost the connection to the job."));
+      }
+    };
+  });
+}
+
+async function cancelJob() {
+  if (!currentJobId) {
+    return;
+  }
 
-  logOutput.textContent = content;
+  cancelButton.disabled = true;
+  try {
+    await fetchJson(`${API_BASE}/jobs/${currentJobId}/cancel`, { method: "POST" });
+  } catch (error) {
+    console.warn("Unable to cancel the job", error);
+    cancelButton.disabled = false;
+  }
 }
 
 function updateResults(outputs) {
@@ -114,24 +177,28 @@ async function submitJob(event) {
     submitButton.disabled = true;
     submitButton.textContent = "Processing…";
 
-    const response = await fetch(`${API_BASE}/generate`, {
+    const job = await fetchJson(`${API_BASE}/generate`, {
       method: "POST",
       body: payload,
     });
 
-    const data = await response.json();
+    currentJobId = job.job_id;
+    cancelButton.hidden = false;
+    cancelButton.disabled = false;
 
-    if (!response.ok) {
-      throw new Error(data.detail || "Request failed");
-    }
+    const result = await waitForJob(job.job_id);
 
-    appendLogs(data.logs);
-    updateResults(data.outputs);
+    updateResults(result.outputs);
+    if (result.status !== "completed") {
+      logOutput.textContent += `\n\nJob ${result.status}${result.error ? `: ${result.error}` : "."}`;
+    }
   } catch (error) {
     logOutput.textContent = `Error: ${error.message}`;
     resultsHelp.style.display = "block";
     resultsList.innerHTML = "";
   } finally {
+    currentJobId = null;
+    cancelButton.hidden = true;
     submitButton.disabled = false;
     submitButton.textContent = "Generate Graphs";
   }
@@ -179,3 +246,4 @@ resetLogs();
 checkHealth();
 hydrateDefaults();
 form.addEventListener("submit", submitJob);
+cancelButton.addEventListener("click", cancelJob);
@@ -1 +1,70 @@
-ABORT_FLAG = False
+import contextlib
+import contextvars
+import threading
+
+# The token of the run the current task or thread belongs to. asyncio tasks inherit it, and so
+# do worker threads started with the caller's context (asyncio.to_thread, chunk_utils.stream_chunks).
+_current_token = contextvars.ContextVar('cancel_token', default=None)
+
+
+class CancellationToken:
+    """Cancellation state of one pipeline run; cancel() may be called from any thread.
+
+    Async stages register a callback that cancels their tasks at once, threads poll
+    `cancelled` at page or unit boundaries. Cancelling one run's token never affects another run.
+    """
+
+    def __init__(self):
+        self.reason = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self, reason=None):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback):
+        """Calls callback() on cancellation, at once if already cancelled; returns a function that removes it."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove_callback(callback)
+        callback()
+        return lambda: None
+
+    def _remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+@contextlib.contextmanager
+def cancellation_scope(token):
+    """Makes token the current token inside the block."""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def current_token():
+    """Returns the token of the current run, or a new one only the caller holds when there is none."""
+    token = _current_token.get()
+    return token if token is not None else CancellationToken()
+
+
+def is_cancelled():
+    token = _current_token.get()
+    return token is not None and token.cancelled
@@ -0,0 +1,54 @@
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chunk_utils  # noqa: E402
+import llm_api  # noqa: E402
+
+
+TEXT_SIZE = 10 * 1024 * 1024
+CHUNK_SIZE = 1000
+WORDS = ["battery", "inverter", "charger", "voltage", "manual", "safety", "relay", "module",
+         "current", "system", "install", "ground", "cable", "output", "firmware", "device"]
+
+
+def _synthetic_text(size):
+    random.seed(7)
+    paragraphs = []
+    length = 0
+    while length < size:
+        sentences = []
+        for _ in range(random.randint(3, 8)):
+            words = random.choices(WORDS, k=random.randint(6, 24))
+            sentences.append(" ".join(words).capitalize() + ".")
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def main():
+    llm_api.set_llm_config({'api': 'openai', 'model': 'gpt-5-mini'})
+
+    text = _synthetic_text(TEXT_SIZE)
+    unit_count = sum(1 for _ in chunk_utils._iter_units(text))
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    df = chunk_utils.create_chunks_from_document(0, text, CHUNK_SIZE)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"Text size : {len(text) / 1024 / 1024:.1f} MB, {unit_count} units, {len(df)} chunks")
+    print(f"Time      : {elapsed:.2f} s")
+    print(f"Units/sec : {unit_count / elapsed:,.0f}")
+    print(f"Peak mem  : {peak / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import abort_manager  # noqa: E402
+import concurrency_controller  # noqa: E402
+import graph_generator as gg  # noqa: E402
+
+CHUNKS = 600
+PROVIDER_CAPACITY = 24
+LATENCY = 0.1
+RETRY_AFTER = 0.2
+
+
+def _make_provider():
+    state = {'in_flight': 0, 'rejected': 0}
+
+    async def call(i):
+        # Stubbed provider: answers after LATENCY, rejects with 429 above its capacity.
+        if state['in_flight'] >= PROVIDER_CAPACITY:
+            state['rejected'] += 1
+            await asyncio.sleep(0.005)
+            raise concurrency_controller.Overloaded("429 Too Many Requests", retry_after=RETRY_AFTER)
+        state['in_flight'] += 1
+        try:
+            await asyncio.sleep(LATENCY)
+        finally:
+            state['in_flight'] -= 1
+
+    return call, state
+
+
+async def _run(limit, adaptive):
+    call, state = _make_provider()
+    controller = concurrency_controller.ConcurrencyController(limit) if adaptive else None
+    completed = []
+
+    async def job(i):
+        await call(i)
+        completed.append(i)
+
+    token = abort_manager.CancellationToken()
+    start = time.perf_counter()
+    with abort_manager.cancellation_scope(token):
+        await gg._run_async_tasks([(i,) for i in range(CHUNKS)], job, limit, "Benchmark",
+                                  lambda message, type_name='progress': None, controller=controller)
+    elapsed = time.perf_counter() - start
+    return elapsed, len(completed), state['rejected'], controller, token.cancelled
+
+
+def main():
+    gg.logger.disabled = True
+    concurrency_controller.logger.disabled = True
+
+    print(f"{CHUNKS} requests of {LATENCY * 1000:.0f} ms, provider accepts {PROVIDER_CAPACITY} at once")
+    for label, limit, adaptive in [("fixed 5", 5, False), ("fixed 50", 50, False), ("adaptive from 5", 5, True)]:
+        elapsed, completed, rejected, controller, aborted = asyncio.run(_run(limit, adaptive))
+        line = f"{label:<16}: {completed}/{CHUNKS} done in {elapsed:.2f} s, {rejected} rejected"
+        if aborted:
+            line += ", run aborted"
+        if controller is not None:
+            line += f", final limit {controller.current_limit} (peak {int(controller.peak_limit)})"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
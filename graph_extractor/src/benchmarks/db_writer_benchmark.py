@@ -0,0 +1,69 @@
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_writer  # noqa: E402
+import graph_generator as gg  # noqa: E402
+import loop_monitor  # noqa: E402
+import sqlite_support  # noqa: E402
+
+
+CHUNKS = 2000
+CONCURRENCY = 64
+MIN_LATENCY = 0.005
+MAX_LATENCY = 0.05
+NODES = "id,type\n" + "".join(f"node {i},concept\n" for i in range(40))
+EDGES = "source,target,label\n" + "".join(f"node {i},node {i + 1},related\n" for i in range(40))
+
+
+async def _inline_commit(document_id, chunk_index, latency, writer):
+    # Previous write path: a synchronous commit inside the coroutine.
+    await asyncio.sleep(latency)
+    sqlite_support.insert_response(document_id, chunk_index, 1, NODES, EDGES)
+
+
+async def _queued_write(document_id, chunk_index, latency, writer):
+    await asyncio.sleep(latency)
+    writer.add_response(document_id, chunk_index, 1, NODES, EDGES)
+
+
+async def _run(processor_fn, document_id, latencies):
+    monitor = loop_monitor.EventLoopLagMonitor()
+    monitor.start()
+    writer = db_writer.ResponseWriter()
+    start = time.perf_counter()
+    to_process = [(document_id, i, latency, writer) for i, latency in enumerate(latencies)]
+    await gg._run_async_tasks(to_process, processor_fn, CONCURRENCY, "Benchmark")
+    await writer.close()
+    elapsed = time.perf_counter() - start
+    await monitor.stop()
+    return elapsed, monitor.get_stats()
+
+
+def main():
+    random.seed(42)
+    latencies = [random.uniform(MIN_LATENCY, MAX_LATENCY) for _ in range(CHUNKS)]
+    # Per-row logging would dominate both runs.
+    sqlite_support.logging.disabled = True
+    gg.logger.disabled = True
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sqlite_support.set_database_path(os.path.join(tmp_dir, "benchmark.db"))
+
+        print(f"{CHUNKS} responses, {CONCURRENCY} concurrent requests")
+        for label, processor_fn, document_id in [("inline commits", _inline_commit, 1),
+                                                 ("writer thread", _queued_write, 2)]:
+            elapsed, stats = asyncio.run(_run(processor_fn, document_id, latencies))
+            print(f"{label:<15}: {elapsed:.2f} s, loop lag max {stats['max_lag'] * 1000:.1f} ms, "
+                  f"total {stats['total_lag'] * 1000:.0f} ms")
+
+        sqlite_support.close_connection()
+
+
+if __name__ == "__main__":
+    main()
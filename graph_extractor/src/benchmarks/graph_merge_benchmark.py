@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import graph_utils  # noqa: E402
+
+
+TOTAL_ROWS = 1_000_000
+NODES_PER_CHUNK = 100
+DISTINCT_LABELS = 200_000
+LEGACY_ROWS = 50_000
+
+
+def _make_graphs(total_rows, seed=42):
+    rng = np.random.default_rng(seed)
+    labels = np.array([f"Entity {i}" for i in range(DISTINCT_LABELS)], dtype=object)
+    types = np.array(["Person", "Place", "Organization", "Concept"], dtype=object)
+    relations = np.array(["knows", "located in", "part of", "related to"], dtype=object)
+
+    graphs = []
+    for _ in range(total_rows // NODES_PER_CHUNK):
+        nodes = pd.DataFrame({
+            'id': np.arange(NODES_PER_CHUNK),
+            'label': labels[rng.integers(0, DISTINCT_LABELS, NODES_PER_CHUNK)],
+            'type': types[rng.integers(0, len(types), NODES_PER_CHUNK)]
+        })
+        edges = pd.DataFrame({
+            'source': rng.integers(0, NODES_PER_CHUNK, NODES_PER_CHUNK),
+            'target': rng.integers(0, NODES_PER_CHUNK, NODES_PER_CHUNK),
+            'label': relations[rng.integers(0, len(relations), NODES_PER_CHUNK)]
+        })
+        graphs.append({'nodes': nodes, 'edges': edges})
+    return graphs
+
+
+def _legacy_merge_graphs_unique(all_graphs):
+    # Previous implementation, row by row with iterrows().
+    unique_entities = {}
+    unique_edges = set()
+    for graph in all_graphs:
+        entity_id_map = {}
+        for _, node_data in graph['nodes'].iterrows():
+            node_label = graph_utils.sanitize(node_data['label'])
+            entity = unique_entities.setdefault(node_label.lower(), {'id': len(unique_entities),
+                                                                     'base_label': node_label, 'types': set()})
+            entity['types'].add(graph_utils.sanitize(node_data['type']))
+            entity_id_map[node_data['id']] = entity['id']
+        for _, edge_data in graph['edges'].iterrows():
+            if edge_data['source'] in entity_id_map and edge_data['target'] in entity_id_map:
+                unique_edges.add((entity_id_map[edge_data['source']], entity_id_map[edge_data['target']],
+                                  graph_utils.sanitize(edge_data['label']).lower()))
+    return unique_entities, unique_edges
+
+
+def main():
+    graphs = _make_graphs(TOTAL_ROWS)
+    legacy_graphs = graphs[:LEGACY_ROWS // NODES_PER_CHUNK]
+    graph_utils.logging.disabled = True
+
+    start = time.perf_counter()
+    _legacy_merge_graphs_unique(legacy_graphs)
+    legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    nodes, edges = graph_utils.merge_graphs_unique(graphs)
+    vectorized = time.perf_counter() - start
+
+    documents = [(f"doc{i}.pdf", *graph_utils.merge_graphs_unique(graphs[i::10])) for i in range(10)]
+    start = time.perf_counter()
+    graph_utils.merge_all_document_graphs(documents)
+    composite = time.perf_counter() - start
+
+    print(f"{TOTAL_ROWS} nodes + {TOTAL_ROWS} edges in {len(graphs)} chunk graphs")
+    print(f"legacy iterrows merge : {LEGACY_ROWS / legacy:>12,.0f} rows/s ({legacy:.2f} s for {LEGACY_ROWS} rows)")
+    print(f"vectorized merge      : {TOTAL_ROWS / vectorized:>12,.0f} rows/s ({vectorized:.2f} s, "
+          f"{len(nodes)} nodes, {len(edges)} edges)")
+    print(f"document merge        : {composite:.2f} s for 10 documents")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import os
+import random
+import sys
+import tempfile
+import time
+from io import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+import graph_utils  # noqa: E402
+import sqlite_support  # noqa: E402
+
+
+CHUNK_COUNTS = [200, 1000, 5000]
+NODES_PER_CHUNK = 20
+EDGES_PER_CHUNK = 25
+LABELS = [f"Entity {i}" for i in range(2000)]
+
+
+def _response(rng):
+    nodes = "id,label,type\n" + "".join(
+        f"{i},{rng.choice(LABELS)},Type {rng.randrange(10)}\n" for i in range(NODES_PER_CHUNK))
+    edges = "source,target,label\n" + "".join(
+        f"{rng.randrange(NODES_PER_CHUNK)},{rng.randrange(NODES_PER_CHUNK)},relation {rng.randrange(20)}\n"
+        for _ in range(EDGES_PER_CHUNK))
+    return nodes, edges
+
+
+def _read_csv_blobs(document_id, chunk_indices):
+    """The merge read path before typed rows: load the CSV blobs and parse them with pandas."""
+    conn = sqlite_support.get_connection()
+    placeholders = ', '.join('?' for _ in chunk_indices)
+    rows = conn.execute(f'''
+        SELECT nodes, edges FROM Responses
+        WHERE document_id = ? AND config_id = 1 AND chunk_index IN ({placeholders})
+    ''', (document_id, *chunk_indices)).fetchall()
+
+    for nodes_csv, edges_csv in rows:
+        df_nodes = pd.read_csv(StringIO(nodes_csv))
+        df_edges = pd.read_csv(StringIO(edges_csv))
+        df_nodes['id'] = pd.to_numeric(df_nodes['id'], errors='coerce')
+        df_edges['source'] = pd.to_numeric(df_edges['source'], errors='coerce')
+        df_edges['target'] = pd.to_numeric(df_edges['target'], errors='coerce')
+        list(zip(df_nodes['id'].tolist(), graph_utils.sanitize_series(df_nodes['label']).tolist(),
+                 graph_utils.sanitize_series(df_nodes['type']).tolist()))
+        list(zip(df_edges['source'].tolist(), df_edges['target'].tolist(),
+                 graph_utils.sanitize_series(df_edges['label']).tolist()))
+
+
+def _read_typed_rows(document_id, chunk_indices):
+    for record in sqlite_support.get_response_records(document_id, 1, chunk_indices).values():
+        graph_utils._response_contribution(record)
+
+
+def _time(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    rng = random.Random(42)
+    # Reads are logged at info level; keep them out of the timing.
+    sqlite_support.logging.disabled = True
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sqlite_support.set_database_path(os.path.join(tmp_dir, "merge_read.db"))
+
+        print(f"{'chunks':>8} {'csv (s)':>9} {'typed (s)':>10} {'speedup':>8}")
+        for document_id, chunk_count in enumerate(CHUNK_COUNTS, start=1):
+            sqlite_support.insert_responses_bulk([
+                (document_id, chunk_index, 1, *_response(rng)) for chunk_index in range(chunk_count)
+            ])
+            chunk_indices = list(range(chunk_count))
+
+            csv_seconds = _time(_read_csv_blobs, document_id, chunk_indices)
+            typed_seconds = _time(_read_typed_rows, document_id, chunk_indices)
+            print(f"{chunk_count:>8} {csv_seconds:>9.3f} {typed_seconds:>10.3f} {csv_seconds / typed_seconds:>7.1f}x")
+
+        sqlite_support.close_connection()
+
+
+if __name__ == "__main__":
+    main()
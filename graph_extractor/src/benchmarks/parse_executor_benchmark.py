@@ -0,0 +1,82 @@
+import asyncio
+import glob
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import graph_generator as gg  # noqa: E402
+import llm_api  # noqa: E402
+import loop_monitor  # noqa: E402
+import parse_executor  # noqa: E402
+import response_parser  # noqa: E402
+
+RESPONSES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             "module_tests", "test_data", "responses")
+CHUNKS = 2000
+CONCURRENCY = 64
+MIN_LATENCY = 0.005
+MAX_LATENCY = 0.05
+KINDS = ['inline', 'thread', 'process']
+
+
+class _NullWriter:
+    def add_response(self, *args):
+        pass
+
+    def add_cached_response(self, *args):
+        pass
+
+
+def _load_responses():
+    responses = []
+    for path in sorted(glob.glob(os.path.join(RESPONSES_DIR, "*.txt"))):
+        with open(path, encoding="utf-8") as f:
+            responses.append(f.read())
+    return responses
+
+
+async def _run(kind, prompts, replies):
+    async def fake_execute(prompt, config):
+        # Stubbed LLM: replays a recorded response after a random network delay.
+        latency, reply = replies[prompt]
+        await asyncio.sleep(latency)
+        return reply
+
+    llm_api.execute = fake_execute
+    config = {'optimization_on': False, 'llm_timeout': 60, 'response_cache_max_entries': 0}
+    parser = parse_executor.ParseExecutor(kind, parse_executor.DEFAULT_WORKERS)
+    writer = _NullWriter()
+
+    monitor = loop_monitor.EventLoopLagMonitor()
+    monitor.start()
+    start = time.perf_counter()
+    to_process = [(1, 1, i, prompt, config, writer, parser) for i, prompt in enumerate(prompts)]
+    await gg._run_async_tasks(to_process, gg._process_chunk, CONCURRENCY, "Benchmark")
+    elapsed = time.perf_counter() - start
+    await monitor.stop()
+    parser.shutdown()
+    return elapsed, monitor.get_stats()
+
+
+def main():
+    rng = random.Random(42)
+    recorded = _load_responses()
+    prompts = [f"prompt {i}" for i in range(CHUNKS)]
+    replies = {prompt: (rng.uniform(MIN_LATENCY, MAX_LATENCY), rng.choice(recorded)) for prompt in prompts}
+    # Per-response logging would dominate every run.
+    gg.logger.disabled = True
+    response_parser.logging.disabled = True
+
+    print(f"{CHUNKS} recorded responses, {CONCURRENCY} concurrent requests, "
+          f"{parse_executor.DEFAULT_WORKERS} parse workers")
+    for kind in KINDS:
+        elapsed, stats = asyncio.run(_run(kind, prompts, replies))
+        print(f"{kind:<8}: {elapsed:.2f} s, loop lag max {stats['max_lag'] * 1000:.1f} ms, "
+              f"mean {stats['mean_lag'] * 1000:.2f} ms, total {stats['total_lag'] * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pdf_extractor  # noqa: E402
+
+
+PAGES = 200
+LINES_PER_PAGE = 40
+WORKERS = min(4, os.cpu_count() or 1)
+
+
+def _write_synthetic_pdf(path, pages):
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for page_number in range(pages):
+        lines = [f"({page_number}-{line} The inverter charges the battery through the relay.) Tj T*"
+                 for line in range(LINES_PER_PAGE)]
+        content = ("BT /F1 9 Tf 11 TL 30 770 Td " + " ".join(lines) + " ET").encode()
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Contents %d 0 R /Resources << /Font << /F1 3 0 R >> >> >>" % content_id)
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(kids) + b"] /Count %d >>" % pages
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for object_id, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n" % object_id + body + b"\nendobj\n"
+    xref_offset = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        data += b"%010d 00000 n \n" % offset
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def main():
+    pdf_path = sys.argv[1] if len(sys.argv) > 1 else None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if pdf_path is None:
+            pdf_path = os.path.join(tmp_dir, "synthetic.pdf")
+            _write_synthetic_pdf(pdf_path, PAGES)
+
+        import pdfplumber
+        with pdfplumber.open(pdf_path) as pdf:
+            pages = len(pdf.pages)
+
+        start = time.perf_counter()
+        sequential_text = pdf_extractor.extract_text_from_pdf(pdf_path)
+        sequential = time.perf_counter() - start
+
+        start = time.perf_counter()
+        parallel_text = pdf_extractor.extract_text_from_pdf(pdf_path, workers=WORKERS)
+        parallel = time.perf_counter() - start
+
+    print(f"{pages} pages, {WORKERS} workers, identical text: {sequential_text == parallel_text}")
+    print(f"sequential : {pages / sequential:.1f} pages/sec")
+    print(f"parallel   : {pages / parallel:.1f} pages/sec")
+
+
+if __name__ == "__main__":
+    main()
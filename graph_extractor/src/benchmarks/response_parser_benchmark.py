@@ -0,0 +1,83 @@
+import csv
+import glob
+import os
+import sys
+import time
+from io import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+import response_parser  # noqa: E402
+
+RESPONSES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             "module_tests", "test_data", "responses")
+REPEATS = 50
+
+
+def _parse_records(text):
+    nodes, edges = response_parser.parse_text_to_records(text)
+    if nodes is not None and edges is not None:
+        response_parser.records_to_csv(nodes, edges)
+
+
+def _parse_dataframes(text):
+    nodes, edges = response_parser.parse_text_to_dataframes(text)
+    if nodes is not None and edges is not None:
+        nodes.to_csv(index=True)
+        edges.to_csv(index=False)
+
+
+def _legacy_section(lines, columns):
+    """Per-line csv.reader validation followed by pd.read_csv, as the parser did before parse_text_to_records."""
+    valid = [lines[0]] + [line for line in lines[1:]
+                          if len(next(csv.reader([line], skipinitialspace=True))) == columns]
+    return pd.read_csv(StringIO('\n'.join(valid)))
+
+
+def _parse_legacy(text):
+    nodes_lines, edges_lines = response_parser._split_sections(text.splitlines())
+    if not nodes_lines or not edges_lines:
+        return
+    nodes = _legacy_section(nodes_lines, 3).set_index('id').rename(columns={'entity': 'label', 'category': 'type'})
+    edges = _legacy_section(edges_lines, 3).rename(columns={'relationship': 'label'})
+    edges.drop_duplicates(subset=['source', 'target', 'label'], inplace=True)
+    try:
+        nodes, edges = response_parser.remove_orphan_nodes_and_reindex(nodes, edges)
+    except ValueError:
+        return
+    nodes.to_csv(index=True)
+    edges.to_csv(index=False)
+
+
+def _time_per_response(parse_fn, text):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        parse_fn(text)
+    return (time.perf_counter() - start) / REPEATS * 1e6
+
+
+def main():
+    # The parser logs every response at info level; keep that out of the timing.
+    response_parser.logging.disabled = True
+
+    print(f"{'response':<18} {'lines':>6} {'records (us)':>13} {'dataframes (us)':>16} {'legacy (us)':>12}")
+    totals = [0.0, 0.0, 0.0]
+    for path in sorted(glob.glob(os.path.join(RESPONSES_DIR, "*.txt"))):
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        records = _time_per_response(_parse_records, text)
+        dataframes = _time_per_response(_parse_dataframes, text)
+        legacy = _time_per_response(_parse_legacy, text)
+        totals[0] += records
+        totals[1] += dataframes
+        totals[2] += legacy
+        print(f"{os.path.basename(path):<18} {len(text.splitlines()):>6} "
+              f"{records:>13.1f} {dataframes:>16.1f} {legacy:>12.1f}")
+
+    print(f"{'total':<18} {'':>6} {totals[0]:>13.1f} {totals[1]:>16.1f} {totals[2]:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import graph_generator as gg  # noqa: E402
+
+
+CHUNKS = 500
+CONCURRENCY = 20
+MIN_LATENCY = 0.01
+MAX_LATENCY = 0.2
+
+
+async def _fake_llm_call(latency):
+    await asyncio.sleep(latency)
+
+
+async def _run_fixed_batches(to_process, processor_fn, max_concurrent_requests):
+    # Previous scheduler: every batch waits for its slowest call.
+    for start_idx in range(0, len(to_process), max_concurrent_requests):
+        batch = to_process[start_idx:start_idx + max_concurrent_requests]
+        await asyncio.gather(*(processor_fn(*args) for args in batch))
+
+
+def main():
+    random.seed(42)
+    latencies = [random.uniform(MIN_LATENCY, MAX_LATENCY) for _ in range(CHUNKS)]
+    to_process = [(latency,) for latency in latencies]
+    ideal = sum(latencies) / CONCURRENCY
+
+    start = time.perf_counter()
+    asyncio.run(_run_fixed_batches(to_process, _fake_llm_call, CONCURRENCY))
+    batched = time.perf_counter() - start
+
+    start = time.perf_counter()
+    asyncio.run(gg._run_async_tasks(to_process, _fake_llm_call, CONCURRENCY, "Benchmark"))
+    sliding = time.perf_counter() - start
+
+    print(f"{CHUNKS} chunks, {CONCURRENCY} concurrent requests")
+    print(f"total_latency / N : {ideal:.2f} s")
+    print(f"fixed batches     : {batched:.2f} s")
+    print(f"sliding window    : {sliding:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
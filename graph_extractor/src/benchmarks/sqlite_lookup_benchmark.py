@@ -0,0 +1,64 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlite_support  # noqa: E402
+
+
+TABLE_SIZES = [1000, 10000, 100000]
+CHUNKS_PER_DOCUMENT = 200
+LOOKUPS = 2000
+
+
+def _fill_responses(conn, rows):
+    conn.executemany(
+        'INSERT INTO Responses (document_id, chunk_index, config_id, nodes, edges) VALUES (?, ?, ?, ?, ?)',
+        ((i // CHUNKS_PER_DOCUMENT, i % CHUNKS_PER_DOCUMENT, 1, "id,label\n", "source,target\n") for i in range(rows))
+    )
+    conn.commit()
+
+
+def _time_lookups(rows):
+    keys = [(random.randrange(rows // CHUNKS_PER_DOCUMENT), random.randrange(CHUNKS_PER_DOCUMENT))
+            for _ in range(LOOKUPS)]
+    start = time.perf_counter()
+    for document_id, chunk_index in keys:
+        sqlite_support.response_exists(document_id, chunk_index, 1)
+    return (time.perf_counter() - start) / LOOKUPS * 1e6
+
+
+def _run(tmp_dir, rows, indexed):
+    path = os.path.join(tmp_dir, f"{rows}_{indexed}.db")
+    sqlite_support._thread_local.connection = None
+    sqlite_support.set_database_path(path)
+    conn = sqlite_support.get_connection()
+    if not indexed:
+        # Recreates the unindexed layout of schema version 0.
+        conn.execute("DROP INDEX idx_responses_key")
+    _fill_responses(conn, rows)
+
+    micros = _time_lookups(rows)
+    conn.close()
+    sqlite_support._thread_local.connection = None
+    return micros
+
+
+def main():
+    random.seed(42)
+    # Lookups are logged at info level; keep them out of the timing.
+    sqlite_support.logging.disabled = True
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f"{'rows':>8} {'no index (us)':>14} {'indexed (us)':>13}")
+        for rows in TABLE_SIZES:
+            scan = _run(tmp_dir, rows, indexed=False)
+            indexed = _run(tmp_dir, rows, indexed=True)
+            print(f"{rows:>8} {scan:>14.1f} {indexed:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
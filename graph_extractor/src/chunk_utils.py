@@ -1,34 +1,62 @@
+import asyncio
+import contextvars
+import threading
 import time
+import zlib
+from bisect import bisect_left, bisect_right
+from itertools import islice
 
 import pandas as pd
 import re
 from log_utils import get_module_logger
 from log_utils import log_location
-from llm_api import count_tokens
+from llm_api import count_tokens_batch
 import abort_manager
 
 logger = get_module_logger("chunk_utils")
 
+UNIT_BATCH_SIZE = 1000
+CHARS_PER_TOKEN_ESTIMATE = 4
+# About one unit in eight qualifies as a chunk boundary once a chunk is nearly full.
+BOUNDARY_UNIT_MASK = 0x7
+
+CHUNK_COLUMNS = [
+    'chunk_index', 'document_id', 'chunk_size', 'doc_page',
+    'token_start', 'token_end', 'char_start', 'char_end', 'unit_offsets', 'text'
+]
+
 
 class ChunkBuilder:
-    def __init__(self, document_id, target_chunk_size, max_token_size):
+    def __init__(self, document_id, target_chunk_size, max_token_size, separator=" "):
         self.document_id = document_id
         self.target_chunk_size = target_chunk_size
         self.max_token_size = max_token_size
+        self.separator = separator
 
         self.chunks = []
 
-        self.current_chunk = ""
+        self.parts = []
+        self.unit_offsets = []
+        self.current_char_count = 0
         self.current_token_count = 0
         self.start_token = 0
+        self.start_char = 0
+        self.end_char = 0
         self.chunk_id = 0
 
-    def add_text(self, text, separator=" "):
-        if self.current_chunk:
-            self.current_chunk += separator + text
+    def add_text(self, text, token_count, char_start):
+        if self.parts:
+            self.current_char_count += len(self.separator)
         else:
-            self.current_chunk = text
-        self.current_token_count += count_tokens(text)
+            self.start_char = char_start
+
+        # (character offset in chunk text, token offset in chunk) of this unit
+        self.unit_offsets.append((self.current_char_count, self.current_token_count))
+        self.parts.append(text)
+
+        self.current_char_count += len(text)
+        self.current_token_count += token_count
+        self.end_char = char_start + len(text)
 
     def finalize_chunk(self):
         end_token = self.start_token + self.current_token_count
@@ -40,35 +68,43 @@ class ChunkBuilder:
             'doc_page': 0,  # if you don’t have page info, you can default to 0
             'token_start': self.start_token,
             'token_end': end_token,
-            'text': self.current_chunk.strip()
+            'char_start': self.start_char,
+            'char_end': self.end_char,
+            'unit_offsets': self.unit_offsets,
+            'text': self.separator.join(self.parts)
         }
 
         self.chunks.append(row_dict)
 
         logger.info(f"Created chunk {len(self.chunks)} with {self.current_token_count} tokens")
 
-        self.start_token = end_token + 1
+        self.start_token = end_token
         self.chunk_id += 1
-        self.current_chunk = ""
+        self.parts = []
+        self.unit_offsets = []
+        self.current_char_count = 0
         self.current_token_count = 0
 
+    def merge_last_chunk(self):
+        """Folds the last chunk into the one before it."""
+        last = self.chunks.pop()
+        previous = self.chunks[-1]
 
-def create_chunks_from_document(document_id, text, target_chunk_size, progress_callback=None):
-    logger.info(f"{log_location()}")
-
-    if text is None:
-        logger.warning(f"No input text! <- {log_location()}")
-        return pd.DataFrame(columns=['chunk_index', 'document_id', 'chunk_size', 'doc_page',
-                                     'token_start', 'token_end', 'text'])
+        char_shift = len(previous['text']) + len(self.separator)
+        token_shift = previous['chunk_size']
 
-    logger.info(f"Creating chunks with a target of {target_chunk_size} tokens")
-    if progress_callback:
-        progress_callback("Preparing text: 0%")
+        previous['unit_offsets'] = previous['unit_offsets'] + [
+            (char_offset + char_shift, token_offset + token_shift)
+            for char_offset, token_offset in last['unit_offsets']
+        ]
+        previous['text'] = previous['text'] + self.separator + last['text']
+        previous['token_end'] = last['token_end']
+        previous['char_end'] = last['char_end']
+        previous['chunk_size'] += last['chunk_size']
 
-    max_token_size = int(target_chunk_size * 1.1)
-    min_token_size = int(target_chunk_size * 0.5)
 
-    paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
+def _iter_units(text):
+    """Yields (unit, char_start) for every non-empty sentence/line of the text."""
 
     def split_sentences(x):
         return re.split(r'(?<=[.!?])\s+', x.strip())
@@ -76,60 +112,178 @@ def create_chunks_from_document(document_id, text, target_chunk_size, progress_c
     def split_lines(x):
         return x.strip().split("\n")
 
-    units = []
-    for paragraph in paragraphs:
-        if abort_manager.ABORT_FLAG:
+    cursor = 0
+    for paragraph in text.split("\n\n"):
+        if abort_manager.is_cancelled():
             break
+        if not paragraph.strip():
+            continue
         for sentence in split_sentences(paragraph):
             for line in split_lines(sentence):
-                if line.strip():
-                    units.append(line.strip())
+                unit = line.strip()
+                if unit:
+                    # Units are stripped substrings in document order, so a forward find stays linear.
+                    char_start = text.find(unit, cursor)
+                    cursor = char_start + len(unit)
+                    yield unit, char_start
+
+
+def chunk_head(chunk, max_tokens):
+    """Returns the leading units of a chunk that fit into max_tokens tokens."""
+    if max_tokens <= 0:
+        return ""
+    if max_tokens >= chunk['chunk_size']:
+        return chunk['text']
+
+    token_offsets = [token_offset for _, token_offset in chunk['unit_offsets']]
+    # Units before end_unit hold at most max_tokens tokens together.
+    end_unit = bisect_right(token_offsets, max_tokens) - 1
+    if end_unit > 0:
+        return chunk['text'][:chunk['unit_offsets'][end_unit][0]].rstrip()
+
+    n = int(len(chunk['text']) * max_tokens / max(chunk['chunk_size'], 1))
+    return chunk['text'][:n]
+
+
+def chunk_tail(chunk, max_tokens):
+    """Returns the trailing units of a chunk that fit into max_tokens tokens."""
+    if max_tokens <= 0:
+        return ""
+    if max_tokens >= chunk['chunk_size']:
+        return chunk['text']
+
+    token_offsets = [token_offset for _, token_offset in chunk['unit_offsets']]
+    start_unit = bisect_left(token_offsets, chunk['chunk_size'] - max_tokens)
+    if start_unit < len(token_offsets):
+        return chunk['text'][chunk['unit_offsets'][start_unit][0]:]
+
+    n = int(len(chunk['text']) * max_tokens / max(chunk['chunk_size'], 1))
+    return chunk['text'][-n:] if n > 0 else ""
+
+
+def _is_boundary_unit(unit):
+    return zlib.crc32(unit.encode('utf-8')) & BOUNDARY_UNIT_MASK == 0
+
+
+def _add_unit(cb, unit, token_count, char_start, min_token_size, max_token_size, boundary_token_size):
+    while True:
+        if cb.current_token_count + token_count <= max_token_size:
+            cb.add_text(unit, token_count, char_start)
+            # Ending chunks on content-defined units lets boundaries resync right after an
+            # edit, so unchanged text further down produces the same chunks as before.
+            if cb.current_token_count >= boundary_token_size and _is_boundary_unit(unit):
+                cb.finalize_chunk()
+            return
+        if cb.current_token_count >= min_token_size:
+            cb.finalize_chunk()
+        else:
+            cb.add_text(unit, token_count, char_start)
+            cb.finalize_chunk()
+            return
+
+
+def estimate_chunk_count(text, target_chunk_size):
+    if not text:
+        return 0
+    return max(1, round(len(text) / (CHARS_PER_TOKEN_ESTIMATE * target_chunk_size)))
+
+
+def iter_chunks(document_id, text, target_chunk_size, progress_callback=None):
+    """Yields chunk records as soon as they are complete.
+
+    Units are token-counted in batches of UNIT_BATCH_SIZE, and one finished chunk
+    is held back so a too-small last chunk can still be merged into it.
+    """
+    if text is None:
+        logger.warning(f"No input text! <- {log_location()}")
+        return
+
+    logger.info(f"Creating chunks with a target of {target_chunk_size} tokens")
+    if progress_callback:
+        progress_callback("Preparing text: 0%")
+
+    max_token_size = int(target_chunk_size * 1.1)
+    min_token_size = int(target_chunk_size * 0.5)
+    boundary_token_size = int(target_chunk_size * 0.8)
 
     cb = ChunkBuilder(document_id, target_chunk_size, max_token_size)
+    units = _iter_units(text)
+    text_length = max(len(text), 1)
+
+    while True:
+        if abort_manager.is_cancelled():
+            return
 
-    total_units = len(units)
+        batch = list(islice(units, UNIT_BATCH_SIZE))
+        if not batch:
+            break
+
+        token_counts = count_tokens_batch([unit for unit, _ in batch])
+        for (unit, char_start), token_count in zip(batch, token_counts):
+            _add_unit(cb, unit, token_count, char_start, min_token_size, max_token_size, boundary_token_size)
 
-    i = 0
-    while i < total_units:
-        if abort_manager.ABORT_FLAG:
-            return None
-        if progress_callback and (i % 1000) == 0:
+        while len(cb.chunks) > 1:
+            yield cb.chunks.pop(0)
+
+        if progress_callback:
             time.sleep(0.001)
-            progress = i / total_units
+            progress = cb.end_char / text_length
             progress_message = f"Preparing text: {progress:.0%}"
             progress_callback(progress_message)
 
-        token_count = count_tokens(units[i])
-        if cb.current_token_count + token_count <= max_token_size:
-            cb.add_text(units[i])
-            i += 1
-        else:
-            if cb.current_token_count >= min_token_size:
-                cb.finalize_chunk()
-            else:
-                cb.add_text(units[i])
-                i += 1
-                cb.finalize_chunk()
-
-    if cb.current_chunk:
+    if cb.parts:
         cb.finalize_chunk()
 
     if len(cb.chunks) > 1:
-        last_chunk_size = count_tokens(cb.chunks[-1]["text"])
+        last_chunk_size = cb.chunks[-1]["chunk_size"]
         if last_chunk_size < min_token_size:
-            t = cb.chunks[-1]["text"]
-            n = last_chunk_size
-            cb.chunks[-2]["text"] += " " + t
-            cb.chunks[-2]["token_end"] += n
-            cb.chunks[-2]["chunk_size"] = count_tokens(cb.chunks[-2]["text"])
-            cb.chunks.pop()
-
-    df = pd.DataFrame(
-        cb.chunks,
-        columns=[
-            'chunk_index', 'document_id', 'chunk_size', 'doc_page',
-            'token_start', 'token_end', 'text'
-        ]
-    )
+            cb.merge_last_chunk()
+
+    yield from cb.chunks
+    cb.chunks = []
+
+
+async def stream_chunks(document_id, text, target_chunk_size, progress_callback=None):
+    """Async generator over iter_chunks; chunking runs on a worker thread."""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+    stopped = threading.Event()
+
+    def produce():
+        try:
+            for chunk in iter_chunks(document_id, text, target_chunk_size, progress_callback):
+                if stopped.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, chunk)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    # Run in a copy of the caller's context, so per-job state such as the LLM config and the
+    # cancellation token applies.
+    producer = loop.run_in_executor(None, contextvars.copy_context().run, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+        await producer
+
+
+def create_chunks_from_document(document_id, text, target_chunk_size, progress_callback=None):
+    logger.info(f"{log_location()}")
+
+    chunks = list(iter_chunks(document_id, text, target_chunk_size, progress_callback))
+    if abort_manager.is_cancelled():
+        return None
+
+    df = pd.DataFrame(chunks, columns=CHUNK_COLUMNS)
 
     return df
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import sqlite_support
+from graph_utils import fold_document_graph, document_graph_frames
+from log_utils import get_module_logger
+
+logger = get_module_logger("composite_graph")
+
+DEFAULT_CACHE_ENTRIES = 16
+
+
+def composite_key(members):
+    """Hashes the set of (document sha256, config_id, graph content hash) a composite is built from."""
+    parts = sorted({f"{sha}:{config_id}:{graph_hash}" for sha, config_id, graph_hash in members})
+    return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()
+
+
+def _member_key(member):
+    """(sha256, config_id, graph hash) of a [sha256, config_id, filename, graph hash] member."""
+    # Members cached before graph hashes were recorded have none and never match.
+    sha, config_id, _, *graph_hash = member
+    return sha, config_id, graph_hash[0] if graph_hash else None
+
+
+def _new_state():
+    return {'members': [], 'next_id': 0, 'entities': {}, 'edges': []}
+
+
+def _largest_cached_subset(wanted):
+    """Returns the key of the cached composite covering most of the wanted pairs without extra documents."""
+    best_key, best_size = None, 0
+    for key, members in sqlite_support.get_composite_members().items():
+        parts = {_member_key(member) for member in members}
+        if parts <= wanted and len(parts) > best_size:
+            best_key, best_size = key, len(parts)
+    return best_key
+
+
+def build_composite(documents, config_id, cache_entries=DEFAULT_CACHE_ENTRIES):
+    """Merges the stored graphs of documents ((document_id, sha256, filename) tuples) into one graph.
+
+    Composites are cached by their set of (sha256, config_id, graph content hash), so a member
+    whose stored graph was rewritten since counts as a different document. A new set starts from
+    the largest cached subset and only folds in the missing documents, streaming their graph rows
+    one at a time. Composites that lack a member without a stored graph are not cached.
+    Documents keep the index they got when they joined the composite, so the returned metadata
+    list (in composite order) is what the viewer needs for the label suffixes.
+    """
+    graph_hashes = sqlite_support.get_graph_hashes([document_id for document_id, _, _ in documents], config_id)
+    wanted = {(sha, config_id, graph_hashes.get(document_id)) for document_id, sha, _ in documents}
+    key = composite_key(wanted)
+
+    state = sqlite_support.get_composite(key)
+    if state is None:
+        base_key = _largest_cached_subset(wanted)
+        state = sqlite_support.get_composite(base_key) if base_key else None
+    if state is None:
+        state = _new_state()
+
+    present = {_member_key(member) for member in state['members']}
+    missing = {document_id: (sha, filename) for document_id, sha, filename in documents
+               if (sha, config_id, graph_hashes.get(document_id)) not in present}
+
+    logger.info(f"Composite of {len(documents)} documents: {len(documents) - len(missing)} cached, "
+                f"merging {len(missing)}")
+
+    edge_map = {(source, target, label): {'label': base, 'docs': docs}
+                for source, target, label, base, docs in state['edges']}
+
+    if missing:
+        folded = set()
+        for document_id, nodes, edges in sqlite_support.iter_graphs(list(missing), config_id):
+            sha, filename = missing[document_id]
+            fold_document_graph(state, edge_map, len(state['members']), nodes, edges)
+            state['members'].append([sha, config_id, filename, graph_hashes.get(document_id)])
+            folded.add(document_id)
+
+        state['edges'] = [[source, target, label, edge['label'], edge['docs']]
+                          for (source, target, label), edge in edge_map.items()]
+        if folded == set(missing):
+            sqlite_support.save_composite(key, state['members'], state, cache_entries)
+        else:
+            logger.warning(f"Not caching the composite: {len(missing) - len(folded)} documents have no stored graph.")
+
+    nodes, edges = document_graph_frames(state, edge_map)
+    metadata_list = [
+        {"index": index, "filename": filename, "sha256": sha}
+        for index, (sha, _, filename, *_) in enumerate(state['members'])
+    ]
+    return nodes, edges, metadata_list
@@ -0,0 +1,135 @@
+import asyncio
+from log_utils import get_module_logger
+
+logger = get_module_logger("concurrency_controller")
+
+DEFAULT_MAX_LIMIT = 100
+MAX_RETRIES = 6
+DECREASE_FACTOR = 0.5
+LATENCY_TOLERANCE = 2.0
+LATENCY_SMOOTHING = 0.2
+BASELINE_DRIFT = 0.01
+# Calls answered faster than this (cache hits, skipped chunks) never reached the provider.
+MIN_LATENCY_SAMPLE = 0.05
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+
+
+class Overloaded(Exception):
+    """The provider rejected or dropped a request because of load (429, 503 or a timeout); it can be retried.
+
+    Transient failures that do not point to load (connection errors, other 5xx responses) are
+    raised with lower_limit=False: they are retried after a backoff but leave the limit alone.
+    """
+
+    def __init__(self, message, retry_after=None, lower_limit=True):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.lower_limit = lower_limit
+
+
+class ConcurrencyController:
+    """AIMD limit on the number of LLM requests in flight.
+
+    While the limit is in use and latency stays within LATENCY_TOLERANCE of the fastest
+    smoothed latency seen, every completed request raises it by 1 / limit, i.e. by about one
+    per round of requests. An overloaded request halves it, at most once per round (requests
+    sent before the last decrease do not count again), and pauses new requests for the
+    Retry-After delay, or an exponential backoff when the provider sent none.
+    """
+
+    def __init__(self, initial, max_limit=DEFAULT_MAX_LIMIT, min_limit=1, max_retries=MAX_RETRIES):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.max_retries = max_retries
+        self.in_flight = 0
+        self.overloads = 0
+        self.peak_limit = self.limit
+
+        self._condition = asyncio.Condition()
+        self._resume_at = 0.0
+        self._last_decrease = float('-inf')
+        self._backoff = BASE_BACKOFF
+        self._latency = None
+        self._baseline = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['max_concurrent_requests'], config.get('concurrency_max_limit', DEFAULT_MAX_LIMIT))
+
+    @property
+    def current_limit(self):
+        return int(self.limit)
+
+    def status(self):
+        return f"{self.in_flight} in flight, limit {self.current_limit}"
+
+    async def acquire(self):
+        """Waits for a free slot and returns the start time to hand back to release() or overloaded()."""
+        loop = asyncio.get_running_loop()
+        async with self._condition:
+            while True:
+                delay = self._resume_at - loop.time()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                elif self.in_flight < self.current_limit:
+                    break
+                else:
+                    await self._condition.wait()
+            self.in_flight += 1
+        return loop.time()
+
+    async def release(self, started, succeeded=True):
+        """Frees the slot; a successful request may raise the limit."""
+        now = asyncio.get_running_loop().time()
+        async with self._condition:
+            saturated = self.in_flight >= self.current_limit
+            self.in_flight -= 1
+            if succeeded and now - started >= MIN_LATENCY_SAMPLE:
+                self._backoff = BASE_BACKOFF
+                if self._record_latency(now - started) and saturated:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                    self.peak_limit = max(self.peak_limit, self.limit)
+            self._condition.notify_all()
+
+    async def overloaded(self, started, retry_after=None, lower_limit=True):
+        """Frees the slot of an overloaded request, lowers the limit and pauses new requests."""
+        now = asyncio.get_running_loop().time()
+        async with self._condition:
+            self.in_flight -= 1
+            if lower_limit:
+                self.overloads += 1
+            if lower_limit and started >= self._last_decrease:
+                self.limit = max(self.min_limit, self.limit * DECREASE_FACTOR)
+                self._last_decrease = now
+                logger.info(f"Provider overloaded, lowering the request limit to {self.current_limit}")
+
+            if retry_after is None:
+                retry_after = self._backoff
+                self._backoff = min(MAX_BACKOFF, self._backoff * 2)
+            self._resume_at = max(self._resume_at, now + min(retry_after, MAX_BACKOFF))
+            self._condition.notify_all()
+
+    def _record_latency(self, latency):
+        """Returns whether the latency is healthy enough to grow the limit."""
+        if self._latency is None:
+            self._latency = latency
+        else:
+            self._latency += (latency - self._latency) * LATENCY_SMOOTHING
+
+        # The baseline follows the smoothed latency down at once and up only slowly, so a
+        # change of prompt size does not hold the limit back forever.
+        if self._baseline is None or self._latency < self._baseline:
+            self._baseline = self._latency
+        else:
+            self._baseline += (self._latency - self._baseline) * BASELINE_DRIFT
+
+        return self._latency <= self._baseline * LATENCY_TOLERANCE
+
+    def log_stats(self, label):
+        logger.info(f"{label}: request limit {self.current_limit} (peak {int(self.peak_limit)}), "
+                    f"{self.overloads} overloaded requests")
@@ -208,6 +208,18 @@ def set_resolution(config, resolution):
     config['max_completion_tokens'] = token_budget
 
 
+def _env_limit(name):
+    value = os.getenv(name)
+    if not value:
+        return None
+    try:
+        limit = int(value)
+    except ValueError:
+        logger.error(f"Ignoring {name}={value!r}, expected a positive integer")
+        return None
+    return limit if limit > 0 else None
+
+
 def build_extended_config(config):
     """Merges user config with internal defaults."""
     if config is None:
@@ -220,6 +232,18 @@ def build_extended_config(config):
         'internal_data_dir': 'data_cache',
         'temp_txt_file': 'tmp.dat',
         'db_filename': 'data.dat',
+        'pdf_extraction_workers': min(4, os.cpu_count() or 1),
+        'parse_executor': 'thread',  # 'thread', 'process' or 'inline'
+        'parse_workers': min(4, os.cpu_count() or 1),
+        'max_concurrent_documents': 4,
+        'llm_streaming': False,
+        # max_concurrent_requests is the starting point; the request limit adapts up to this value.
+        'concurrency_max_limit': CONFIG_TEMPLATE['max_concurrent_requests']['range'][1],
+        # Provider quotas; None leaves the budget unlimited.
+        'llm_tpm_limit': _env_limit('LLM_TPM_LIMIT'),
+        'llm_rpm_limit': _env_limit('LLM_RPM_LIMIT'),
+        'response_cache_max_entries': 100000,
+        'composite_cache_max_entries': 16,
         "optimization_on": True
     }
 
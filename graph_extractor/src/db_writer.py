@@ -0,0 +1,164 @@
+import asyncio
+import queue
+import threading
+import sqlite_support
+from log_utils import get_module_logger
+
+logger = get_module_logger("db_writer")
+
+DEFAULT_BATCH_SIZE = 256
+
+_FLUSH = object()
+_STOP = object()
+
+
+def _resolve(future, result=None):
+    if not future.done():
+        future.set_result(result)
+
+
+class WriteError(Exception):
+    """Queued rows could not be written; raised from flush() and close()."""
+
+
+class ResponseWriter:
+    """Single background thread that owns all stage writes.
+
+    Coroutines only enqueue rows, so SQLite commits never run on the event loop.
+    The thread drains whatever has queued up (at most batch_size items) and writes
+    it in one transaction per table, so batches grow with the load. The first failed
+    write is kept, and every later flush() raises it, so lost rows fail the run.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self.thread.start()
+
+    def add_response(self, document_id, chunk_index, config_id, nodes, edges):
+        self.queue.put(('responses', (document_id, chunk_index, config_id, nodes, edges)))
+
+    def add_response_L1(self, document_id, chunk_index, config_id, nodes):
+        self.queue.put(('responses_L1', (document_id, chunk_index, config_id, nodes)))
+
+    def add_chunk_hash(self, document_id, config_id, chunk_index, text_hash):
+        self.queue.put(('chunk_hashes', (document_id, config_id, chunk_index, text_hash)))
+
+    def delete_responses(self, document_id, config_id, chunk_index):
+        """Deletes the responses of a chunk; deletions run before the rows queued with them."""
+        self.queue.put(('deletions', (document_id, config_id, chunk_index)))
+
+    def delete_responses_from(self, document_id, config_id, chunk_count):
+        self.queue.put(('truncations', (document_id, config_id, chunk_count)))
+
+    def add_cached_response(self, prompt_hash, response, max_entries):
+        self.queue.put(('cached_responses', (prompt_hash, response, max_entries)))
+
+    def touch_cached_response(self, prompt_hash):
+        self.queue.put(('cache_touches', prompt_hash))
+
+    async def reuse_response(self, document_id, chunk_index, config_id, text_hash):
+        """Copies the response of an identical chunk on the writer thread; returns its id or None."""
+        return await self._call(sqlite_support.reuse_response, document_id, chunk_index, config_id, text_hash)
+
+    async def reuse_response_L1(self, document_id, chunk_index, config_id, text_hash):
+        """Copies the L1 response of an identical chunk on the writer thread; returns its nodes or None."""
+        return await self._call(sqlite_support.reuse_response_L1, document_id, chunk_index, config_id, text_hash)
+
+    async def _call(self, fn, *args):
+        # Runs after the rows queued before it, so it sees them, and returns fn's result.
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        self.queue.put(('calls', (fn, args, lambda result: loop.call_soon_threadsafe(_resolve, done, result))))
+        return await done
+
+    async def flush(self):
+        """Waits until everything queued before this call is committed."""
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        self.queue.put((_FLUSH, lambda: loop.call_soon_threadsafe(_resolve, done)))
+        await done
+        if self.error is not None:
+            raise self.error
+
+    async def close(self):
+        try:
+            await self.flush()
+        finally:
+            self.queue.put((_STOP, None))
+
+    def _run(self):
+        try:
+            stopped = False
+            while not stopped:
+                items = [self.queue.get()]
+                while len(items) < self.batch_size:
+                    try:
+                        items.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stopped = self._write(items)
+        finally:
+            sqlite_support.close_connection()
+
+    def _write(self, items):
+        rows = {'responses': [], 'responses_L1': [], 'chunk_hashes': [], 'cached_responses': [],
+                'cache_touches': [], 'calls': [], 'deletions': [], 'truncations': []}
+        callbacks = []
+        stopped = False
+        for kind, payload in items:
+            if kind is _FLUSH:
+                callbacks.append(payload)
+            elif kind is _STOP:
+                stopped = True
+            else:
+                rows[kind].append(payload)
+
+        failed = []
+        try:
+            if rows['deletions'] and not sqlite_support.delete_responses(rows['deletions']):
+                failed.append(f"{len(rows['deletions'])} deletions")
+            for truncation in rows['truncations']:
+                if not sqlite_support.delete_responses_from(*truncation):
+                    failed.append(f"deletion of the responses past chunk {truncation[2]}")
+            if rows['chunk_hashes'] and not sqlite_support.insert_chunk_hashes_bulk(rows['chunk_hashes']):
+                failed.append(f"{len(rows['chunk_hashes'])} chunk hashes")
+            if rows['responses_L1'] and not sqlite_support.insert_responses_L1_bulk(rows['responses_L1']):
+                failed.append(f"{len(rows['responses_L1'])} L1 responses")
+            if rows['responses'] and not sqlite_support.insert_responses_bulk(rows['responses']):
+                failed.append(f"{len(rows['responses'])} responses")
+            if rows['cache_touches'] and not sqlite_support.touch_cached_responses(rows['cache_touches']):
+                failed.append(f"{len(rows['cache_touches'])} cache updates")
+            if rows['cached_responses']:
+                max_entries = rows['cached_responses'][-1][2]
+                cached = [(prompt_hash, response) for prompt_hash, response, _ in rows['cached_responses']]
+                if not sqlite_support.insert_cached_responses(cached, max_entries):
+                    failed.append(f"{len(cached)} cached responses")
+        except Exception as e:
+            logger.error(f"Writing {len(items)} queued items failed: {e}")
+            failed.append(f"{len(items)} queued items ({e})")
+
+        if failed and self.error is None:
+            self.error = WriteError(f"Could not save {', '.join(failed)} to the database.")
+
+        for fn, args, callback in rows['calls']:
+            try:
+                result = fn(*args)
+            except Exception as e:
+                logger.error(f"{fn.__name__} failed on the writer thread: {e}")
+                result = None
+            try:
+                callback(result)
+            except RuntimeError:
+                pass
+
+        for callback in callbacks:
+            try:
+                callback()
+            except RuntimeError:
+                # The waiting event loop is already closed.
+                pass
+
+        return stopped
@@ -3,8 +3,10 @@ import platform
 import time
 import subprocess
 from pathlib import Path
-from pdf_extractor import extract_text_from_pdf
+from pdf_extractor import extract_text_from_pdf, extract_pages, compute_page_hashes
 from log_utils import get_module_logger
+import abort_manager
+import sqlite_support
 
 
 logger = get_module_logger("doc_utils")
@@ -63,11 +65,49 @@ def extract_text_with_external_tool(pdf_path, config, progress_callback=None):
 
 def extract_text_from_document(pdf_path, config, progress_callback=None):
     if config['doc_parser_tool'] is None:
-        return extract_text_from_pdf(pdf_path, progress_callback)
+        return extract_text_from_pdf(pdf_path, progress_callback, config.get('pdf_extraction_workers', 1))
     else:
         return extract_text_with_external_tool(pdf_path, config, progress_callback)
 
 
+def extract_text_incrementally(pdf_path, config, progress_callback=None):
+    """Returns (text, page_hashes) and only extracts pages missing from the page cache.
+
+    page_hashes is None when the document could not be split into cached pages.
+    """
+    if config['doc_parser_tool'] is not None:
+        return extract_text_with_external_tool(pdf_path, config, progress_callback), None
+
+    workers = config.get('pdf_extraction_workers', 1)
+    page_hashes = compute_page_hashes(pdf_path, progress_callback, workers)
+    if page_hashes is None:
+        if abort_manager.is_cancelled():
+            return '', None
+        return extract_text_from_document(pdf_path, config, progress_callback), None
+
+    page_texts = sqlite_support.get_page_texts(page_hashes)
+
+    missing = {}
+    for page_number, page_hash in enumerate(page_hashes):
+        if page_hash not in page_texts and page_hash not in missing:
+            missing[page_hash] = page_number
+
+    logger.info(f"{pdf_path}: {len(page_hashes) - len(missing)} of {len(page_hashes)} pages cached, "
+                f"extracting {len(missing)}")
+
+    if missing:
+        texts = extract_pages(pdf_path, list(missing.values()), progress_callback, workers)
+        new_pages = dict(zip(missing.keys(), texts))
+        sqlite_support.insert_pages(new_pages)
+        page_texts.update(new_pages)
+
+        if len(texts) < len(missing):
+            logger.warning(f"Extraction of {pdf_path} stopped early, {len(missing) - len(texts)} pages missing")
+            return ''.join(page_texts.get(page_hash, '') for page_hash in page_hashes), None
+
+    return ''.join(page_texts[page_hash] for page_hash in page_hashes), page_hashes
+
+
 def test1():
     directory = "documents"
     extracted_txt_dir = os.path.join(directory, "extracted_txt")
@@ -1,5 +1,10 @@
-from openai import OpenAI, OpenAIError
+import functools
+import time
+from email.utils import parsedate_to_datetime
+from openai import (OpenAI, AsyncOpenAI, DefaultAsyncHttpxClient, OpenAIError, APIStatusError, APITimeoutError,
+                    APIConnectionError)
 from log_utils import get_module_logger
+import httpx
 import tiktoken
 
 logging = get_module_logger("gpt")
@@ -24,9 +29,14 @@ def test_openai_reachability(config):
         return error_msg
 
 
+@functools.lru_cache(maxsize=None)
+def _get_encoding(model):
+    return tiktoken.encoding_for_model(model)
+
+
 def count_tokens(text, model):
     try:
-        encoding = tiktoken.encoding_for_model(model)
+        encoding = _get_encoding(model)
         tokens = encoding.encode(text)
         return len(tokens)
     except ImportError:
@@ -34,16 +44,40 @@ def count_tokens(text, model):
         return len(text.split())
 
 
-def execute_prompt(prompt, config):
+def count_tokens_batch(texts, model):
+    try:
+        encoding = _get_encoding(model)
+        return [len(tokens) for tokens in encoding.encode_batch(texts)]
+    except ImportError:
+        logging.warning("tiktoken module not installed. Token count will be approximate.")
+        return [len(text.split()) for text in texts]
+
+
+SYSTEM_PROMPT = "You are a structured data extraction assistant."
+# Chat formatting adds a few tokens per message on top of the message text.
+MESSAGE_OVERHEAD_TOKENS = 16
+
+
+def _completion_budget(config):
+    return config.get('max_completion_tokens') or config.get('max_tokens')
+
+
+def estimate_request_tokens(prompt, config):
+    """Returns (input tokens, tokens the request can use at most) for rate limiting."""
     input_length = count_tokens(prompt, config['model'])
+    total = input_length + count_tokens(SYSTEM_PROMPT, config['model']) + MESSAGE_OVERHEAD_TOKENS
+    return input_length, total + (_completion_budget(config) or 0)
+
+
+def _build_request(prompt, config, input_length=None):
+    if input_length is None:
+        input_length = count_tokens(prompt, config['model'])
     logging.info(f"GPT Input tokens: {input_length}")
     logging.info(prompt)
 
-    system_message = {"role": "system", "content": "You are a structured data extraction assistant."}
+    system_message = {"role": "system", "content": SYSTEM_PROMPT}
     messages = [system_message, {"role": "user", "content": prompt}]
 
-    client = OpenAI(api_key=config['api_key'])
-
     request_kwargs = {
         "messages": messages,
         "model": config['model'],
@@ -52,17 +86,23 @@ def execute_prompt(prompt, config):
         "timeout": config['llm_timeout'],
     }
 
-    token_budget = config.get('max_completion_tokens') or config.get('max_tokens')
+    token_budget = _completion_budget(config)
     if token_budget is not None:
         if _uses_completion_tokens(config['model']):
             request_kwargs['max_completion_tokens'] = token_budget
         else:
             request_kwargs['max_tokens'] = token_budget
 
-    response = client.chat.completions.create(**request_kwargs)
+    return request_kwargs
 
+
+def _read_response(response, config):
     response_content = response.choices[0].message.content.strip()
-    output_length = count_tokens(response_content, config['model'])
+    # The API reports the output length; counting it again would run tiktoken on the event loop.
+    if response.usage is not None:
+        output_length = response.usage.completion_tokens
+    else:
+        output_length = count_tokens(response_content, config['model'])
     logging.info(f"Output tokens: {output_length}")
 
     logging.info(response_content)
@@ -70,3 +110,89 @@ def execute_prompt(prompt, config):
     return response_content
 
 
+def execute_prompt(prompt, config):
+    request_kwargs = _build_request(prompt, config)
+
+    client = OpenAI(api_key=config['api_key'])
+    response = client.chat.completions.create(**request_kwargs)
+
+    return _read_response(response, config)
+
+
+def create_async_client(config):
+    max_connections = max(config['max_concurrent_requests'], config.get('concurrency_max_limit', 0))
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=config['llm_timeout']
+    )
+    http_client = DefaultAsyncHttpxClient(limits=limits, timeout=config['llm_timeout'])
+    # Failed requests are retried by the concurrency controller (see overload_retry_after),
+    # which also lowers the limit when they were rate limited.
+    return AsyncOpenAI(api_key=config['api_key'], http_client=http_client, max_retries=0)
+
+
+async def execute_prompt_async(prompt, config, client, input_length=None, usage=None):
+    """usage, when given, receives the total_tokens reported by the API."""
+    request_kwargs = _build_request(prompt, config, input_length)
+
+    response = await client.chat.completions.create(**request_kwargs)
+    if usage is not None and response.usage is not None:
+        usage['total_tokens'] = response.usage.total_tokens
+
+    return _read_response(response, config)
+
+
+async def stream_prompt_async(prompt, config, client, input_length=None, usage=None):
+    """Yields the completion text piece by piece as it arrives; closing the generator ends the request."""
+    request_kwargs = _build_request(prompt, config, input_length)
+
+    stream = await client.chat.completions.create(stream=True, stream_options={"include_usage": True},
+                                                  **request_kwargs)
+    try:
+        async for event in stream:
+            # The last event carries the usage and no choices.
+            if usage is not None and event.usage is not None:
+                usage['total_tokens'] = event.usage.total_tokens
+            if event.choices and event.choices[0].delta.content:
+                yield event.choices[0].delta.content
+    finally:
+        await stream.close()
+
+
+def _retry_after(headers):
+    """Reads retry-after-ms or retry-after (seconds or an HTTP date) from response headers."""
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        value = headers.get('retry-after')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def overload_retry_after(error):
+    """Returns (retryable, retry_after, overloaded) for an exception raised by the OpenAI client.
+
+    Async clients are created with max_retries=0, so every error the SDK would retry is
+    reported as retryable here. Only 429, 503 and timeouts count as overloaded, which
+    lowers the request limit; connection errors and other 5xx responses do not.
+    """
+    if isinstance(error, APITimeoutError):
+        return True, None, True
+    if isinstance(error, APIConnectionError):
+        return True, None, False
+    if isinstance(error, APIStatusError):
+        if error.status_code in (429, 503):
+            # An exhausted quota is reported as 429 too, but waiting does not help.
+            if getattr(error, 'code', None) == 'insufficient_quota':
+                return False, None, False
+            return True, _retry_after(error.response.headers), True
+        if error.status_code in (408, 409) or error.status_code >= 500:
+            return True, _retry_after(error.response.headers), False
+    return False, None, False
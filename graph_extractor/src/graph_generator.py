@@ -5,11 +5,17 @@ import abort_manager
 import my_hash
 import doc_utils
 import chunk_utils
+import db_writer
+import parse_executor
+import concurrency_controller
 import graph_utils
+import composite_graph
 import prompts
 import response_parser
+import response_cache
 import sqlite_support
 import llm_api
+import loop_monitor
 
 from create_graph_viewer import build_viewer
 from log_utils import get_module_logger
@@ -26,266 +32,552 @@ def _ensure_directories_exist(config):
             logger.info(f"Created directory: {directory}")
 
 
-def _build_chunk_node_map(responses):
-    chunk_node_map = {}
-    for response in responses:
-        chunk_index = response.get("chunk_index")
-        nodes_str = response.get("nodes")
+async def _stream_prompt(prompt, config, incremental):
+    """Streams the completion through the incremental parser and stops reading once it reports an error."""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    first_row = None
+    parts = []
 
-        if not nodes_str:
-            logger.warning(f"No nodes CSV found for chunk index {chunk_index}.")
-            continue
+    stream = llm_api.execute_stream(prompt, config)
+    try:
+        async for text in stream:
+            parts.append(text)
+            if incremental.feed(text) and first_row is None:
+                first_row = loop.time() - start
+            if incremental.error:
+                break
+        else:
+            incremental.close()
+    finally:
+        await stream.aclose()
 
-        nodes = response_parser.parse_nodes(nodes_str)
+    if first_row is not None:
+        logger.info(f"Streamed response: first row after {first_row:.2f} s, complete after {loop.time() - start:.2f} s")
+    return ''.join(parts).strip()
 
-        if chunk_index in chunk_node_map:
-            chunk_node_map[chunk_index].extend(nodes)
-        else:
-            chunk_node_map[chunk_index] = nodes
 
-    logger.info(f"Created [chunk index , node list] map with {len(chunk_node_map)} chunks.")
-    return chunk_node_map
+async def _execute_prompt(prompt, config, incremental=None, writer=None):
+    """Returns (response, cached); identical prompts are answered from the response cache.
+
+    With an IncrementalParser the completion is streamed into it instead of awaited as a whole.
+    """
+    if config["optimization_on"]:
+        response = await asyncio.to_thread(response_cache.lookup, prompt, config, writer)
+        if response is not None:
+            return response, True
 
+    if incremental is None:
+        request = llm_api.execute(prompt, config)
+    else:
+        request = _stream_prompt(prompt, config, incremental)
 
-async def _process_chunk(document_id, config_id, chunk_index, prompt, config):
     try:
-        response = await asyncio.wait_for(llm_api.execute(prompt, config), config['llm_timeout']+2)
+        response = await asyncio.wait_for(request, config['llm_timeout']+2)
     except asyncio.TimeoutError:
-        abort_manager.ABORT_FLAG = True
-        raise Exception("API call timed out!")
+        raise concurrency_controller.Overloaded("API call timed out!")
+
+    return response, False
 
-    result = response_parser.parse_text_to_dataframes(response)
-    if result is None:
-        logger.warning(f"Could not parse response for chunk {chunk_index}!\n{response}")
-        return
 
-    nodes, edges = result
-    if nodes is None or edges is None:
+async def _process_chunk(document_id, config_id, chunk_index, prompt, config, writer, parser):
+    incremental = response_parser.IncrementalParser() if config.get('llm_streaming') else None
+    response, cached = await _execute_prompt(prompt, config, incremental, writer)
+    if incremental is not None and incremental.error:
+        logger.warning(f"Stopped reading the response for chunk {chunk_index} early: {incremental.error}\n{response}")
+        raise response_parser.MalformedResponse(f"Malformed response for chunk {chunk_index}: {incremental.error}")
+
+    nodes, edges, csv_text = await parser.run(response_parser.parse_text_to_csv, response)
+    if csv_text is None:
         logger.warning(f"Parsing returned None objects for chunk {chunk_index}!\n{response}")
         return
-    elif nodes.empty:
+    elif not nodes:
         logger.warning(f"Parsing returned empty nodes for chunk {chunk_index}!\n{response}")
-    elif edges.empty:
+    elif not edges:
         logger.warning(f"Parsing returned empty edges for chunk {chunk_index}!\n{response}")
 
     logger.info(f"Response for chunk {chunk_index}!\n{response}")
-    nodes_string = nodes.to_csv(index=True)
-    edges_string = edges.to_csv(index=False)
-    response_id = sqlite_support.insert_response(document_id, chunk_index, config_id, nodes_string, edges_string)
-    logger.info(f"Response for chunk {chunk_index} saved to {response_id}")
+    if not cached:
+        response_cache.store(prompt, config, response, writer)
 
+    nodes_string, edges_string = csv_text
+    writer.add_response(document_id, chunk_index, config_id, nodes_string, edges_string)
 
-async def _process_L1_chunk(document_id, config_id, chunk, prompt, config):
-    try:
-        response = await asyncio.wait_for(llm_api.execute(prompt, config), config['llm_timeout']+2)
-    except asyncio.TimeoutError:
-        abort_manager.ABORT_FLAG = True
-        raise Exception("API call timed out!")
 
-    nodes = response_parser.parse_nodes(response)
+async def _process_L1_chunk(document_id, config_id, chunk, prompt, config, writer, parser):
+    response, cached = await _execute_prompt(prompt, config, writer=writer)
+
+    nodes = await parser.run(response_parser.parse_nodes, response)
     if nodes is None:
-        logger.warning(f"Could not parse response for chunk index {chunk.chunk_index}!\n{response}")
+        logger.warning(f"Could not parse response for chunk index {chunk['chunk_index']}!\n{response}")
         return
 
     nodes_string = ', '.join(f'"{node}"' for node in nodes)
 
     if not nodes_string.strip():
-        logger.warning(f"nodes_string is empty for chunk index {chunk.chunk_index}. Skipping database insertion.")
+        logger.warning(f"nodes_string is empty for chunk index {chunk['chunk_index']}. Skipping database insertion.")
         return
 
-    response_id = sqlite_support.insert_response_L1(document_id, chunk.chunk_index, config_id, nodes_string)
-    logger.info(f"Response ({len(nodes)} nodes) for chunk ID {chunk.chunk_index}: {response}")
-    logger.info(f"Saved to Response ID: {response_id}")
+    if not cached:
+        response_cache.store(prompt, config, response, writer)
+
+    writer.add_response_L1(document_id, chunk['chunk_index'], config_id, nodes_string)
+    logger.info(f"Response ({len(nodes)} nodes) for chunk ID {chunk['chunk_index']}: {response}")
+    return nodes_string
+
+
+def _record_chunk_hash(document_id, config_id, chunk, writer, stored_hash):
+    """Stores the hash of the chunk text; responses made from a different text are deleted first."""
+    text_hash = my_hash.calculate_text_sha256(chunk['text'])
+    if text_hash != stored_hash:
+        # Queued before the new hash, so no reuse lookup can pair it with the outdated responses.
+        writer.delete_responses(document_id, config_id, chunk['chunk_index'])
+    writer.add_chunk_hash(document_id, config_id, chunk['chunk_index'], text_hash)
+    return text_hash
+
+
+async def _iterate_tasks(to_process):
+    if isinstance(to_process, list):
+        for args in to_process:
+            yield args
+    else:
+        async for args in to_process:
+            yield args
 
 
-async def _run_async_tasks_in_batches(
+async def _run_with_controller(controller, processor_fn, args):
+    """Runs processor_fn(*args) in a controller slot, retrying it while the provider is overloaded.
+
+    A malformed streamed response is sent again without lowering the limit; the task is
+    skipped once the retries are used up.
+    """
+    for attempt in range(controller.max_retries + 1):
+        started = await controller.acquire()
+        try:
+            await processor_fn(*args)
+        except concurrency_controller.Overloaded as e:
+            await controller.overloaded(started, e.retry_after, e.lower_limit)
+            if attempt == controller.max_retries:
+                raise
+            logger.warning(f"{e} Retrying ({attempt + 1}/{controller.max_retries}), {controller.status()}")
+        except response_parser.MalformedResponse as e:
+            await controller.release(started, succeeded=False)
+            if attempt == controller.max_retries:
+                logger.warning(f"{e} Giving up after {controller.max_retries} retries.")
+                return
+            logger.warning(f"{e} Retrying ({attempt + 1}/{controller.max_retries})")
+        except BaseException:
+            await controller.release(started, succeeded=False)
+            raise
+        else:
+            await controller.release(started)
+            return
+
+
+async def _run_async_tasks(
     to_process,
     processor_fn,
     max_concurrent_requests,
     progress_label,
-    progress_callback=None
+    progress_callback=None,
+    expected_jobs=None,
+    controller=None
 ):
-    if not to_process:
-        logger.info(f"No tasks to process for {progress_label}.")
-        if progress_callback:
-            progress_callback(f"{progress_label}  {1:.0%}")
-        return
+    """Runs processor_fn over to_process, a list of argument tuples or an async iterable of them.
+
+    For async sources the job count is only known once the source is exhausted, so
+    progress is reported against expected_jobs until then. With a ConcurrencyController
+    the number of calls in flight follows its limit instead of max_concurrent_requests,
+    and overloaded calls are retried after its backoff rather than aborting the run.
+
+    A failing call cancels the current run's token; once it is cancelled the calls in flight
+    are cancelled too and the function returns without scheduling any more.
+    """
+    token = abort_manager.current_token()
+    if isinstance(to_process, list):
+        if not to_process:
+            logger.info(f"No tasks to process for {progress_label}.")
+            if progress_callback:
+                progress_callback(f"{progress_label}  {1:.0%}")
+            return
+        expected_jobs = len(to_process)
 
-    total_jobs = len(to_process)
+    if controller is not None:
+        max_concurrent_requests = controller.max_limit
+    if isinstance(to_process, list):
+        worker_count = max(1, min(max_concurrent_requests, expected_jobs))
+    else:
+        worker_count = max(1, max_concurrent_requests)
+
+    submitted_jobs = 0
     completed_tasks = 0
+    source_done = False
+    queue = asyncio.Queue(maxsize=worker_count)
+
+    def report_progress():
+        total_jobs = submitted_jobs if source_done else max(expected_jobs or 0, submitted_jobs + 1)
+        progress = completed_tasks / total_jobs if total_jobs else 1
+        if controller is not None:
+            progress_callback(f"{progress_label}  {progress:.0%}  ({controller.status()})")
+        else:
+            progress_callback(f"{progress_label}  {progress:.0%}")
 
-    async def track_progress(task):
-        nonlocal completed_tasks
+    async def feed():
+        nonlocal submitted_jobs, source_done
         try:
-            result = await task
-        except Exception as e:
-            logger.error(f"Error while processing task: {e}")
-            if progress_callback:
-                progress_callback(f"{e}", 'error')
-                abort_manager.ABORT_FLAG = True
-            result = None
-        completed_tasks += 1
-        if progress_callback and not abort_manager.ABORT_FLAG:
-            progress = completed_tasks / total_jobs
-            progress_callback(f"{progress_label}  {progress:.0%}")
-        return result
+            async for args in _iterate_tasks(to_process):
+                if token.cancelled:
+                    logger.info(f"Run cancelled, not scheduling further {progress_label} tasks.")
+                    break
+                await queue.put(args)
+                submitted_jobs += 1
+        finally:
+            source_done = True
+        for _ in range(worker_count):
+            await queue.put(None)
+
+    async def worker():
+        nonlocal completed_tasks
+        # Every worker pulls the next job as soon as its previous one finishes, so
+        # max_concurrent_requests calls stay in flight until the source drains.
+        while True:
+            args = await queue.get()
+            if args is None:
+                return
+            if token.cancelled:
+                continue
+            try:
+                if controller is None:
+                    await processor_fn(*args)
+                else:
+                    await _run_with_controller(controller, processor_fn, args)
+            except response_parser.MalformedResponse as e:
+                logger.warning(f"{e} Skipping the task.")
+            except Exception as e:
+                logger.error(f"Error while processing task: {e}")
+                if progress_callback:
+                    progress_callback(f"{e}", 'error')
+                token.cancel(f"{e}")
+            completed_tasks += 1
+            if progress_callback and not token.cancelled:
+                report_progress()
 
     if progress_callback:
         progress_callback(f"{progress_label}  {0:.0%}")
 
-    for start_idx in range(0, total_jobs, max_concurrent_requests):
-        if abort_manager.ABORT_FLAG:
-            logger.info(f"Abort triggered, not scheduling next batch for {progress_label}.")
-            break
+    workers = [asyncio.create_task(worker()) for _ in range(worker_count)]
+    feeder = asyncio.create_task(feed())
 
-        batch_data = to_process[start_idx : start_idx + max_concurrent_requests]
+    loop = asyncio.get_running_loop()
+    stopped = False
 
-        batch_tasks = [
-            asyncio.create_task(processor_fn(*args))
-            for args in batch_data
-        ]
+    def stop():
+        nonlocal stopped
+        stopped = True
+        for t in [feeder, *workers]:
+            t.cancel()
 
-        try:
-            await asyncio.gather(*(track_progress(t) for t in batch_tasks))
-        except Exception as e:
-            logger.error(f"Exception in {progress_label} batch gather: {e}")
-            if abort_manager.ABORT_FLAG:
-                logger.info(f"Canceling running tasks in current batch for {progress_label}...")
-                for t in batch_tasks:
-                    t.cancel()
-                await asyncio.gather(*batch_tasks, return_exceptions=True)
-            break
-
-
-async def _L2_extract_graph_big_context(document_id, config_id, df_chunks, config, progress_callback=None):
-    if abort_manager.ABORT_FLAG:
+    remove_callback = token.add_callback(lambda: loop.call_soon_threadsafe(stop))
+    try:
+        await asyncio.gather(feeder, *workers)
+    except asyncio.CancelledError:
+        for t in [feeder, *workers]:
+            t.cancel()
+        await asyncio.gather(feeder, *workers, return_exceptions=True)
+        if not stopped:
+            raise
+        logger.info(f"Run cancelled, stopped the running {progress_label} tasks.")
+    except BaseException as e:
+        logger.error(f"Exception in {progress_label} workers: {e!r}")
+        logger.info(f"Canceling running tasks for {progress_label}...")
+        for t in [feeder, *workers]:
+            t.cancel()
+        await asyncio.gather(feeder, *workers, return_exceptions=True)
+        raise
+    finally:
+        remove_callback()
+
+    if token.cancelled:
         return
 
-    logger.info(f"L2 Extracting graph from chunks")
-
-    responses = sqlite_support.get_all_L1_responses_for(document_id, config_id)
-
-    nr = len(responses)
-    nc = len(df_chunks)
+    if submitted_jobs == 0:
+        logger.info(f"No tasks to process for {progress_label}.")
+        if progress_callback:
+            progress_callback(f"{progress_label}  {1:.0%}")
+    elif progress_callback and not isinstance(to_process, list):
+        report_progress()
 
-    if nr == 0:
-        logger.warning(
-            f"Document Id: {document_id} ChunkSize: {config['chunk_size']} has no response available! Run L1!")
-        return
 
-    if nr != nc:
-        logger.warning(f"Document Id: {document_id} ChunkSize: {config['chunk_size']} has {nc} chunks but {nr} responses!")
+def _L2_prompt(previous, chunk, following, nodes):
+    big_text = ""
+    if previous is not None:
+        big_text += previous['text']
+    big_text += chunk['text']
+    if following is not None:
+        big_text += following['text']
 
-    chunk_node_map = _build_chunk_node_map(responses)
+    return prompts.extract_entities_and_relationships_prompt_level2(big_text, ", ".join(nodes))
 
-    to_process = []
-    for i, chunk in df_chunks.iterrows():
-        if config["optimization_on"] and sqlite_support.response_exists(document_id, i, config_id):
-            logger.info(f"L2 Response available for chunk Chunk index: {i}")
-            continue
 
-        if i not in chunk_node_map:
+def _parse_L1_nodes(chunk_index, nodes_string):
+    """Returns the L1 node labels of a chunk, or None when it has no L1 response to build on."""
+    if not nodes_string:
+        logger.warning(f"No L1 nodes found for chunk index {chunk_index}.")
+        return None
+    return response_parser.parse_nodes(nodes_string) or []
+
+
+async def _L1_L2_extract_graph(document_id, config_id, chunk_stream, config, progress_callback=None,
+                               expected_chunks=None, controller=None, parser=None, writer=None):
+    """Runs L1 and L2 over the chunk stream as one pipeline.
+
+    The L2 request of chunk i only needs the L1 nodes of chunk i and the texts of its
+    neighbours, so it is dispatched as soon as both are known while L1 continues on the
+    following chunks.
+    """
+    logger.info(f"L1/L2 Extracting graph from chunks")
+
+    if controller is None:
+        # Both stages draw from one limit, so together they stay within max_concurrent_requests.
+        controller = concurrency_controller.ConcurrencyController.from_config(config)
+
+    chunks = {}
+    text_hashes = {}
+    l1_nodes = {}
+    dispatched = set()
+    stream_done = False
+    # Chunk indices whose L2 dependencies may just have been met; None once L1 has finished.
+    ready = asyncio.Queue()
+
+    cached_L1 = {}
+    cached_L2 = set()
+    chunk_hashes = await asyncio.to_thread(sqlite_support.get_chunk_hashes, document_id, config_id)
+    if config["optimization_on"]:
+        L1_responses = await asyncio.to_thread(sqlite_support.get_all_L1_responses_for, document_id, config_id)
+        cached_L1 = {r['chunk_index']: r['nodes'] for r in L1_responses}
+        cached_L2 = await asyncio.to_thread(sqlite_support.get_response_chunk_indices, document_id, config_id)
+
+    own_writer = writer is None
+    if own_writer:
+        writer = db_writer.ResponseWriter()
+    own_parser = parser is None
+    if own_parser:
+        parser = parse_executor.ParseExecutor.from_config(config)
+
+    def finish_L1(chunk_index, nodes_string):
+        l1_nodes[chunk_index] = _parse_L1_nodes(chunk_index, nodes_string)
+        ready.put_nowait(chunk_index)
+
+    async def process_L1(chunk, prompt):
+        nodes_string = await _process_L1_chunk(document_id, config_id, chunk, prompt, config, writer, parser)
+        finish_L1(chunk['chunk_index'], nodes_string)
+
+    async def L1_tasks():
+        nonlocal stream_done
+        previous = None
+        async for chunk in chunk_stream:
+            i = chunk['chunk_index']
+            chunks[i] = chunk
+            if previous is not None:
+                # The right-hand neighbour of the previous chunk is known now.
+                ready.put_nowait(previous)
+            previous = i
+
+            text_hashes[i] = _record_chunk_hash(document_id, config_id, chunk, writer, chunk_hashes.get(i))
+            if text_hashes[i] != chunk_hashes.get(i):
+                # The stored responses of this index were made from another text (or chunker).
+                cached_L1.pop(i, None)
+                cached_L2.discard(i)
+
+            if config["optimization_on"]:
+                if i in cached_L1:
+                    logger.info(f"L1 Response available for chunk Chunk index: {i}")
+                    finish_L1(i, cached_L1[i])
+                    continue
+
+                nodes_string = await writer.reuse_response_L1(document_id, i, config_id, text_hashes[i])
+                if nodes_string is not None:
+                    logger.info(f"L1 Response reused from an identical chunk for Chunk index: {i}")
+                    finish_L1(i, nodes_string)
+                    continue
+
+            logger.info(f"L1 Extracting entities from chunk {i}")
+            yield chunk, prompts.extract_entities_prompt(chunk['text'])
+
+        stream_done = True
+        if not abort_manager.is_cancelled():
+            writer.delete_responses_from(document_id, config_id, len(chunks))
+        if previous is not None:
+            ready.put_nowait(previous)
+
+    async def L2_task(i):
+        chunk = chunks[i]
+        if config["optimization_on"]:
+            if i in cached_L2:
+                logger.info(f"L2 Response available for chunk Chunk index: {i}")
+                return None
+
+            if await writer.reuse_response(document_id, i, config_id, text_hashes[i]) is not None:
+                logger.info(f"L2 Response reused from an identical chunk for Chunk index: {i}")
+                return None
+
+        if l1_nodes[i] is None:
             logger.warning(f"Chunk {i} not found in L1 responses!")
-            continue
+            return None
 
-        nodes = chunk_node_map[i] or []
-        node_labels_str = ", ".join(nodes)
+        logger.info(f"L2 Extracting entities and relationships from chunk {i}")
+        prompt = _L2_prompt(chunks.get(i - 1), chunk, chunks.get(i + 1), l1_nodes[i])
+        return document_id, config_id, i, prompt, config, writer, parser
+
+    async def L2_tasks():
+        while (i := await ready.get()) is not None:
+            if i in dispatched or i not in l1_nodes or not (i + 1 in chunks or stream_done):
+                continue
+            dispatched.add(i)
+            task = await L2_task(i)
+            if task is not None:
+                yield task
+
+        missing = sorted(set(chunks) - dispatched)
+        if missing and stream_done and not abort_manager.is_cancelled():
+            logger.warning(f"Document Id: {document_id} has no L1 response for chunks {missing}, skipped in L2.")
+
+    async def run_L1():
+        try:
+            await _run_async_tasks(
+                L1_tasks(),
+                process_L1,
+                config['max_concurrent_requests'],
+                progress_label="Finding entities",
+                progress_callback=progress_callback,
+                expected_jobs=expected_chunks,
+                controller=controller
+            )
+        finally:
+            ready.put_nowait(None)
+
+    stages = [
+        asyncio.create_task(run_L1()),
+        asyncio.create_task(_run_async_tasks(
+            L2_tasks(),
+            _process_chunk,
+            config['max_concurrent_requests'],
+            progress_label="Mapping relationships",
+            progress_callback=progress_callback,
+            expected_jobs=expected_chunks,
+            controller=controller
+        ))
+    ]
+    try:
+        await asyncio.gather(*stages)
+    finally:
+        for stage in stages:
+            stage.cancel()
+        await asyncio.gather(*stages, return_exceptions=True)
+        if own_writer:
+            await writer.close()
+        else:
+            # The merge that follows reads this document's rows back.
+            await writer.flush()
+        if own_parser:
+            await asyncio.to_thread(parser.shutdown)
+    print()
 
-        big_text = ""
-        if i > 0:
-            big_text += df_chunks.loc[i - 1, 'text']
-        big_text += df_chunks.loc[i, 'text']
-        if i < nc - 1:
-            big_text += df_chunks.loc[i + 1, 'text']
+    if not chunks:
+        logger.warning("Chunks are empty!")
 
-        logger.info(f"L2 Extracting entities and relationships from chunk {i}")
-        prompt = prompts.extract_entities_and_relationships_prompt_level2(big_text, node_labels_str)
 
-        to_process.append((document_id, config_id, i, prompt, config))
+async def _iter_chunk_windows(chunk_stream):
+    """Yields (previous, current, next) chunk triples; the edges get None neighbours."""
+    previous = None
+    current = None
+    async for chunk in chunk_stream:
+        if current is not None:
+            yield previous, current, chunk
+        previous, current = current, chunk
+    if current is not None:
+        yield previous, current, None
 
-    await _run_async_tasks_in_batches(
-        to_process,
-        _process_chunk,
-        config['max_concurrent_requests'],
-        progress_label="Mapping relationships",
-        progress_callback=progress_callback
-    )
 
+async def _L0_extract_graph(document_id, config_id, chunk_stream, config, progress_callback=None,
+                            expected_chunks=None, controller=None, parser=None, writer=None):
+    logger.info(f"L0 Extracting graph from chunks")
 
-async def _L1_extract_entities_from_chunks(document_id, config_id, df_chunks, config, progress_callback=None):
-    logger.info(f"L1 Extracting entities from chunks")
+    overlap = config['overlap']
+    chunk_count = 0
 
-    if df_chunks.empty:
-        logger.warning("Chunks are empty!")
-        return
+    cached_indices = set()
+    chunk_hashes = await asyncio.to_thread(sqlite_support.get_chunk_hashes, document_id, config_id)
+    if config["optimization_on"]:
+        cached_indices = await asyncio.to_thread(sqlite_support.get_response_chunk_indices, document_id, config_id)
 
-    original_padding_size = config['padding_size']
-    config['padding_size'] = 0
-
-    to_process = []
-    for i, chunk in df_chunks.iterrows():
-        if config["optimization_on"] and sqlite_support.response_exists_L1(document_id, i, config_id):
-            logger.info(f"L1 Response available for chunk Chunk index: {i}")
-            continue
-
-        logger.info(f"L1 Extracting entities from chunk {i}")
-        prompt = prompts.extract_entities_prompt(chunk.text)
-        to_process.append((document_id, config_id, chunk, prompt, config))
-
-    await _run_async_tasks_in_batches(
-        to_process,
-        _process_L1_chunk,
-        config['max_concurrent_requests'],
-        progress_label="Finding entities",
-        progress_callback=progress_callback
-    )
+    own_writer = writer is None
+    if own_writer:
+        writer = db_writer.ResponseWriter()
+    own_parser = parser is None
+    if own_parser:
+        parser = parse_executor.ParseExecutor.from_config(config)
 
-    config['padding_size'] = original_padding_size
-    print()
+    async def tasks():
+        nonlocal chunk_count
+        # A chunk is dispatched as soon as its right-hand neighbour is known.
+        async for previous, chunk, following in _iter_chunk_windows(chunk_stream):
+            chunk_count += 1
+            i = chunk['chunk_index']
+            text_hash = _record_chunk_hash(document_id, config_id, chunk, writer, chunk_hashes.get(i))
+            if text_hash != chunk_hashes.get(i):
+                # The stored response of this index was made from another text (or chunker).
+                cached_indices.discard(i)
 
+            if config["optimization_on"]:
+                if i in cached_indices:
+                    logger.info(f"Response available for chunk Chunk index: {i}")
+                    continue
 
-async def _L0_extract_graph(document_id, config_id, df_chunks, config, progress_callback=None):
-    logger.info(f"L0 Extracting graph from chunks")
+                if await writer.reuse_response(document_id, i, config_id, text_hash) is not None:
+                    logger.info(f"Response reused from an identical chunk for Chunk index: {i}")
+                    continue
 
-    nc = len(df_chunks)
-    chunk_size = config['chunk_size']
-    overlap_coefficient = config['overlap'] / chunk_size
+            parts = []
+            if previous is not None:
+                parts.append(chunk_utils.chunk_tail(previous, overlap))
 
-    if nc == 0:
-        logger.error(f"Document Id: {document_id} ChunkSize: {chunk_size} has {nc} chunks!")
-        return None
+            parts.append(chunk['text'])
 
-    to_process = []
-    for i, chunk in df_chunks.iterrows():
-        if config["optimization_on"] and sqlite_support.response_exists(document_id, i, config_id):
-            logger.info(f"Response available for chunk Chunk index: {i}")
-            continue
+            if following is not None:
+                parts.append(chunk_utils.chunk_head(following, overlap))
 
-        big_text = ""
-        if i > 0:
-            str_o = df_chunks.loc[i - 1, 'text']
-            n = int(len(str_o) * overlap_coefficient)
-            big_text += str_o[-n:]
+            big_text = " ".join(part for part in parts if part)
 
-        big_text += df_chunks.loc[i, 'text']
+            logger.info(f"L0 Extracting entities and relationships from chunk {i}")
+            prompt = prompts.extract_entities_and_relationships_prompt_level0(big_text)
 
-        if i < nc - 1:
-            str_o = df_chunks.loc[i + 1, 'text']
-            n = int(len(str_o) * overlap_coefficient)
-            big_text += str_o[:n]
+            yield document_id, config_id, i, prompt, config, writer, parser
 
-        logger.info(f"L0 Extracting entities and relationships from chunk {i}")
-        prompt = prompts.extract_entities_and_relationships_prompt_level0(big_text)
+        if not abort_manager.is_cancelled():
+            writer.delete_responses_from(document_id, config_id, chunk_count)
 
-        to_process.append((document_id, config_id, chunk.chunk_index, prompt, config))
+    try:
+        await _run_async_tasks(
+            tasks(),
+            _process_chunk,
+            config['max_concurrent_requests'],
+            progress_label="Building graph",
+            progress_callback=progress_callback,
+            expected_jobs=expected_chunks,
+            controller=controller
+        )
+    finally:
+        if own_writer:
+            await writer.close()
+        else:
+            # The merge that follows reads this document's rows back.
+            await writer.flush()
+        if own_parser:
+            await asyncio.to_thread(parser.shutdown)
 
-    await _run_async_tasks_in_batches(
-        to_process,
-        _process_chunk,
-        config['max_concurrent_requests'],
-        progress_label="Building graph",
-        progress_callback=progress_callback
-    )
+    if chunk_count == 0:
+        logger.error(f"Document Id: {document_id} ChunkSize: {config['chunk_size']} has {chunk_count} chunks!")
 
 
 def save_html_file(file_path, html_content):
@@ -302,159 +594,257 @@ def save_html_file(file_path, html_content):
         logger.error(f"An unexpected error occurred while writing to {file_path}: {e}")
 
 
-async def generate_graph_async(pdf_files, config, progress_callback=None):
-    _ensure_directories_exist(config)
+def _document_progress(progress_callback, index, document_count):
+    """Prefixes progress lines with the document number, since several documents run at once."""
+    def callback(message, type_name='progress'):
+        if type_name == 'progress':
+            message = f"[{index}/{document_count}] {message}"
+        progress_callback(message, type_name)
 
-    # -----------------------------------------------------------------------------------
+    return callback
 
-    db_full_path = os.path.join(config['internal_data_dir'], config['db_filename'])
-    sqlite_support.set_database_path(db_full_path)
 
-    # -----------------------------------------------------------------------------------
+def _write_document_html(document_id, config_id, metadata, file_path):
+    nodes, edges = graph_utils.merge_graphs(document_id, config_id, metadata)
 
-    config_id = sqlite_support.get_or_create_config_id(
-        config['api'],
-        config['model'],
-        config['temperature'],
-        config['top_p'],
-        config['chunk_size'],
-        config['padding_size']
-    )
+    nodes_string = nodes.to_csv(index=False)
+    edges_string = edges.to_csv(index=False)
+    metadata_str = json.dumps([metadata])
+    print(metadata_str)
 
-    # -----------------------------------------------------------------------------------
-    generate_composite_graph = config["merge_document_graphs"]
-    all_graphs = []
-    metadata_list = []
-    metadata = {}
+    viewer_html = build_viewer(nodes_string, edges_string, metadata_str)
+    save_html_file(file_path, viewer_html)
+
+    logger.info(f"Graph saved to: {file_path}")
 
-    for i, document_path in enumerate(pdf_files, start=1):
-        if abort_manager.ABORT_FLAG:
-            return
 
-        # -----------------------------------------------------------------------------------
+def _write_composite_html(composite_documents, config, config_id):
+    nodes, edges, metadata_list = composite_graph.build_composite(
+        composite_documents, config_id, config.get('composite_cache_max_entries', composite_graph.DEFAULT_CACHE_ENTRIES))
+    metadata_str = json.dumps(metadata_list)
+    print(metadata_str)
 
-        pdf_filename = os.path.basename(document_path)
-        progress_callback(f"\n[{i}/{len(pdf_files)}] Processing: {pdf_filename}", "log")
+    nodes_string = nodes.to_csv(index=False)
+    edges_string = edges.to_csv(index=False)
 
-        # -----------------------------DOCUMENT----------------------------------------------
+    logger.info(f"BUILDING HTML!")
 
-        hash_code, error_message = my_hash.calculate_file_sha256(document_path)
-        if error_message:
-            logger.info(f"Warning: {error_message}")
-            continue
-        else:
-            logger.info(f"{document_path}  hash: {hash_code}")
+    viewer_html = build_viewer(nodes_string, edges_string, metadata_str)
 
-        document_file_name = os.path.basename(document_path)
-        document_base_name = os.path.splitext(document_file_name)[0]
+    from datetime import datetime
+    timestamp_string = datetime.now().strftime('%Y%m%d_%H%M%S')
 
-        document_id = sqlite_support.get_document_id(hash_code)
-        if document_id is None:
-            logger.info(f"Extracting text from \"{document_path}\"")
-            text = doc_utils.extract_text_from_document(document_path, config, progress_callback)
-            document_id = sqlite_support.insert_document(hash_code, text, document_base_name)
-        else:
-            logger.info(f"Document text exists in cache \"{document_path}\"")
-            text = sqlite_support.get_document_text(document_id)
-
-        # ------------------------------------BUILD CHUNKS------------------------------------
-
-        logger.info(f"Create Chunks for: \"{document_base_name}\"")
-        chunks_df = await asyncio.to_thread(
-            chunk_utils.create_chunks_from_document,
-            document_id,
-            text,
-            config['chunk_size'],
-            progress_callback
-        )
+    file_path = os.path.join(config['output_folder'], f"combined_graph_{timestamp_string}") + '.html'
+    save_html_file(file_path, viewer_html)
 
-        # ------------------------------------------------------------------------------------
-        logger.info("Building graph ...")
-        # ------------------------------------------------------------------------------------
+    logger.info(f"Graph saved to: {file_path}")
 
-        if abort_manager.ABORT_FLAG:
-            return
+    # -------------------------------------------------------------------------------------
+    #      TEMP STUFF   ---------------------- DELETE This in prod
+    # -------------------------------------------------------------------------------------
 
-        if config['padding_size'] > 0:
-            await _L1_extract_entities_from_chunks(document_id, config_id, chunks_df, config, progress_callback)
-            await _L2_extract_graph_big_context(document_id, config_id, chunks_df, config, progress_callback)
-        else:
-            await _L0_extract_graph(document_id, config_id, chunks_df, config, progress_callback)
+    dummy_hash = timestamp_string
+    composite_filename = f"combined_graph_{timestamp_string}.pdf"
+    document_id = sqlite_support.insert_document(dummy_hash, timestamp_string, composite_filename)
 
-        if abort_manager.ABORT_FLAG:
-            return
+    graph_id = sqlite_support.insert_graph(
+        document_id,
+        config_id,
+        nodes_string,
+        edges_string,
+        metadata_list
+    )
 
-        # ------------------------------------------------------------------------------------
-        #                                     MERGE PARTS                                    -
-        # ------------------------------------------------------------------------------------
+    logger.info(f"Merged Graph ID {graph_id}, {len(nodes)} Nodes, {len(edges)} Edges")
 
-        metadata = {
-            "index": 0,
-            "filename": pdf_filename,
-            "sha256": hash_code
-        }
 
-        nodes, edges = graph_utils.merge_graphs(document_id, config_id, metadata)
+def _store_document(hash_code, text, document_base_name, page_hashes):
+    document_id = sqlite_support.insert_document(hash_code, text, document_base_name)
+    if page_hashes is not None:
+        sqlite_support.insert_document_pages(document_id, page_hashes)
+    return document_id
 
-        # -------------------------------------------------------------------------------------
-        #                                   Generate HTML                                     -
-        # -------------------------------------------------------------------------------------
 
-        if generate_composite_graph:
-            all_graphs.append((pdf_filename, nodes, edges))
-            metadata["index"] = i - 1
-            metadata_list.append(metadata)
-        else:
-            nodes_string = nodes.to_csv(index=False)
-            edges_string = edges.to_csv(index=False)
-            metadata_str = json.dumps([metadata])
-            print(metadata_str)
+async def _generate_document_graph(index, document_path, document_count, config, config_id, controller, parser,
+                                   writer, progress_callback, document_locks):
+    """Extracts, chunks and runs the LLM stages for one document, then merges its graph.
+
+    Returns (document_id, hash_code, pdf_filename) for the composite graph, or None when the
+    document was skipped or the run was aborted. document_locks maps file hashes to locks, so
+    copies of the same file in one run are processed one after the other.
+    """
+    pdf_filename = os.path.basename(document_path)
+    progress_callback(f"\n[{index}/{document_count}] Processing: {pdf_filename}", "log")
+    document_progress = _document_progress(progress_callback, index, document_count)
 
-            viewer_html = build_viewer(nodes_string, edges_string, metadata_str)
+    # -----------------------------DOCUMENT----------------------------------------------
 
-            file_path = os.path.join(config['output_folder'], document_base_name) + '.html'
-            save_html_file(file_path, viewer_html)
+    hash_code, error_message = await asyncio.to_thread(my_hash.calculate_file_sha256, document_path)
+    if error_message:
+        logger.info(f"Warning: {error_message}")
+        return None
+    else:
+        logger.info(f"{document_path}  hash: {hash_code}")
+
+    async with document_locks.setdefault(hash_code, asyncio.Lock()):
+        return await _generate_hashed_document_graph(
+            document_path, hash_code, config, config_id, controller, parser, writer, document_progress)
+
+
+async def _generate_hashed_document_graph(document_path, hash_code, config, config_id, controller, parser, writer,
+                                          document_progress):
+    pdf_filename = os.path.basename(document_path)
+    document_base_name = os.path.splitext(pdf_filename)[0]
+
+    # Text extraction, the document reads and writes and the merge run on worker threads, so
+    # they overlap with the LLM requests of the other documents instead of stalling the event loop.
+    document_id = await asyncio.to_thread(sqlite_support.get_document_id, hash_code)
+    if document_id is None:
+        logger.info(f"Extracting text from \"{document_path}\"")
+        # Pages whose content is already cached from an earlier revision are not extracted again.
+        text, page_hashes = await asyncio.to_thread(
+            doc_utils.extract_text_incrementally, document_path, config, document_progress)
+        if abort_manager.is_cancelled():
+            return None
+        document_id = await asyncio.to_thread(_store_document, hash_code, text, document_base_name, page_hashes)
+    else:
+        logger.info(f"Document text exists in cache \"{document_path}\"")
+        text = await asyncio.to_thread(sqlite_support.get_document_text, document_id)
+
+    # ------------------------------------BUILD CHUNKS------------------------------------
+
+    # Chunks are produced on a worker thread and consumed by the first LLM stage
+    # as they arrive, so requests start before the whole document is chunked.
+    logger.info(f"Create Chunks for: \"{document_base_name}\"")
+    chunk_stream = chunk_utils.stream_chunks(document_id, text, config['chunk_size'], document_progress)
+    expected_chunks = chunk_utils.estimate_chunk_count(text, config['chunk_size'])
+
+    # ------------------------------------------------------------------------------------
+    logger.info("Building graph ...")
+    # ------------------------------------------------------------------------------------
+
+    if abort_manager.is_cancelled():
+        return None
 
-            logger.info(f"Graph saved to: {file_path}")
+    if config['padding_size'] > 0:
+        await _L1_L2_extract_graph(
+            document_id, config_id, chunk_stream, config, document_progress, expected_chunks, controller, parser,
+            writer)
+    else:
+        await _L0_extract_graph(
+            document_id, config_id, chunk_stream, config, document_progress, expected_chunks, controller, parser,
+            writer)
+
+    if abort_manager.is_cancelled():
+        return None
+
+    # ------------------------------------------------------------------------------------
+    #                                     MERGE PARTS                                    -
+    # ------------------------------------------------------------------------------------
+
+    metadata = {
+        "index": 0,
+        "filename": pdf_filename,
+        "sha256": hash_code
+    }
+
+    if config["merge_document_graphs"]:
+        # Only ids are kept per document; the composite is merged from the stored graphs.
+        await asyncio.to_thread(graph_utils.merge_graphs, document_id, config_id, metadata)
+        return document_id, hash_code, pdf_filename
 
     # -------------------------------------------------------------------------------------
-    #                                   Composite HTML                                    -
+    #                                   Generate HTML                                     -
     # -------------------------------------------------------------------------------------
 
-    if generate_composite_graph:
-        metadata_str = json.dumps(metadata_list)
-        print(metadata_str)
-        nodes, edges = graph_utils.merge_all_document_graphs(all_graphs)
+    file_path = os.path.join(config['output_folder'], document_base_name) + '.html'
+    await asyncio.to_thread(_write_document_html, document_id, config_id, metadata, file_path)
+    return document_id, hash_code, pdf_filename
 
-        nodes_string = nodes.to_csv(index=False)
-        edges_string = edges.to_csv(index=False)
 
-        logger.info(f"BUILDING HTML!")
+async def generate_graph_async(pdf_files, config, progress_callback=None, cancel_token=None):
+    """Builds the graphs of pdf_files; cancelling cancel_token stops this run and no other."""
+    token = cancel_token or abort_manager.CancellationToken()
+    with abort_manager.cancellation_scope(token):
+        try:
+            return await _generate_graph(pdf_files, config, progress_callback)
+        except asyncio.CancelledError:
+            # Worker threads do not see the task being cancelled, only the token.
+            token.cancel("Run cancelled")
+            raise
 
-        viewer_html = build_viewer(nodes_string, edges_string, metadata_str)
 
-        from datetime import datetime
-        timestamp_string = datetime.now().strftime('%Y%m%d_%H%M%S')
+async def _generate_graph(pdf_files, config, progress_callback):
+    _ensure_directories_exist(config)
 
-        file_path = os.path.join(config['output_folder'], f"combined_graph_{timestamp_string}") + '.html'
-        save_html_file(file_path, viewer_html)
+    # -----------------------------------------------------------------------------------
 
-        logger.info(f"Graph saved to: {file_path}")
+    db_full_path = os.path.join(config['internal_data_dir'], config['db_filename'])
+    sqlite_support.set_database_path(db_full_path)
 
-        # -------------------------------------------------------------------------------------
-        #      TEMP STUFF   ---------------------- DELETE This in prod
-        # -------------------------------------------------------------------------------------
+    # -----------------------------------------------------------------------------------
 
-        dummy_hash = timestamp_string
-        composite_filename = f"combined_graph_{timestamp_string}.pdf"
-        document_id = sqlite_support.insert_document(dummy_hash, timestamp_string, composite_filename)
+    config_id = await asyncio.to_thread(
+        sqlite_support.get_or_create_config_id,
+        config['api'],
+        config['model'],
+        config['temperature'],
+        config['top_p'],
+        config['chunk_size'],
+        config['padding_size']
+    )
 
-        graph_id = sqlite_support.insert_graph(
-            document_id,
-            config_id,
-            nodes_string,
-            edges_string,
-            metadata
-        )
+    # -----------------------------------------------------------------------------------
+    generate_composite_graph = config["merge_document_graphs"]
+
+    # One controller for the whole run: every document draws its requests from the same
+    # adaptive limit (and the process wide rate limiter), so small documents that run
+    # side by side fill the budget that a single one leaves idle.
+    controller = concurrency_controller.ConcurrencyController.from_config(config)
+    # Likewise one parse pool: its pending limit bounds the parse backlog of the whole run,
+    # and no pool is started and torn down per document.
+    parser = parse_executor.ParseExecutor.from_config(config)
+    # And one writer thread, so the documents do not hold one SQLite connection each
+    # and contend for the write lock.
+    writer = db_writer.ResponseWriter()
+    document_slots = asyncio.Semaphore(max(1, config.get('max_concurrent_documents', 1)))
+    document_locks = {}
+
+    async def run_document(index, document_path):
+        async with document_slots:
+            if abort_manager.is_cancelled():
+                return None
+            return await _generate_document_graph(
+                index, document_path, len(pdf_files), config, config_id, controller, parser, writer,
+                progress_callback, document_locks)
+
+    lag_monitor = loop_monitor.EventLoopLagMonitor()
+    lag_monitor.start()
+    documents = [asyncio.create_task(run_document(i, path)) for i, path in enumerate(pdf_files, start=1)]
+    try:
+        results = await asyncio.gather(*documents)
+    finally:
+        for document in documents:
+            document.cancel()
+        await asyncio.gather(*documents, return_exceptions=True)
+        # Waiting for the pool's workers would block the event loop.
+        await asyncio.to_thread(parser.shutdown)
+        await lag_monitor.stop()
+        await writer.close()
+
+    lag_monitor.log_stats(f"{len(pdf_files)} documents")
+    controller.log_stats(f"{len(pdf_files)} documents")
+    response_cache.log_stats()
+
+    if abort_manager.is_cancelled():
+        return
+
+    composite_documents = [result for result in results if result is not None]
+
+    # -------------------------------------------------------------------------------------
+    #                                   Composite HTML                                    -
+    # -------------------------------------------------------------------------------------
+
+    if generate_composite_graph:
+        await asyncio.to_thread(_write_composite_html, composite_documents, config, config_id)
 
-        logger.info(f"Merged Graph ID {graph_id}, {len(nodes)} Nodes, {len(edges)} Edges")
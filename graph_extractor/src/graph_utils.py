@@ -1,6 +1,6 @@
-from io import StringIO
 import sqlite_support
 from log_utils import get_module_logger
+import numpy as np
 import pandas as pd
 
 logging = get_module_logger("graph_utils")
@@ -10,242 +10,428 @@ def sanitize(text: str) -> str:
     return text.replace('|', '_').strip()
 
 
-def merge_graphs_unique(all_graphs):
-    if not all_graphs:
-        logging.warning("Nothing to merge -> merge_graphs_unique() called with empty graphs list!")
-        return pd.DataFrame(), pd.DataFrame()
+def sanitize_series(values: pd.Series) -> pd.Series:
+    """Vectorized sanitize() for a whole column; missing values become empty strings."""
+    return values.fillna('').astype(str).str.replace('|', '_', regex=False).str.strip()
 
-    unique_entities = {}
-    next_entity_id = 0
-    unique_edges = set()
 
-    for graph in all_graphs:
-        df_nodes = graph['nodes']
-        df_edges = graph['edges']
-
-        entity_id_map = {}
+def _concat_frames(frames, columns):
+    """Stacks the given columns of all frames into one frame with a 'graph' column holding the frame index.
 
-        for _, node_data in df_nodes.iterrows():
-            node_label = sanitize(node_data['label'])
-            entity_key = node_label.lower()
+    Works on the raw column arrays, since per-frame pandas operations dominate with thousands of small chunk graphs.
+    """
+    frames = [frame if isinstance(frame, pd.DataFrame) else pd.DataFrame(frame) for frame in frames]
+    used = [(i, frame) for i, frame in enumerate(frames) if not frame.empty]
+    if not used:
+        return pd.DataFrame(columns=columns).assign(graph=pd.Series(dtype='int64'))
 
-            node_type = sanitize(node_data['type'])
+    data = {
+        column: np.concatenate([frame[column].to_numpy() for _, frame in used])
+        for column in columns
+    }
+    data['graph'] = np.repeat([i for i, _ in used], [len(frame) for _, frame in used])
+    return pd.DataFrame(data)
 
-            if entity_key in unique_entities:
-                new_id = unique_entities[entity_key]['id']
-                unique_entities[entity_key]['types'].add(node_type)
-            else:
-                new_id = next_entity_id
-                next_entity_id += 1
 
-                unique_entities[entity_key] = {
-                    'id': int(new_id),
-                    'base_label': node_label,
-                    'types': set([node_type]),
-                }
+def _join_sorted_per_entity(entity_codes, values, entity_count):
+    """'|'.join(sorted(set(values))) per entity code, '' for entities without values.
 
-            original_id = node_data['id']
-            entity_id_map[original_id] = new_id
+    Values are sorted in their own dtype (document indices numerically) before being joined as text.
+    """
+    pairs = pd.DataFrame({'code': np.asarray(entity_codes), 'value': np.asarray(values)}).drop_duplicates()
+    pairs = pairs.sort_values(['code', 'value'], kind='stable')
 
-        for _, edge_data in df_edges.iterrows():
-            source_orig = edge_data["source"]
-            target_orig = edge_data["target"]
-            raw_edge_label = edge_data.get("label", "")
-            edge_label = sanitize(raw_edge_label)
+    joined = np.full(entity_count, '', dtype=object)
+    if pairs.empty:
+        return joined
 
-            if source_orig not in entity_id_map or target_orig not in entity_id_map:
-                continue
+    codes = pairs['code'].to_numpy()
+    texts = pairs['value'].astype(str).tolist()
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], len(codes)]
 
-            source = entity_id_map[source_orig]
-            target = entity_id_map[target_orig]
-            edge_key = (source, target, edge_label.lower())
+    joined[codes[starts]] = ['|'.join(texts[a:b]) for a, b in zip(starts.tolist(), ends.tolist())]
+    return joined
 
-            if edge_key not in unique_edges:
-                unique_edges.add(edge_key)
 
-    merged_nodes_list = []
-    for entity_key, info in unique_entities.items():
-        all_types_str = '|'.join(sorted(t for t in info['types'] if t))
+def _map_endpoints(edges, id_map, entity_column):
+    """Replaces per-graph source/target ids with entity codes; edges with unknown endpoints are dropped."""
+    if edges.empty:
+        return edges.assign(source_code=pd.Series(dtype='int64'), target_code=pd.Series(dtype='int64'))
 
-        merged_nodes_list.append({
-            'id': info['id'],
-            'label': info['base_label'],
-            'type': all_types_str
-        })
+    for endpoint in ['source', 'target']:
+        edges = edges.merge(
+            id_map.rename(columns={'id': endpoint, entity_column: f'{endpoint}_code'}),
+            on=['graph', endpoint], how='left', sort=False
+        )
+    edges = edges.dropna(subset=['source_code', 'target_code'])
+    return edges.astype({'source_code': 'int64', 'target_code': 'int64'})
 
-    df_merged_nodes = pd.DataFrame(merged_nodes_list)
 
-    merged_edges_list = []
-    for (src_id, tgt_id, label_lower) in unique_edges:
-        merged_edges_list.append({
-            "source": src_id,
-            "target": tgt_id,
-            "label": label_lower
-        })
+def _stack_chunk_graphs(all_graphs):
+    """Returns (nodes, entity_keys, edges): the node rows of all chunk graphs with an 'entity' code per
+    case-insensitive label, and the edge rows whose endpoints resolve, with source_code/target_code.
 
-    df_merged_edges = pd.DataFrame(merged_edges_list)
+    Labels and types are sanitized and edge labels lowercased.
+    """
+    nodes = _concat_frames([graph['nodes'] for graph in all_graphs], ['id', 'label', 'type'])
+    nodes['label'] = sanitize_series(nodes['label'])
+    nodes['type'] = sanitize_series(nodes['type'])
+    nodes['entity'], entity_keys = pd.factorize(nodes['label'].str.lower())
 
+    edge_frames = []
+    for graph in all_graphs:
+        frame = graph['edges']
+        if not isinstance(frame, pd.DataFrame):
+            frame = pd.DataFrame(frame)
+        if not frame.empty and 'label' not in frame.columns:
+            frame = frame.assign(label='')
+        edge_frames.append(frame)
+    edges = _concat_frames(edge_frames, ['source', 'target', 'label'])
+
+    # A chunk graph may list an id twice; like a dict, the last node with that id wins.
+    id_map = nodes[['graph', 'id', 'entity']].drop_duplicates(['graph', 'id'], keep='last')
+    edges = _map_endpoints(edges, id_map, 'entity')
+    edges['label'] = sanitize_series(edges['label']).str.lower()
+    return nodes, entity_keys, edges
+
+
+def _unique_frames(nodes, entity_keys, edges):
+    entity_count = len(entity_keys)
+    typed = nodes[nodes['type'] != '']
+    df_merged_nodes = pd.DataFrame({
+        'id': range(entity_count),
+        'label': nodes.drop_duplicates('entity')['label'].to_numpy(),
+        'type': _join_sorted_per_entity(typed['entity'], typed['type'], entity_count)
+    })
+
+    df_merged_edges = pd.DataFrame({
+        'source': edges['source_code'].to_numpy(),
+        'target': edges['target_code'].to_numpy(),
+        'label': edges['label'].to_numpy()
+    }).drop_duplicates(ignore_index=True)
     return df_merged_nodes, df_merged_edges
 
 
-def merge_graphs(document_id, config_id, metadata):
-    graphs = []
-    responses = sqlite_support.get_all_responses_for(
-        document_id,
-        config_id
-    )
-
-    for r in responses:
-        df_nodes = pd.read_csv(StringIO(r["nodes"]))
-        df_edges = pd.read_csv(StringIO(r["edges"]))
+def merge_graphs_unique(all_graphs):
+    """Merges chunk graphs into one graph with a node per case-insensitive label.
 
-        logging.info(f"Merge responses {df_nodes}")
-        logging.info(f"Merge responses {df_edges}")
+    Node ids follow the order in which labels first appear. Edges are unique per
+    (source, target, lowercase label) and keep the order of their first appearance.
+    """
+    if not all_graphs:
+        logging.warning("Nothing to merge -> merge_graphs_unique() called with empty graphs list!")
+        return pd.DataFrame(), pd.DataFrame()
 
-        df_nodes['id'] = pd.to_numeric(df_nodes['id'], errors='coerce')
-        df_nodes.dropna(subset=['id'], inplace=True)
-        df_nodes['id'] = df_nodes['id'].astype(int)
-        df_nodes = df_nodes[df_nodes['id'] >= 0]
+    nodes, entity_keys, edges = _stack_chunk_graphs(all_graphs)
+    if nodes.empty:
+        return pd.DataFrame(), pd.DataFrame()
 
-        df_edges['source'] = pd.to_numeric(df_edges['source'], errors='coerce')
-        df_edges['target'] = pd.to_numeric(df_edges['target'], errors='coerce')
-        df_edges.dropna(subset=['source', 'target'], inplace=True)
-        df_edges['source'] = df_edges['source'].astype(int)
-        df_edges['target'] = df_edges['target'].astype(int)
+    df_merged_nodes, df_merged_edges = _unique_frames(nodes, entity_keys, edges)
+    if df_merged_edges.empty:
+        df_merged_edges = pd.DataFrame()
 
-        df_edges = df_edges[(df_edges['source'] >= 0) & (df_edges['target'] >= 0)]
+    return df_merged_nodes, df_merged_edges
 
-        df_nodes['label'] = df_nodes['label'].astype(str)
-        df_edges['label'] = df_edges['label'].astype(str)
 
-        graphs.append({'nodes': df_nodes, 'edges': df_edges})
+def _response_contribution(record):
+    """Returns the ([key, label, type] nodes, [source key, target key, label] edges) one chunk response adds."""
+    nodes = []
+    key_of_id = {}
+    for node_id, label, node_type in record['nodes']:
+        label = sanitize(label)
+        key = label.lower()
+        nodes.append([key, label, sanitize(node_type)])
+        key_of_id[node_id] = key
 
-    nodes, edges = merge_graphs_unique(graphs)
+    edges = []
+    for source, target, label in record['edges']:
+        if source in key_of_id and target in key_of_id:
+            edges.append([key_of_id[source], key_of_id[target], sanitize(label).lower()])
 
-    nodes_string = nodes.to_csv(index=False)
-    edges_string = edges.to_csv(index=False)
+    return nodes, edges
 
-    graph_id = sqlite_support.insert_graph(
-        document_id,
-        config_id,
-        nodes_string,
-        edges_string,
-        metadata
-    )
 
-    logging.info(f"Merged Graph ID {graph_id}, {len(nodes)} Nodes, {len(edges)} Edges")
+def _apply_contribution(state, edge_counts, nodes, edges, sign):
+    """Adds (sign=1) or removes (sign=-1) one chunk's nodes and edges from the reference counted merge state."""
+    entities = state['entities']
+    for key, label, node_type in nodes:
+        entity = entities.get(key)
+        if entity is None:
+            entity = entities[key] = {'id': state['next_id'], 'label': label, 'types': {}, 'count': 0}
+            state['next_id'] += 1
+
+        entity['count'] += sign
+        entity['types'][node_type] = entity['types'].get(node_type, 0) + sign
+        if entity['types'][node_type] == 0:
+            del entity['types'][node_type]
+        if entity['count'] == 0:
+            del entities[key]
+
+    for source, target, label in edges:
+        edge_key = (source, target, label)
+        edge_counts[edge_key] = edge_counts.get(edge_key, 0) + sign
+        if edge_counts[edge_key] == 0:
+            del edge_counts[edge_key]
+
+
+def _counted_state(nodes, entity_keys, edges):
+    """Builds the reference counted merge state of a merge done by _unique_frames from its stacked rows."""
+    first = nodes.drop_duplicates('entity').set_index('entity')['label']
+    counts = nodes.groupby('entity').size()
+    types = nodes.groupby(['entity', 'type']).size()
+
+    entities = {}
+    for code, key in enumerate(entity_keys):
+        entities[key] = {'id': code, 'label': first[code], 'types': {}, 'count': int(counts[code])}
+    for (code, node_type), count in types.items():
+        entities[entity_keys[code]]['types'][node_type] = int(count)
+
+    edge_counts = edges.groupby(['source_code', 'target_code', 'label'], sort=False).size()
+    return {
+        'next_id': len(entity_keys),
+        'entities': entities,
+        'edges': {(entity_keys[source], entity_keys[target], label): int(count)
+                  for (source, target, label), count in edge_counts.items()}
+    }
+
+
+def _state_to_frames(state, edge_counts):
+    entities = sorted(state['entities'].values(), key=lambda entity: entity['id'])
+    nodes = pd.DataFrame({
+        'id': [entity['id'] for entity in entities],
+        'label': [entity['label'] for entity in entities],
+        'type': ['|'.join(sorted(t for t in entity['types'] if t)) for entity in entities]
+    })
+
+    entity_ids = {key: entity['id'] for key, entity in state['entities'].items()}
+    edges = pd.DataFrame({
+        'source': [entity_ids[source] for source, _, _ in edge_counts],
+        'target': [entity_ids[target] for _, target, _ in edge_counts],
+        'label': [label for _, _, label in edge_counts]
+    })
+    return nodes, edges
 
-    logging.info(f"Finished graph\n{nodes}")
-    logging.info(f"Finished graph\n{edges}")
 
-    return nodes, edges
+def _stored_graph_frames(document_id, config_id):
+    """Returns the (nodes, edges) frames of the stored graph, or None."""
+    for _, nodes, edges in sqlite_support.iter_graphs([document_id], config_id):
+        return (pd.DataFrame(nodes, columns=['id', 'label', 'type']),
+                pd.DataFrame(edges, columns=['source', 'target', 'label']))
+    return None
 
 
-def merge_all_document_graphs(all_graphs):
-    entity_map = {}
-    next_entity_id = 0
+def _record_frames(record):
+    return {'nodes': pd.DataFrame(record['nodes'], columns=['id', 'label', 'type']),
+            'edges': pd.DataFrame(record['edges'], columns=['source', 'target', 'label'])}
 
-    edge_map = {}
 
-    for doc_index, (pdf_filename, df_nodes, df_edges) in enumerate(all_graphs):
-        node_id_to_label = {}
+def _merge_from_scratch(document_id, config_id, current_revisions):
+    """Merges all chunk responses with the columnar merge and stores the reference counted state it implies."""
+    records = sqlite_support.get_response_records(document_id, config_id, sorted(current_revisions))
+    records = sorted(records.items())
 
-        logging.info(f"=>>>>>>>>>>>>>>>>>>>>>\n{df_edges}")
+    stacked = _stack_chunk_graphs([_record_frames(record) for _, record in records])
+    state = _counted_state(*stacked)
+    contributions = [(chunk_index, record['revision'], *_response_contribution(record))
+                     for chunk_index, record in records]
 
-        for _, node_row in df_nodes.iterrows():
-            original_id = int(node_row['id'])
-            raw_label = str(node_row['label'])
-            node_type = str(node_row.get('type'))
+    sqlite_support.delete_merge_state(document_id, config_id)
+    sqlite_support.save_merge_state(document_id, config_id, state['next_id'], state['entities'], state['edges'],
+                                    contributions, [])
+    return _unique_frames(*stacked)
 
-            node_label = sanitize(raw_label)
-            node_label_lower = node_label.lower()
 
-            logging.info(f"Processing Node({original_id}) {raw_label}  ->  {node_type} ")
+def _merge_changes(document_id, config_id, known_revisions, changed, removed):
+    """Updates the stored merge state with the changed and removed chunks and returns the resulting graph."""
+    state = sqlite_support.get_merge_state(document_id, config_id)
+    if state is None:
+        return None
 
-            node_id_to_label[original_id] = node_label
+    edge_counts = state['edges']
+    touched_entities, touched_edges = set(), set()
 
-            if not node_label:
-                logging.warning(f"{pdf_filename} - Label is none after sanitized {raw_label}")
-                continue
+    # New contributions go in before old ones come out, so entities that survive an update keep their id.
+    contributions = []
+    records = sqlite_support.get_response_records(document_id, config_id, changed)
+    for chunk_index, record in sorted(records.items()):
+        nodes, edges = _response_contribution(record)
+        _apply_contribution(state, edge_counts, nodes, edges, 1)
+        contributions.append((chunk_index, record['revision'], nodes, edges))
+        touched_entities.update(key for key, _, _ in nodes)
+        touched_edges.update(map(tuple, edges))
 
-            if node_label_lower not in entity_map:
-                entity_map[node_label_lower] = {
-                    'id': int(next_entity_id),
-                    'base_label': node_label,
-                    'types': {node_type},
-                    'doc_set': {doc_index}
-                }
-                next_entity_id += 1
-            else:
-                entity_map[node_label_lower]['types'].add(node_type)
-                entity_map[node_label_lower]['doc_set'].add(doc_index)
+    replaced = [c for c in changed + removed if c in known_revisions]
+    for nodes, edges in sqlite_support.get_merge_contributions(document_id, config_id, replaced).values():
+        _apply_contribution(state, edge_counts, nodes, edges, -1)
+        touched_entities.update(key for key, _, _ in nodes)
+        touched_edges.update(map(tuple, edges))
 
-        for _, edge_row in df_edges.iterrows():
-            src_orig = edge_row['source']
-            tgt_orig = edge_row['target']
+    # Only the entities and edges the changed chunks touched are written back.
+    sqlite_support.save_merge_state(
+        document_id,
+        config_id,
+        state['next_id'],
+        {key: state['entities'].get(key) for key in touched_entities},
+        {edge: edge_counts.get(edge, 0) for edge in touched_edges},
+        contributions,
+        removed
+    )
+    return _state_to_frames(state, edge_counts)
 
-            logging.info(f"Processing Edge {edge_row['label']} {src_orig} {tgt_orig}")
 
-            raw_edge_label = str(edge_row['label'])
-            edge_label = sanitize(raw_edge_label)
-            edge_label_lower = edge_label.lower()
+def merge_graphs(document_id, config_id, metadata):
+    """Merges the chunk responses of a document and stores the resulting graph.
+
+    The first merge runs merge_graphs_unique's columnar merge over all chunks and stores
+    reference counts per entity and edge along with every chunk's contribution. Later merges
+    only remove the old contribution of a re-run chunk and add the new one; unchanged chunks
+    are not read again. When no chunk changed, the stored graph is returned as it is and only
+    its metadata is updated.
+    """
+    known_revisions = sqlite_support.get_merge_revisions(document_id, config_id)
+    current_revisions = sqlite_support.get_response_revisions(document_id, config_id)
+
+    if known_revisions is not None and known_revisions == current_revisions:
+        stored = _stored_graph_frames(document_id, config_id)
+        if stored is not None:
+            logging.info(f"Merging document ID {document_id}: all {len(current_revisions)} chunks unchanged, "
+                         f"using the stored graph")
+            # The same document may come back under another name, so the metadata is still kept current.
+            sqlite_support.update_graph_metadata(document_id, config_id, metadata)
+            return stored
+
+    merged = None
+    if known_revisions is not None:
+        changed = sorted(c for c, revision in current_revisions.items() if known_revisions.get(c) != revision)
+        removed = sorted(c for c in known_revisions if c not in current_revisions)
+        logging.info(f"Merging document ID {document_id}: {len(changed)} new or changed chunks, "
+                     f"{len(removed)} removed, {len(current_revisions) - len(changed)} unchanged")
+        merged = _merge_changes(document_id, config_id, known_revisions, changed, removed)
+    if merged is None:
+        logging.info(f"Merging document ID {document_id}: {len(current_revisions)} chunks from scratch")
+        merged = _merge_from_scratch(document_id, config_id, current_revisions)
+
+    nodes = merged[0].reindex(columns=['id', 'label', 'type'])
+    edges = merged[1].reindex(columns=['source', 'target', 'label'])
 
-            if src_orig not in node_id_to_label or tgt_orig not in node_id_to_label:
-                logging.warning(f"Not found {src_orig} or {tgt_orig} in {node_id_to_label}")
-                continue
+    nodes_string = nodes.to_csv(index=False)
+    edges_string = edges.to_csv(index=False)
 
-            src_node_label_lower = node_id_to_label[src_orig].lower()
-            tgt_node_label_lower = node_id_to_label[tgt_orig].lower()
+    graph_id = sqlite_support.insert_graph(
+        document_id,
+        config_id,
+        nodes_string,
+        edges_string,
+        metadata
+    )
 
-            final_src_id = entity_map[src_node_label_lower]['id']
-            final_tgt_id = entity_map[tgt_node_label_lower]['id']
+    logging.info(f"Merged Graph ID {graph_id}, {len(nodes)} Nodes, {len(edges)} Edges")
 
-            edge_key = (final_src_id, final_tgt_id, edge_label_lower)
+    logging.info(f"Finished graph\n{nodes}")
+    logging.info(f"Finished graph\n{edges}")
 
-            if edge_key not in edge_map:
-                edge_map[edge_key] = {
-                    'source': final_src_id,
-                    'target': final_tgt_id,
-                    'base_label': edge_label,
-                    'doc_set': {doc_index}
-                }
-            else:
-                edge_map[edge_key]['doc_set'].add(doc_index)
+    return nodes, edges
 
-    merged_nodes_list = []
-    for node_label_lower, info in entity_map.items():
-        if len(info['types']) > 1:
-            logging.info(f"Label '{info['base_label']}' has multiple types: {info['types']}")
 
-        doc_str = '|'.join(str(d) for d in sorted(info['doc_set']))
-        final_label = f"{info['base_label']}|{doc_str}"
+def fold_document_graph(state, edge_map, doc_index, nodes, edges):
+    """Adds one document graph to a document merge state.
+
+    nodes holds (node_id, label, type) and edges (source, target, label) rows. Entities are keyed
+    by their lowercase sanitized label and keep the label they were first seen with; nodes with an
+    empty label are skipped, and so are the edges to them. Entities and edges collect the types and
+    the indices of the documents they occur in; documents must be folded in index order.
+    """
+    if not nodes:
+        return
+
+    entities = state['entities']
+    label_of_id = {}
+    for node_id, label, node_type in nodes:
+        label = sanitize(label)
+        label_of_id[node_id] = label
+        if not label:
+            continue
+
+        entity = entities.get(label.lower())
+        if entity is None:
+            entities[label.lower()] = {'id': state['next_id'], 'label': label, 'types': [node_type], 'docs': [doc_index]}
+            state['next_id'] += 1
+        else:
+            if node_type not in entity['types']:
+                entity['types'].append(node_type)
+            if entity['docs'][-1] != doc_index:
+                entity['docs'].append(doc_index)
+
+    for source, target, label in edges:
+        label = sanitize(label)
+        if source not in label_of_id or target not in label_of_id:
+            continue
+        source_key, target_key = label_of_id[source].lower(), label_of_id[target].lower()
+        if source_key not in entities or target_key not in entities:
+            continue
+
+        edge = edge_map.get((source_key, target_key, label.lower()))
+        if edge is None:
+            edge_map[(source_key, target_key, label.lower())] = {'label': label, 'docs': [doc_index]}
+        elif edge['docs'][-1] != doc_index:
+            edge['docs'].append(doc_index)
+
+
+def document_graph_frames(state, edge_map):
+    """Returns the (nodes, edges) frames of a document merge state; labels get a '|'-separated suffix of
+    the documents they occur in."""
+    def docs(doc_indices):
+        return '|'.join(str(d) for d in doc_indices)
+
+    entities = sorted(state['entities'].values(), key=lambda entity: entity['id'])
+    nodes = pd.DataFrame({
+        'id': [entity['id'] for entity in entities],
+        'label': [f"{entity['label']}|{docs(entity['docs'])}" for entity in entities],
+        'type': ['|'.join(sorted(t for t in entity['types'] if t)) for entity in entities]
+    })
+
+    entity_ids = {key: entity['id'] for key, entity in state['entities'].items()}
+    edges = pd.DataFrame({
+        'source': [entity_ids[source] for source, _, _ in edge_map],
+        'target': [entity_ids[target] for _, target, _ in edge_map],
+        'label': [f"{edge['label']}|{docs(edge['docs'])}" for edge in edge_map.values()]
+    })
+    return nodes, edges
 
-        all_types_str = '|'.join(sorted(t for t in info['types'] if t))
 
-        merged_nodes_list.append({
-            'id': info['id'],
-            'label': final_label,
-            'type': all_types_str
-        })
+def _frame_rows(frame, columns, text_columns):
+    """Returns the rows of a frame as tuples; missing text becomes an empty string."""
+    if frame.empty or not set(columns) <= set(frame.columns):
+        return []
+    frame = frame[columns].copy()
+    for column in text_columns:
+        frame[column] = frame[column].fillna('').astype(str)
+    return list(frame.itertuples(index=False, name=None))
 
-    merged_nodes = pd.DataFrame(merged_nodes_list)
 
-    logging.info(f"Merged Nodes\n{merged_nodes}")
+def merge_all_document_graphs(all_graphs):
+    """Merges (filename, nodes, edges) document graphs; labels get a '|'-separated suffix of the documents they occur in.
 
-    merged_edges_list = []
-    for (src_id, tgt_id, edge_label_lower), info in edge_map.items():
-        logging.info(f"Merging edge {edge_label_lower}")
-        doc_str = '|'.join(str(d) for d in sorted(info['doc_set']))
-        final_edge_label = f"{info['base_label']}|{doc_str}"
+    Uses the same fold as composite_graph.build_composite, which merges the stored graphs incrementally.
+    """
+    if not all_graphs:
+        return pd.DataFrame(), pd.DataFrame()
 
-        merged_edges_list.append({
-            'source': src_id,
-            'target': tgt_id,
-            'label': final_edge_label
-        })
+    state, edge_map = {'next_id': 0, 'entities': {}}, {}
+    for doc_index, (_, df_nodes, df_edges) in enumerate(all_graphs):
+        nodes = _frame_rows(df_nodes, ['id', 'label', 'type'], ['label', 'type'])
+        edges = _frame_rows(df_edges, ['source', 'target', 'label'], ['label'])
+        fold_document_graph(state, edge_map, doc_index, nodes, edges)
 
-    merged_edges = pd.DataFrame(merged_edges_list)
+    if not state['entities']:
+        return pd.DataFrame(), pd.DataFrame()
 
+    merged_nodes, merged_edges = document_graph_frames(state, edge_map)
+    logging.info(f"Merged Nodes\n{merged_nodes}")
     logging.info(f"Merged Edges\n{merged_edges}")
 
+    if merged_edges.empty:
+        merged_edges = pd.DataFrame()
+
     return merged_nodes, merged_edges
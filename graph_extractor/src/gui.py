@@ -1,3 +1,4 @@
+import multiprocessing
 import ttkbootstrap as tb
 from gui_initial_window import build_initial_gui
 from gui_config_window import build_config_gui
@@ -20,4 +21,6 @@ def main():
 
 
 if __name__ == '__main__':
+    # Needed by the PDF extraction process pool in the frozen executable.
+    multiprocessing.freeze_support()
     main()
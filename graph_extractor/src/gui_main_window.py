@@ -4,7 +4,6 @@ from tkinter import filedialog
 from ttkbootstrap import ttk
 from ttkbootstrap.dialogs import Messagebox
 import config as cfg
-import abort_manager
 from gui_status_window import show_status_window
 from gui_tooltip import Tooltip
 
@@ -29,7 +28,6 @@ def generate(root, config):
     if not selected_files:
         Messagebox.show_warning("Warning", "No PDF files selected.")
         return
-    abort_manager.ABORT_FLAG = False
     show_status_window(root, selected_files, config)
 
 
@@ -10,6 +10,7 @@ import subprocess
 
 import abort_manager
 import graph_generator as gg
+import llm_api
 from gui_utils import center_window
 from log_utils import get_module_logger
 
@@ -82,6 +83,7 @@ def show_status_window(root, selected_files, config):
     status_window_data = {
         "text_widget": status_text,
         "should_abort": False,
+        "cancel_token": abort_manager.CancellationToken(),
         "progress_line_index": None,
         "window": status_window,
         "success": None
@@ -101,7 +103,7 @@ def show_status_window(root, selected_files, config):
     abort_button.pack(side=tk.LEFT)
 
     def on_ok():
-        if status_window_data["success"] and not abort_manager.ABORT_FLAG:
+        if status_window_data["success"] and not status_window_data["cancel_token"].cancelled:
             open_output_folder(config["output_folder"])
         status_window.destroy()
 
@@ -196,7 +198,7 @@ def show_status_window(root, selected_files, config):
 def abort_processing(status_window_data, abort_button):
     add_status_message(status_window_data, "\nUser pressed abort. Attempting to stop...")
     status_window_data["should_abort"] = True
-    abort_manager.ABORT_FLAG = True
+    status_window_data["cancel_token"].cancel("User pressed abort")
     abort_button.configure(state=tk.DISABLED)
 
 
@@ -209,13 +211,15 @@ def process_files_for_real(selected_files, config, status_window_data):
             gg.generate_graph_async(
                 selected_files,
                 config,
-                lambda m, type_name='progress': message_queue.put({"type": type_name, "text": m})
+                lambda m, type_name='progress': message_queue.put({"type": type_name, "text": m}),
+                status_window_data["cancel_token"]
             )
         )
     except Exception as e:
         logger.exception(f"Error processing files")
         message_queue.put({"type": "error", "text": f"{str(e)}"})
 
+    loop.run_until_complete(llm_api.close_async_clients())
     loop.close()
 
     message_queue.put({"type": "done"})
@@ -1,13 +1,21 @@
 import os
 import asyncio
+import contextvars
 import requests
 import gpt as gpt
+import concurrency_controller
+import rate_limiter
 from log_utils import get_module_logger
 
 
 logger = get_module_logger("llm_api")
 
 llm_config = None
+# Overrides llm_config for one asyncio task and the work it starts, so concurrent jobs in
+# one process can use different models.
+_task_llm_config = contextvars.ContextVar('llm_config', default=None)
+
+_async_clients = {}
 
 
 def set_llm_config(config):
@@ -15,10 +23,20 @@ def set_llm_config(config):
     llm_config = config
 
 
+def use_llm_config(config):
+    """Sets the LLM config for the current task; threads started through the task's context see it too."""
+    _task_llm_config.set(config)
+
+
+def _current_llm_config():
+    return _task_llm_config.get() or llm_config
+
+
 def get_llm_config():
-    if llm_config is None:
+    config = _current_llm_config()
+    if config is None:
         raise ValueError("LLM configuration not set.")
-    return llm_config
+    return config
 
 
 async def obtain_api_key(config):
@@ -37,24 +55,113 @@ async def obtain_api_key(config):
     return True
 
 
+def _client_key(config):
+    return (config['api'], config['api_key'], config['max_concurrent_requests'], config.get('concurrency_max_limit'),
+            config['llm_timeout'])
+
+
+def get_async_client(config):
+    """Returns the pooled client for this config and the running loop, creating it on first use.
+
+    Clients are kept per loop, since an httpx pool can only be used (and closed) from the loop
+    it was created in; jobs running their own loops at the same time each get their own client.
+    """
+    loop = asyncio.get_running_loop()
+    key = (loop, _client_key(config))
+
+    client = _async_clients.get(key)
+    if client is not None:
+        return client
+
+    if config['api'] == 'openai':
+        client = gpt.create_async_client(config)
+    else:
+        logger.error(f"Unknown API name: {config['api']}")
+        return None
+
+    # A client bound to a finished loop can not be closed anymore, only dropped.
+    for stale_key in [k for k in _async_clients if k[0].is_closed()]:
+        del _async_clients[stale_key]
+
+    _async_clients[key] = client
+    logger.info(f"Created async {config['api']} client with {config['max_concurrent_requests']} connections.")
+    return client
+
+
+async def close_async_clients():
+    """Closes the clients of the running loop."""
+    loop = asyncio.get_running_loop()
+    for key, client in list(_async_clients.items()):
+        client_loop = key[0]
+        if client_loop is loop:
+            await client.close()
+            del _async_clients[key]
+        elif client_loop.is_closed():
+            del _async_clients[key]
+
+
+def _raise_if_overloaded(error):
+    retryable, retry_after, overloaded = gpt.overload_retry_after(error)
+    if retryable:
+        raise concurrency_controller.Overloaded(str(error), retry_after, lower_limit=overloaded) from error
+
+
 async def execute(prompt, config):
     response = None
     if config['api'] == 'openai':
-        response = await asyncio.to_thread(gpt.execute_prompt, prompt, config)
+        client = get_async_client(config)
+        limiter = rate_limiter.get_rate_limiter(config)
+        # Token counting is CPU bound, so it runs off the event loop.
+        input_length, estimate = await asyncio.to_thread(gpt.estimate_request_tokens, prompt, config)
+        reservation = await limiter.reserve(estimate)
+        usage = {}
+        try:
+            response = await gpt.execute_prompt_async(prompt, config, client, input_length, usage)
+        except gpt.OpenAIError as e:
+            _raise_if_overloaded(e)
+            raise
+        finally:
+            limiter.reconcile(reservation, usage.get('total_tokens'))
     else:
         logger.error(f"Unknown API name: {config['api']}")
 
     return response
 
 
+async def execute_stream(prompt, config):
+    """Streaming counterpart of execute(): yields the response text as it arrives."""
+    if config['api'] == 'openai':
+        client = get_async_client(config)
+        limiter = rate_limiter.get_rate_limiter(config)
+        input_length, estimate = await asyncio.to_thread(gpt.estimate_request_tokens, prompt, config)
+        reservation = await limiter.reserve(estimate)
+        usage = {}
+        try:
+            async for text in gpt.stream_prompt_async(prompt, config, client, input_length, usage):
+                yield text
+        except gpt.OpenAIError as e:
+            _raise_if_overloaded(e)
+            raise
+        finally:
+            limiter.reconcile(reservation, usage.get('total_tokens'))
+    else:
+        logger.error(f"Unknown API name: {config['api']}")
+
+
 def count_tokens(text):
-    if llm_config:
-        if llm_config['api'] == 'openai':
-            return gpt.count_tokens(text, llm_config['model'])
-        else:
-            logger.error(f"Unknown API name: {llm_config['api']}")
+    config = get_llm_config()
+    if config['api'] == 'openai':
+        return gpt.count_tokens(text, config['model'])
     else:
-        raise ValueError("LLM configuration not set.")
+        logger.error(f"Unknown API name: {config['api']}")
+
+
+def count_tokens_batch(texts):
+    config = get_llm_config()
+    if config['api'] == 'openai':
+        return gpt.count_tokens_batch(texts, config['model'])
+    else:
+        logger.error(f"Unknown API name: {config['api']}")
 
 
 def test_api(config):
@@ -0,0 +1,53 @@
+import asyncio
+from log_utils import get_module_logger
+
+logger = get_module_logger("loop_monitor")
+
+DEFAULT_INTERVAL = 0.01
+
+
+class EventLoopLagMonitor:
+    """Measures how late a periodic timer fires, i.e. how long the event loop was blocked."""
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            self.samples += 1
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    def get_stats(self):
+        return {
+            'samples': self.samples,
+            'total_lag': self.total_lag,
+            'max_lag': self.max_lag,
+            'mean_lag': self.total_lag / self.samples if self.samples else 0.0
+        }
+
+    def log_stats(self, label):
+        stats = self.get_stats()
+        logger.info(f"{label} event loop lag: max {stats['max_lag'] * 1000:.1f} ms, "
+                    f"mean {stats['mean_lag'] * 1000:.2f} ms, total {stats['total_lag'] * 1000:.0f} ms")
@@ -0,0 +1,102 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import chunk_utils
+
+
+def _word_count_batch(texts):
+    return [len(text.split()) for text in texts]
+
+
+class TestCreateChunksFromDocument(unittest.TestCase):
+    def setUp(self):
+        self.text = "\n\n".join(
+            " ".join(f"Sentence {p}-{s} has five words." for s in range(8)) for p in range(40)
+        )
+
+    def test_each_unit_counted_once(self):
+        with mock.patch.object(chunk_utils, "count_tokens_batch", side_effect=_word_count_batch) as counter:
+            df = chunk_utils.create_chunks_from_document(1, self.text, 100)
+
+        counted = [text for call in counter.call_args_list for text in call.args[0]]
+        self.assertEqual(len(counted), 40 * 8)
+        self.assertEqual(df["chunk_size"].sum(), 40 * 8 * 5)
+
+    def test_chunks_respect_token_limits(self):
+        with mock.patch.object(chunk_utils, "count_tokens_batch", side_effect=_word_count_batch):
+            df = chunk_utils.create_chunks_from_document(1, self.text, 100)
+
+        self.assertEqual(list(df["chunk_index"]), list(range(len(df))))
+        # Only the last chunk may exceed the limit, when a short remainder was merged into it.
+        self.assertTrue((df["chunk_size"][:-1] <= 110).all())
+        self.assertTrue((df["chunk_size"] >= 50).all())
+        self.assertEqual(" ".join(df["text"]).split(), self.text.split())
+
+    def test_offsets_are_exact(self):
+        with mock.patch.object(chunk_utils, "count_tokens_batch", side_effect=_word_count_batch):
+            df = chunk_utils.create_chunks_from_document(1, self.text, 100)
+
+        chunks = df.to_dict('records')
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertEqual(previous['token_end'], chunk['token_start'])
+        self.assertEqual(chunks[-1]['token_end'], 40 * 8 * 5)
+
+        for chunk in chunks:
+            self.assertEqual(chunk['token_end'] - chunk['token_start'], chunk['chunk_size'])
+            source = self.text[chunk['char_start']:chunk['char_end']]
+            self.assertEqual(source.split(), chunk['text'].split())
+            for char_offset, token_offset in chunk['unit_offsets']:
+                self.assertTrue(chunk['text'][char_offset:].startswith("Sentence"))
+                self.assertEqual(len(chunk['text'][:char_offset].split()), token_offset)
+
+    def test_head_and_tail_cut_at_unit_boundaries(self):
+        with mock.patch.object(chunk_utils, "count_tokens_batch", side_effect=_word_count_batch):
+            chunk = chunk_utils.create_chunks_from_document(1, self.text, 100).to_dict('records')[0]
+
+        head = chunk_utils.chunk_head(chunk, 12)
+        tail = chunk_utils.chunk_tail(chunk, 12)
+
+        self.assertEqual(len(head.split()), 10)
+        self.assertTrue(chunk['text'].startswith(head))
+        self.assertEqual(len(tail.split()), 10)
+        self.assertTrue(chunk['text'].endswith(tail))
+        self.assertEqual(chunk_utils.chunk_head(chunk, 0), "")
+        self.assertEqual(chunk_utils.chunk_tail(chunk, 1000), chunk['text'])
+
+    def test_stream_matches_dataframe(self):
+        async def collect():
+            return [chunk async for chunk in chunk_utils.stream_chunks(1, self.text, 100)]
+
+        with mock.patch.object(chunk_utils, "count_tokens_batch", side_effect=_word_count_batch):
+            df = chunk_utils.create_chunks_from_document(1, self.text, 100)
+            streamed = asyncio.run(collect())
+
+        self.assertEqual(streamed, df.to_dict('records'))
+
+    def test_stream_reports_progress(self):
+        messages = []
+
+        async def collect():
+            return [chunk async for chunk in chunk_utils.stream_chunks(1, self.text, 100, messages.append)]
+
+        with mock.patch.object(chunk_utils, "count_tokens_batch", side_effect=_word_count_batch):
+            asyncio.run(collect())
+
+        self.assertEqual(messages[0], "Preparing text: 0%")
+        self.assertEqual(messages[-1], "Preparing text: 100%")
+
+    def test_edit_only_changes_nearby_chunks(self):
+        edited = "Inserted paragraph at the start.\n\n" + self.text
+
+        with mock.patch.object(chunk_utils, "count_tokens_batch", side_effect=_word_count_batch):
+            before = set(chunk_utils.create_chunks_from_document(1, self.text, 100)["text"])
+            after = list(chunk_utils.create_chunks_from_document(1, edited, 100)["text"])
+
+        changed = [text for text in after if text not in before]
+        self.assertLessEqual(len(changed), 3)
+        self.assertGreater(len(after), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
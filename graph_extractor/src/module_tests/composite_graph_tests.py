@@ -0,0 +1,98 @@
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+import composite_graph
+import graph_utils
+import sqlite_support
+
+
+def _document_graph(rng):
+    labels = ["Alice", "alice", "Bob", "Carol", "Dave", "Eve", "Frank"]
+    graph = {
+        'nodes': pd.DataFrame({
+            'id': range(6),
+            'label': [rng.choice(labels) for _ in range(6)],
+            'type': [rng.choice(["Person", "Place", ""]) for _ in range(6)]
+        }),
+        'edges': pd.DataFrame({
+            'source': [rng.randrange(6) for _ in range(8)],
+            'target': [rng.randrange(6) for _ in range(8)],
+            'label': [rng.choice(["knows", "Knows", "visits"]) for _ in range(8)]
+        })
+    }
+    return graph_utils.merge_graphs_unique([graph])
+
+
+class TestCompositeGraph(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        sqlite_support._thread_local.connection = None
+        sqlite_support.set_database_path(os.path.join(self.tmp_dir.name, "db", "test.db"))
+
+        rng = random.Random(3)
+        self.documents = []
+        self.graphs = []
+        for i in range(4):
+            nodes, edges = _document_graph(rng)
+            document_id = sqlite_support.insert_document(f"sha{i}", "text", f"doc{i}")
+            sqlite_support.insert_graph(document_id, 1, nodes.to_csv(index=False), edges.to_csv(index=False), {})
+            self.documents.append((document_id, f"sha{i}", f"doc{i}.pdf"))
+            self.graphs.append((f"doc{i}.pdf", nodes, edges))
+
+    def tearDown(self):
+        sqlite_support.close_connection()
+        self.tmp_dir.cleanup()
+
+    def test_matches_in_memory_merge(self):
+        nodes, edges, metadata = composite_graph.build_composite(self.documents, 1)
+        expected_nodes, expected_edges = graph_utils.merge_all_document_graphs(self.graphs)
+
+        pd.testing.assert_frame_equal(nodes, expected_nodes, check_dtype=False)
+        pd.testing.assert_frame_equal(edges, expected_edges, check_dtype=False)
+        self.assertEqual([m['filename'] for m in metadata], [f"doc{i}.pdf" for i in range(4)])
+
+    def test_added_document_only_merges_the_delta(self):
+        composite_graph.build_composite(self.documents[:3], 1)
+
+        with mock.patch.object(sqlite_support, "iter_graphs", wraps=sqlite_support.iter_graphs) as reader:
+            nodes, edges, _ = composite_graph.build_composite(self.documents, 1)
+        self.assertEqual(reader.call_args.args[0], [self.documents[3][0]])
+
+        expected_nodes, expected_edges = graph_utils.merge_all_document_graphs(self.graphs)
+        pd.testing.assert_frame_equal(nodes, expected_nodes, check_dtype=False)
+        pd.testing.assert_frame_equal(edges, expected_edges, check_dtype=False)
+
+        with mock.patch.object(sqlite_support, "iter_graphs") as reader:
+            composite_graph.build_composite(self.documents, 1)
+        reader.assert_not_called()
+
+
+    def test_rewritten_member_graph_is_merged_again(self):
+        composite_graph.build_composite(self.documents, 1)
+
+        # A rerun of failed chunks rewrites the stored graph of document 2 under the same sha.
+        nodes, edges = _document_graph(random.Random(11))
+        sqlite_support.insert_graph(self.documents[2][0], 1, nodes.to_csv(index=False), edges.to_csv(index=False), {})
+        self.graphs[2] = ("doc2.pdf", nodes, edges)
+
+        nodes, edges, _ = composite_graph.build_composite(self.documents, 1)
+        expected_nodes, expected_edges = graph_utils.merge_all_document_graphs(self.graphs)
+        pd.testing.assert_frame_equal(nodes, expected_nodes, check_dtype=False)
+        pd.testing.assert_frame_equal(edges, expected_edges, check_dtype=False)
+
+    def test_composite_missing_a_graph_is_not_cached(self):
+        document_id = sqlite_support.insert_document("sha-new", "text", "new")
+        documents = self.documents[:2] + [(document_id, "sha-new", "new.pdf")]
+
+        composite_graph.build_composite(documents, 1)
+
+        self.assertEqual(sqlite_support.get_composite_members(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import concurrency_controller as cc
+
+
+@mock.patch.object(cc, 'MIN_LATENCY_SAMPLE', 0)
+class TestConcurrencyController(unittest.TestCase):
+    def test_limit_grows_while_saturated_and_healthy(self):
+        controller = cc.ConcurrencyController(2, max_limit=10)
+
+        async def call():
+            started = await controller.acquire()
+            await asyncio.sleep(0.005)
+            await controller.release(started)
+
+        async def run():
+            for _ in range(10):
+                await asyncio.gather(*(call() for _ in range(controller.current_limit)))
+
+        asyncio.run(run())
+
+        self.assertGreater(controller.current_limit, 2)
+        self.assertLessEqual(controller.current_limit, 10)
+        self.assertEqual(controller.in_flight, 0)
+
+    def test_limit_does_not_grow_when_unused(self):
+        controller = cc.ConcurrencyController(4)
+
+        async def run():
+            for _ in range(20):
+                started = await controller.acquire()
+                await asyncio.sleep(0.001)
+                await controller.release(started)
+
+        asyncio.run(run())
+
+        self.assertEqual(controller.current_limit, 4)
+
+    def test_overload_halves_limit_once_per_round(self):
+        controller = cc.ConcurrencyController(8)
+
+        async def run():
+            starts = [await controller.acquire() for _ in range(8)]
+            for started in starts:
+                await controller.overloaded(started, retry_after=0)
+
+        asyncio.run(run())
+
+        self.assertEqual(controller.current_limit, 4)
+        self.assertEqual(controller.overloads, 8)
+        self.assertEqual(controller.in_flight, 0)
+
+    def test_transient_failure_keeps_limit(self):
+        controller = cc.ConcurrencyController(8)
+
+        async def run():
+            started = await controller.acquire()
+            await controller.overloaded(started, retry_after=0, lower_limit=False)
+
+        asyncio.run(run())
+
+        self.assertEqual(controller.current_limit, 8)
+        self.assertEqual(controller.overloads, 0)
+        self.assertEqual(controller.in_flight, 0)
+
+    def test_retry_after_pauses_new_requests(self):
+        controller = cc.ConcurrencyController(4)
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            started = await controller.acquire()
+            await controller.overloaded(started, retry_after=0.1)
+            before = loop.time()
+            await controller.acquire()
+            return loop.time() - before
+
+        self.assertGreaterEqual(asyncio.run(run()), 0.09)
+
+    def test_acquire_waits_for_a_free_slot(self):
+        controller = cc.ConcurrencyController(1)
+        order = []
+
+        async def call(name):
+            started = await controller.acquire()
+            order.append(f"start {name}")
+            await asyncio.sleep(0.01)
+            order.append(f"end {name}")
+            await controller.release(started)
+
+        async def run():
+            await asyncio.gather(call("a"), call("b"))
+
+        asyncio.run(run())
+
+        self.assertEqual(order, ["start a", "end a", "start b", "end b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
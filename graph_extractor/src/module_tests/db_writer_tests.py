@@ -0,0 +1,73 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import db_writer
+import sqlite_support
+
+
+class TestResponseWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        sqlite_support._thread_local.connection = None
+        sqlite_support.set_database_path(os.path.join(self.tmp_dir.name, "db", "test.db"))
+
+    def tearDown(self):
+        sqlite_support.close_connection()
+        self.tmp_dir.cleanup()
+
+    def test_flush_is_a_barrier(self):
+        async def run():
+            writer = db_writer.ResponseWriter(batch_size=7)
+            for i in range(50):
+                writer.add_response(1, i, 3, f"nodes {i}", "edges")
+                writer.add_response_L1(1, i, 3, f"nodes {i}")
+            await writer.flush()
+            visible = sqlite_support.get_response_chunk_indices(1, 3)
+            await writer.close()
+            return visible
+
+        self.assertEqual(asyncio.run(run()), set(range(50)))
+        self.assertEqual(sqlite_support.get_response_L1_chunk_indices(1, 3), set(range(50)))
+
+    def test_reuse_sees_rows_queued_before_it(self):
+        async def run():
+            writer = db_writer.ResponseWriter()
+            writer.add_chunk_hash(1, 3, 0, "same")
+            writer.add_response_L1(1, 0, 3, '"A", "B"')
+            nodes = await writer.reuse_response_L1(2, 0, 3, "same")
+            missing = await writer.reuse_response(2, 0, 3, "same")
+            await writer.close()
+            return nodes, missing
+
+        self.assertEqual(asyncio.run(run()), ('"A", "B"', None))
+        self.assertEqual(sqlite_support.get_response_L1_chunk_indices(2, 3), {0})
+
+    def test_failed_write_is_raised_from_flush_and_close(self):
+        async def run():
+            writer = db_writer.ResponseWriter()
+            writer.add_response(1, 0, 3, "nodes", "edges")
+            with self.assertRaises(db_writer.WriteError):
+                await writer.flush()
+            with self.assertRaises(db_writer.WriteError):
+                await writer.close()
+            await asyncio.get_running_loop().run_in_executor(None, writer.thread.join, 1)
+            return writer.thread.is_alive()
+
+        with mock.patch.object(sqlite_support, "insert_responses_bulk", return_value=False):
+            self.assertFalse(asyncio.run(run()))
+
+    def test_writes_happen_off_the_calling_thread(self):
+        async def run():
+            writer = db_writer.ResponseWriter()
+            await writer.close()
+            await asyncio.get_running_loop().run_in_executor(None, writer.thread.join, 1)
+            return writer.thread.is_alive()
+
+        self.assertFalse(asyncio.run(run()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,372 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import abort_manager
+import concurrency_controller
+import graph_generator as gg
+import parse_executor
+
+
+class TestRunAsyncTasks(unittest.TestCase):
+    def test_keeps_window_full(self):
+        in_flight = 0
+        peak = 0
+        done = []
+
+        async def job(i, latency):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(latency)
+            in_flight -= 1
+            done.append(i)
+
+        # One slow call must not hold back the rest of the window.
+        to_process = [(0, 0.2)] + [(i, 0.01) for i in range(1, 40)]
+        messages = []
+        asyncio.run(gg._run_async_tasks(to_process, job, 4, "Test", lambda m, t='progress': messages.append(m)))
+
+        self.assertEqual(sorted(done), list(range(40)))
+        self.assertEqual(peak, 4)
+        self.assertEqual(done[-1], 0)
+        self.assertEqual(messages[-1], "Test  100%")
+
+    def test_error_stops_scheduling(self):
+        started = []
+
+        async def job(i):
+            started.append(i)
+            await asyncio.sleep(0)
+            if i == 0:
+                raise Exception("boom")
+
+        errors = []
+
+        def callback(message, type_name='progress'):
+            if type_name == 'error':
+                errors.append(message)
+
+        token = abort_manager.CancellationToken()
+        with abort_manager.cancellation_scope(token):
+            asyncio.run(gg._run_async_tasks([(i,) for i in range(20)], job, 2, "Test", callback))
+
+        self.assertEqual(errors, ["boom"])
+        self.assertTrue(token.cancelled)
+        self.assertLess(len(started), 20)
+
+    def test_cancel_stops_tasks_in_flight(self):
+        token = abort_manager.CancellationToken()
+        finished = []
+
+        async def job(i):
+            await asyncio.sleep(10)
+            finished.append(i)
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            # Cancelled from another thread, as the GUI and the job server do.
+            loop.call_later(0.05, lambda: threading.Thread(target=token.cancel).start())
+            start = loop.time()
+            await gg._run_async_tasks([(i,) for i in range(8)], job, 4, "Test")
+            return loop.time() - start
+
+        with abort_manager.cancellation_scope(token):
+            elapsed = asyncio.run(run())
+
+        self.assertLess(elapsed, 1)
+        self.assertEqual(finished, [])
+
+    def test_failing_run_does_not_stop_other_runs(self):
+        done = {'a': [], 'b': []}
+
+        async def job(name, i):
+            await asyncio.sleep(0.01)
+            if name == 'a' and i == 0:
+                raise Exception("boom")
+            done[name].append(i)
+
+        async def run(name, token):
+            with abort_manager.cancellation_scope(token):
+                await gg._run_async_tasks([(name, i) for i in range(10)], job, 2, name)
+
+        async def run_both():
+            await asyncio.gather(run('a', token_a), run('b', token_b))
+
+        token_a, token_b = abort_manager.CancellationToken(), abort_manager.CancellationToken()
+        asyncio.run(run_both())
+
+        self.assertTrue(token_a.cancelled)
+        self.assertFalse(token_b.cancelled)
+        self.assertLess(len(done['a']), 9)
+        self.assertEqual(sorted(done['b']), list(range(10)))
+
+    def test_async_source_starts_before_it_is_exhausted(self):
+        events = []
+
+        async def source():
+            for i in range(5):
+                events.append(f"produced {i}")
+                yield (i,)
+                await asyncio.sleep(0.01)
+
+        async def job(i):
+            events.append(f"started {i}")
+
+        messages = []
+        asyncio.run(gg._run_async_tasks(source(), job, 2, "Test", lambda m, t='progress': messages.append(m),
+                                        expected_jobs=10))
+
+        self.assertLess(events.index("started 0"), events.index("produced 4"))
+        self.assertEqual(len([e for e in events if e.startswith("started")]), 5)
+        self.assertEqual(messages[-1], "Test  100%")
+        self.assertTrue(all(m != "Test  100%" for m in messages[:-1]))
+
+    def test_overloaded_tasks_are_retried_with_a_lower_limit(self):
+        attempts = {}
+
+        async def job(i):
+            attempts[i] = attempts.get(i, 0) + 1
+            await asyncio.sleep(0)
+            if i < 3 and attempts[i] == 1:
+                raise concurrency_controller.Overloaded("429 Too Many Requests", retry_after=0.01)
+
+        messages = []
+
+        def callback(message, type_name='progress'):
+            messages.append((type_name, message))
+
+        controller = concurrency_controller.ConcurrencyController(4, max_limit=8)
+        token = abort_manager.CancellationToken()
+        with abort_manager.cancellation_scope(token):
+            asyncio.run(gg._run_async_tasks([(i,) for i in range(10)], job, 4, "Test", callback, controller=controller))
+
+        self.assertFalse(token.cancelled)
+        self.assertEqual(attempts, {i: 2 if i < 3 else 1 for i in range(10)})
+        self.assertEqual(controller.current_limit, 2)
+        self.assertNotIn('error', [type_name for type_name, _ in messages])
+        self.assertEqual(messages[-1], ('progress', "Test  100%  (0 in flight, limit 2)"))
+
+
+class TemporaryDatabaseTestCase(unittest.TestCase):
+    """Points sqlite_support at a fresh database, so the stage writers have somewhere to write."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        gg.sqlite_support._thread_local.connection = None
+        gg.sqlite_support.set_database_path(os.path.join(self.tmp_dir.name, "db", "test.db"))
+
+    def tearDown(self):
+        gg.sqlite_support.close_connection()
+        self.tmp_dir.cleanup()
+
+
+class TestL0Pipeline(TemporaryDatabaseTestCase):
+    def test_first_request_waits_only_for_right_neighbour(self):
+        events = []
+        chunks = [
+            {'chunk_index': i, 'chunk_size': 3, 'text': f"text {i} end", 'unit_offsets': [(0, 0)]}
+            for i in range(4)
+        ]
+
+        async def stream():
+            for chunk in chunks:
+                events.append(f"chunk {chunk['chunk_index']}")
+                yield chunk
+                await asyncio.sleep(0.01)
+
+        async def fake_process(document_id, config_id, chunk_index, prompt, config, writer, parser):
+            events.append(f"request {chunk_index}")
+
+        config = {'overlap': 100, 'optimization_on': False, 'max_concurrent_requests': 2, 'chunk_size': 3}
+        original = gg._process_chunk
+        gg._process_chunk = fake_process
+        try:
+            asyncio.run(gg._L0_extract_graph(1, 1, stream(), config))
+        finally:
+            gg._process_chunk = original
+
+        self.assertEqual(events.index("request 0"), events.index("chunk 1") + 1)
+        self.assertEqual(sorted(e for e in events if e.startswith("request")),
+                         [f"request {i}" for i in range(4)])
+
+
+    def test_responses_of_changed_or_missing_chunks_are_not_cached(self):
+        chunks = [
+            {'chunk_index': i, 'chunk_size': 3, 'text': f"text {i} end", 'unit_offsets': [(0, 0)]}
+            for i in range(3)
+        ]
+        # Stored by an older chunker: index 0 matches, 1 was split differently, 2 has no hash and 3, 4 are gone.
+        gg.sqlite_support.insert_responses_bulk([(1, i, 1, "nodes", "edges") for i in range(5)])
+        gg.sqlite_support.insert_chunk_hash(1, 1, 0, gg.my_hash.calculate_text_sha256("text 0 end"))
+        gg.sqlite_support.insert_chunk_hash(1, 1, 1, "old split")
+        gg.sqlite_support.insert_chunk_hash(1, 1, 4, "old split")
+        requested = []
+
+        async def stream():
+            for chunk in chunks:
+                yield chunk
+
+        async def fake_process(document_id, config_id, chunk_index, prompt, config, writer, parser):
+            requested.append(chunk_index)
+
+        config = {'overlap': 100, 'optimization_on': True, 'max_concurrent_requests': 2, 'chunk_size': 3}
+        with mock.patch.object(gg, "_process_chunk", fake_process):
+            asyncio.run(gg._L0_extract_graph(1, 1, stream(), config))
+
+        self.assertEqual(sorted(requested), [1, 2])
+        self.assertEqual(gg.sqlite_support.get_response_chunk_indices(1, 1), {0})
+        self.assertEqual(set(gg.sqlite_support.get_chunk_hashes(1, 1)), {0, 1, 2})
+
+
+class TestL1L2Pipeline(TemporaryDatabaseTestCase):
+    def test_L2_starts_while_L1_is_still_running(self):
+        events = []
+        prompts_L2 = {}
+        chunks = [
+            {'chunk_index': i, 'chunk_size': 3, 'text': f"text {i} end", 'unit_offsets': [(0, 0)]}
+            for i in range(6)
+        ]
+
+        async def stream():
+            for chunk in chunks:
+                events.append(f"chunk {chunk['chunk_index']}")
+                yield chunk
+                await asyncio.sleep(0.01)
+
+        async def fake_L1(document_id, config_id, chunk, prompt, config, writer, parser):
+            await asyncio.sleep(0.005)
+            events.append(f"L1 {chunk['chunk_index']}")
+            return '"Entity %d"' % chunk['chunk_index']
+
+        async def fake_L2(document_id, config_id, chunk_index, prompt, config, writer, parser):
+            events.append(f"L2 {chunk_index}")
+            prompts_L2[chunk_index] = prompt
+
+        config = {'optimization_on': False, 'max_concurrent_requests': 4, 'chunk_size': 3}
+        with mock.patch.object(gg, "_process_L1_chunk", fake_L1), mock.patch.object(gg, "_process_chunk", fake_L2):
+            asyncio.run(gg._L1_L2_extract_graph(1, 1, stream(), config))
+
+        self.assertLess(events.index("L2 0"), events.index("L1 5"))
+        for i in range(6):
+            self.assertGreater(events.index(f"L2 {i}"), events.index(f"L1 {i}"))
+            if i < 5:
+                self.assertGreater(events.index(f"L2 {i}"), events.index(f"chunk {i + 1}"))
+        self.assertEqual(sorted(prompts_L2), list(range(6)))
+        self.assertIn("Entity 2", prompts_L2[2])
+        self.assertIn("text 1 end", prompts_L2[2])
+        self.assertIn("text 3 end", prompts_L2[2])
+        self.assertNotIn("text 4 end", prompts_L2[2])
+
+    def test_chunk_without_L1_nodes_is_skipped(self):
+        chunks = [{'chunk_index': i, 'chunk_size': 3, 'text': f"text {i}", 'unit_offsets': [(0, 0)]} for i in range(3)]
+        requested = []
+
+        async def stream():
+            for chunk in chunks:
+                yield chunk
+
+        async def fake_L1(document_id, config_id, chunk, prompt, config, writer, parser):
+            return None if chunk['chunk_index'] == 1 else '"Entity"'
+
+        async def fake_L2(document_id, config_id, chunk_index, prompt, config, writer, parser):
+            requested.append(chunk_index)
+
+        config = {'optimization_on': False, 'max_concurrent_requests': 2, 'chunk_size': 3}
+        with mock.patch.object(gg, "_process_L1_chunk", fake_L1), mock.patch.object(gg, "_process_chunk", fake_L2):
+            asyncio.run(gg._L1_L2_extract_graph(1, 1, stream(), config))
+
+        self.assertEqual(sorted(requested), [0, 2])
+
+
+class TestDocumentScheduling(unittest.TestCase):
+    def test_documents_share_one_controller_and_overlap(self):
+        running = 0
+        peak = 0
+        controllers = set()
+        parsers = set()
+        writers = set()
+
+        async def fake_document(index, document_path, document_count, config, config_id, controller, parser, writer,
+                                progress_callback, document_locks):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            controllers.add(id(controller))
+            parsers.add(id(parser))
+            writers.add(id(writer))
+            await asyncio.sleep(0.01)
+            running -= 1
+            return index, document_path, document_count
+
+        with tempfile.TemporaryDirectory() as directory:
+            config = {
+                'output_folder': os.path.join(directory, "out"), 'internal_data_dir': os.path.join(directory, "data"),
+                'db_filename': "test.db", 'api': 'openai', 'model': 'test', 'temperature': 0, 'top_p': 1,
+                'chunk_size': 100, 'padding_size': 0, 'merge_document_graphs': False,
+                'max_concurrent_requests': 5, 'max_concurrent_documents': 3
+            }
+            with mock.patch.object(gg, "_generate_document_graph", fake_document):
+                asyncio.run(gg.generate_graph_async([f"doc{i}.pdf" for i in range(7)], config,
+                                                    lambda message, type_name='progress': None))
+            gg.sqlite_support.close_connection()
+
+        self.assertEqual(peak, 3)
+        self.assertEqual(len(controllers), 1)
+        self.assertEqual(len(parsers), 1)
+        self.assertEqual(len(writers), 1)
+
+
+class TestStreaming(unittest.TestCase):
+    def test_malformed_stream_is_closed_early(self):
+        sent = []
+        attempts = []
+
+        async def fake_stream(prompt, config):
+            attempts.append(prompt)
+            if len(attempts) == 1:
+                yield "id,entity,category\n"
+                for i in range(100):
+                    sent.append(i)
+                    yield f"not a row {i}\n"
+            else:
+                yield 'id,entity,category\n1,"Alice",person\n2,"Bob",person\n'
+                yield 'source,target,relationship\n1,2,"knows"\n'
+
+        class Writer:
+            def __init__(self):
+                self.responses = []
+
+            def add_response(self, *args):
+                self.responses.append(args)
+
+            def add_cached_response(self, *args):
+                pass
+
+        config = {'optimization_on': False, 'llm_streaming': True, 'llm_timeout': 5,
+                  'api': 'openai', 'model': 'test', 'temperature': 0, 'top_p': 1}
+        writer = Writer()
+        parser = parse_executor.ParseExecutor('inline')
+        args = (1, 1, 0, "prompt", config, writer, parser)
+        with mock.patch.object(gg.llm_api, "execute_stream", fake_stream):
+            with self.assertRaises(gg.response_parser.MalformedResponse):
+                asyncio.run(gg._process_chunk(*args))
+            self.assertLess(len(sent), 20)
+            self.assertEqual(writer.responses, [])
+
+            attempts.clear()
+            controller = gg.concurrency_controller.ConcurrencyController(2)
+            asyncio.run(gg._run_with_controller(controller, gg._process_chunk, args))
+
+        # The malformed stream is requested again, without counting as an overload.
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(len(writer.responses), 1)
+        self.assertEqual(controller.overloads, 0)
+        self.assertEqual(controller.in_flight, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
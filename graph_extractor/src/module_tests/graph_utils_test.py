@@ -1,5 +1,15 @@
+import json
+import os
+import random
+import tempfile
 import unittest
-from graph_extractor.src.graph_utils import merge_graphs_unique
+from unittest import mock
+
+import pandas as pd
+
+import graph_utils
+import sqlite_support
+from graph_utils import merge_graphs_unique
 
 
 class TestMergeGraphsUnique(unittest.TestCase):
@@ -271,5 +281,236 @@ class TestMergeGraphsUnique(unittest.TestCase):
         self.assertEqual(expected_edges, actual_edges, "Self-loops and cycles are not handled correctly")
 
 
+def _legacy_merge_graphs_unique(all_graphs):
+    # Row-by-row reference implementation the vectorized merge has to reproduce.
+    unique_entities = {}
+    next_entity_id = 0
+    unique_edges = {}
+
+    for graph in all_graphs:
+        entity_id_map = {}
+        for _, node_data in graph['nodes'].iterrows():
+            node_label = graph_utils.sanitize(node_data['label'])
+            entity_key = node_label.lower()
+            node_type = graph_utils.sanitize(node_data['type'])
+            if entity_key in unique_entities:
+                unique_entities[entity_key]['types'].add(node_type)
+            else:
+                unique_entities[entity_key] = {'id': next_entity_id, 'base_label': node_label, 'types': {node_type}}
+                next_entity_id += 1
+            entity_id_map[node_data['id']] = unique_entities[entity_key]['id']
+
+        for _, edge_data in graph['edges'].iterrows():
+            if edge_data['source'] not in entity_id_map or edge_data['target'] not in entity_id_map:
+                continue
+            edge_key = (entity_id_map[edge_data['source']], entity_id_map[edge_data['target']],
+                        graph_utils.sanitize(edge_data.get('label', '')).lower())
+            unique_edges.setdefault(edge_key, None)
+
+    nodes = pd.DataFrame([
+        {'id': info['id'], 'label': info['base_label'], 'type': '|'.join(sorted(t for t in info['types'] if t))}
+        for info in unique_entities.values()
+    ])
+    edges = pd.DataFrame([{'source': s, 'target': t, 'label': label} for s, t, label in unique_edges])
+    return nodes, edges
+
+
+def _legacy_merge_all_document_graphs(all_graphs):
+    entity_map = {}
+    edge_map = {}
+
+    for doc_index, (_, df_nodes, df_edges) in enumerate(all_graphs):
+        node_id_to_label = {}
+        for _, node_row in df_nodes.iterrows():
+            node_label = graph_utils.sanitize(str(node_row['label']))
+            node_type = str(node_row.get('type'))
+            node_id_to_label[int(node_row['id'])] = node_label
+            if not node_label:
+                continue
+            if node_label.lower() not in entity_map:
+                entity_map[node_label.lower()] = {'id': len(entity_map), 'base_label': node_label,
+                                                  'types': {node_type}, 'doc_set': {doc_index}}
+            else:
+                entity_map[node_label.lower()]['types'].add(node_type)
+                entity_map[node_label.lower()]['doc_set'].add(doc_index)
+
+        for _, edge_row in df_edges.iterrows():
+            edge_label = graph_utils.sanitize(str(edge_row['label']))
+            if edge_row['source'] not in node_id_to_label or edge_row['target'] not in node_id_to_label:
+                continue
+            edge_key = (entity_map[node_id_to_label[edge_row['source']].lower()]['id'],
+                        entity_map[node_id_to_label[edge_row['target']].lower()]['id'],
+                        edge_label.lower())
+            if edge_key not in edge_map:
+                edge_map[edge_key] = {'base_label': edge_label, 'doc_set': {doc_index}}
+            else:
+                edge_map[edge_key]['doc_set'].add(doc_index)
+
+    def docs(doc_set):
+        return '|'.join(str(d) for d in sorted(doc_set))
+
+    nodes = pd.DataFrame([
+        {'id': info['id'], 'label': f"{info['base_label']}|{docs(info['doc_set'])}",
+         'type': '|'.join(sorted(t for t in info['types'] if t))}
+        for info in entity_map.values()
+    ])
+    edges = pd.DataFrame([
+        {'source': s, 'target': t, 'label': f"{info['base_label']}|{docs(info['doc_set'])}"}
+        for (s, t, _), info in edge_map.items()
+    ])
+    return nodes, edges
+
+
+def _random_graph(rng, labels, node_count, edge_count):
+    nodes = pd.DataFrame({
+        'id': range(node_count),
+        'label': [rng.choice(labels) for _ in range(node_count)],
+        'type': [rng.choice(["Person", "Place", "", " Org|Unit "]) for _ in range(node_count)]
+    })
+    edges = pd.DataFrame({
+        'source': [rng.randrange(node_count + 2) for _ in range(edge_count)],
+        'target': [rng.randrange(node_count + 2) for _ in range(edge_count)],
+        'label': [rng.choice(["knows", "Knows ", "lives|in", "works at"]) for _ in range(edge_count)]
+    })
+    return nodes, edges
+
+
+class TestVectorizedMerge(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        labels = ["Alice", "alice", " Bob ", "Carol|Smith", "Dave", "EVE", "eve", "Frank"]
+        self.graphs = [_random_graph(rng, labels, rng.randrange(1, 8), rng.randrange(0, 10)) for _ in range(30)]
+
+    def assert_same_merge(self, actual, expected):
+        actual_nodes, actual_edges = actual
+        expected_nodes, expected_edges = expected
+        pd.testing.assert_frame_equal(actual_nodes, expected_nodes, check_dtype=False)
+        pd.testing.assert_frame_equal(actual_edges.reset_index(drop=True), expected_edges, check_dtype=False)
+
+    def test_merge_graphs_unique_matches_legacy(self):
+        graphs = [{'nodes': nodes, 'edges': edges} for nodes, edges in self.graphs]
+        self.assert_same_merge(graph_utils.merge_graphs_unique(graphs), _legacy_merge_graphs_unique(graphs))
+
+    def test_merge_all_document_graphs_matches_legacy(self):
+        documents = [(f"doc{i}.pdf", *graph_utils.merge_graphs_unique([{'nodes': nodes, 'edges': edges}]))
+                     for i, (nodes, edges) in enumerate(self.graphs)]
+        self.assert_same_merge(graph_utils.merge_all_document_graphs(documents),
+                               _legacy_merge_all_document_graphs(documents))
+
+    def test_empty_input(self):
+        empty = {'nodes': pd.DataFrame(columns=['id', 'label', 'type']),
+                 'edges': pd.DataFrame(columns=['source', 'target', 'label'])}
+        nodes, edges = graph_utils.merge_graphs_unique([empty])
+        self.assertTrue(nodes.empty)
+        self.assertTrue(edges.empty)
+
+
+class TestIncrementalMerge(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        sqlite_support._thread_local.connection = None
+        sqlite_support.set_database_path(os.path.join(self.tmp_dir.name, "db", "test.db"))
+        self.document_id = sqlite_support.insert_document("sha", "text", "doc")
+
+        rng = random.Random(11)
+        labels = ["Alice", "alice", "Bob", "Carol", "Dave", "Eve"]
+        self.graphs = [_random_graph(rng, labels, rng.randrange(1, 6), rng.randrange(0, 6)) for _ in range(12)]
+        self._store(range(len(self.graphs)))
+
+    def tearDown(self):
+        sqlite_support.close_connection()
+        self.tmp_dir.cleanup()
+
+    def _store(self, chunk_indices):
+        sqlite_support.insert_responses_bulk([
+            (self.document_id, i, 1, self.graphs[i][0].to_csv(index=True), self.graphs[i][1].to_csv(index=False))
+            for i in chunk_indices
+        ])
+
+    def _labelled(self, nodes, edges):
+        label_of = dict(zip(nodes['id'], nodes['label'].str.lower()))
+        return (set(zip(nodes['label'], nodes['type'])),
+                set(zip(edges['source'].map(label_of), edges['target'].map(label_of), edges['label'])))
+
+    def test_first_merge_matches_full_merge(self):
+        nodes, edges = graph_utils.merge_graphs(self.document_id, 1, {"index": 0})
+        expected_nodes, expected_edges = graph_utils.merge_graphs_unique(
+            [{'nodes': n, 'edges': e} for n, e in self.graphs])
+
+        pd.testing.assert_frame_equal(nodes, expected_nodes, check_dtype=False)
+        self.assertEqual(set(map(tuple, edges.values.tolist())), set(map(tuple, expected_edges.values.tolist())))
+
+    def test_first_merge_state_matches_applied_contributions(self):
+        graph_utils.merge_graphs(self.document_id, 1, {"index": 0})
+        state = sqlite_support.get_merge_state(self.document_id, 1)
+
+        # The counts derived from the columnar merge are the ones later updates add to and remove from.
+        expected = {'next_id': 0, 'entities': {}, 'edges': {}}
+        records = sqlite_support.get_response_records(self.document_id, 1, range(len(self.graphs)))
+        for _, record in sorted(records.items()):
+            nodes, edges = graph_utils._response_contribution(record)
+            graph_utils._apply_contribution(expected, expected['edges'], nodes, edges, 1)
+
+        self.assertEqual(state, expected)
+
+    def test_rerun_only_reads_changed_chunks(self):
+        graph_utils.merge_graphs(self.document_id, 1, {"index": 0})
+
+        self.graphs[3] = (pd.DataFrame({'id': [0, 1], 'label': ["Zed", "Alice"], 'type': ["Person", "Robot"]}),
+                          pd.DataFrame({'source': [0], 'target': [1], 'label': ["built"]}))
+        self._store([3])
+
+        with mock.patch.object(sqlite_support, "get_response_records",
+                               wraps=sqlite_support.get_response_records) as reader:
+            nodes, edges = graph_utils.merge_graphs(self.document_id, 1, {"index": 0})
+        self.assertEqual(reader.call_args.args[2], [3])
+
+        expected = graph_utils.merge_graphs_unique([{'nodes': n, 'edges': e} for n, e in self.graphs])
+        self.assertEqual(self._labelled(nodes, edges), self._labelled(*expected))
+
+    def test_unchanged_rerun_returns_stored_graph_without_writing(self):
+        first_nodes, first_edges = graph_utils.merge_graphs(self.document_id, 1, {"index": 0})
+
+        with mock.patch.object(sqlite_support, "insert_graph") as insert, \
+                mock.patch.object(sqlite_support, "save_merge_state") as save:
+            nodes, edges = graph_utils.merge_graphs(self.document_id, 1, {"index": 0})
+        insert.assert_not_called()
+        save.assert_not_called()
+
+        pd.testing.assert_frame_equal(nodes, first_nodes, check_dtype=False)
+        pd.testing.assert_frame_equal(edges, first_edges, check_dtype=False)
+
+    def test_unchanged_rerun_updates_the_metadata(self):
+        graph_utils.merge_graphs(self.document_id, 1, {"index": 0, "filename": "old.pdf"})
+        graph_utils.merge_graphs(self.document_id, 1, {"index": 0, "filename": "new.pdf"})
+
+        metadata = sqlite_support.get_connection().execute(
+            "SELECT metadata FROM Graphs WHERE document_id = ? AND config_id = 1", (self.document_id,)).fetchone()[0]
+        self.assertEqual(json.loads(metadata)["filename"], "new.pdf")
+
+    def test_rerun_only_writes_touched_counts(self):
+        graph_utils.merge_graphs(self.document_id, 1, {"index": 0})
+        old_nodes, _ = sqlite_support.get_merge_contributions(self.document_id, 1, [3])[3]
+
+        self.graphs[3] = (pd.DataFrame({'id': [0], 'label': ["Zed"], 'type': ["Person"]}), pd.DataFrame())
+        self._store([3])
+
+        with mock.patch.object(sqlite_support, "save_merge_state", wraps=sqlite_support.save_merge_state) as save:
+            graph_utils.merge_graphs(self.document_id, 1, {"index": 0})
+        self.assertEqual(set(save.call_args.args[3]), {key for key, _, _ in old_nodes} | {"zed"})
+
+        # The updated rows add up to the counts of a merge from scratch.
+        state = sqlite_support.get_merge_state(self.document_id, 1)
+        sqlite_support.delete_merge_state(self.document_id, 1)
+        graph_utils.merge_graphs(self.document_id, 1, {"index": 0})
+        fresh = sqlite_support.get_merge_state(self.document_id, 1)
+
+        def counts(merge_state):
+            return {key: (entity['count'], entity['types']) for key, entity in merge_state['entities'].items()}
+
+        self.assertEqual(counts(state), counts(fresh))
+        self.assertEqual(state['edges'], fresh['edges'])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import time
+import unittest
+
+import parse_executor
+import response_parser
+
+RESPONSE = "id,entity,category\n0,Alice,Person\n1,Bob,Person\nsource,target,relationship\n0,1,knows\n"
+
+
+class TestParseExecutor(unittest.TestCase):
+    def _parse(self, kind):
+        async def run():
+            parser = parse_executor.ParseExecutor(kind, 2)
+            try:
+                return await parser.run(response_parser.parse_text_to_csv, RESPONSE)
+            finally:
+                parser.shutdown()
+
+        return asyncio.run(run())
+
+    def test_all_kinds_return_the_parse_result(self):
+        expected = response_parser.parse_text_to_csv(RESPONSE)
+        for kind in ['inline', 'thread', 'process']:
+            with self.subTest(kind):
+                self.assertEqual(self._parse(kind), expected)
+
+    def test_pending_jobs_are_bounded(self):
+        lock = threading.Lock()
+        running = {'now': 0, 'max': 0}
+
+        def slow_parse(value):
+            with lock:
+                running['now'] += 1
+                running['max'] = max(running['max'], running['now'])
+            time.sleep(0.01)
+            with lock:
+                running['now'] -= 1
+            return value
+
+        async def run():
+            parser = parse_executor.ParseExecutor('thread', 2)
+            submitted = []
+
+            async def job(i):
+                submitted.append(i)
+                return await parser.run(slow_parse, i)
+
+            try:
+                return await asyncio.gather(*(job(i) for i in range(20))), parser.waits
+            finally:
+                parser.shutdown()
+
+        results, waits = asyncio.run(run())
+        self.assertEqual(results, list(range(20)))
+        self.assertLessEqual(running['max'], 2)
+        self.assertGreater(waits, 0)
+
+    def test_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            parse_executor.ParseExecutor('gpu')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import asyncio
+import unittest
+
+import rate_limiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_requests_are_paced_in_order_once_the_budget_is_spent(self):
+        clock = FakeClock()
+        limiter = rate_limiter.RateLimiter(tokens_per_minute=6000, clock=clock)
+
+        self.assertEqual(limiter.take(3000), 0)
+        self.assertEqual(limiter.take(3000), 0)
+        # 100 tokens per second refill the bucket.
+        self.assertAlmostEqual(limiter.take(1000), 10)
+        self.assertAlmostEqual(limiter.take(1000), 20)
+
+        clock.now = 20
+        self.assertAlmostEqual(limiter.take(100), 1)
+
+    def test_reconcile_refunds_unused_tokens(self):
+        clock = FakeClock()
+        limiter = rate_limiter.RateLimiter(tokens_per_minute=6000, clock=clock)
+
+        self.assertEqual(limiter.take(6000), 0)
+        limiter.reconcile(6000, 1000)
+        self.assertEqual(limiter.take(5000), 0)
+
+        limiter.reconcile(1000, 2000)
+        self.assertAlmostEqual(limiter.take(0), 10)
+
+    def test_requests_per_minute(self):
+        clock = FakeClock()
+        limiter = rate_limiter.RateLimiter(requests_per_minute=2, clock=clock)
+
+        self.assertEqual(limiter.take(10 ** 6), 0)
+        self.assertEqual(limiter.take(10 ** 6), 0)
+        self.assertAlmostEqual(limiter.take(10 ** 6), 30)
+
+    def test_cancelled_reservation_is_returned(self):
+        limiter = rate_limiter.RateLimiter(tokens_per_minute=600)
+
+        async def run():
+            limiter.take(600)
+            task = asyncio.create_task(limiter.reserve(300))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        self.assertGreater(limiter.tokens.level, -1)
+
+    def test_limiter_is_shared_per_model_and_limits(self):
+        config = {'api': 'openai', 'model': 'test-model', 'llm_tpm_limit': 1000, 'llm_rpm_limit': None}
+
+        self.assertIs(rate_limiter.get_rate_limiter(config), rate_limiter.get_rate_limiter(dict(config)))
+        self.assertIsNot(rate_limiter.get_rate_limiter(config),
+                         rate_limiter.get_rate_limiter(dict(config, llm_tpm_limit=2000)))
+        self.assertFalse(rate_limiter.get_rate_limiter(dict(config, llm_tpm_limit=None)).enabled)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+import db_writer
+import response_cache
+import sqlite_support
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        sqlite_support._thread_local.connection = None
+        sqlite_support.set_database_path(os.path.join(self.tmp_dir.name, "db", "test.db"))
+        response_cache.reset_stats()
+        self.config = {'api': 'openai', 'model': 'gpt-4o-mini', 'temperature': 0, 'top_p': 0.3,
+                       'response_cache_max_entries': 2}
+
+    def tearDown(self):
+        sqlite_support.get_connection().close()
+        sqlite_support._thread_local.connection = None
+        self.tmp_dir.cleanup()
+
+    def test_hit_and_miss_counters(self):
+        self.assertIsNone(response_cache.lookup("prompt", self.config))
+        response_cache.store("prompt", self.config, "answer")
+
+        self.assertEqual(response_cache.lookup("prompt", self.config), "answer")
+        self.assertIsNone(response_cache.lookup("prompt", dict(self.config, temperature=0.5)))
+
+        stats = response_cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        response_cache.store("a", self.config, "A")
+        response_cache.store("b", self.config, "B")
+        response_cache.lookup("a", self.config)
+        response_cache.store("c", self.config, "C")
+
+        self.assertEqual(response_cache.lookup("a", self.config), "A")
+        self.assertIsNone(response_cache.lookup("b", self.config))
+        self.assertEqual(response_cache.lookup("c", self.config), "C")
+
+
+    def test_lookup_with_writer_queues_the_lru_update(self):
+        async def run():
+            writer = db_writer.ResponseWriter()
+            response_cache.store("a", self.config, "A")
+            response_cache.store("b", self.config, "B")
+            self.assertEqual(response_cache.lookup("a", self.config, writer), "A")
+            await writer.close()
+
+        asyncio.run(run())
+        response_cache.store("c", self.config, "C")
+
+        self.assertEqual(response_cache.lookup("a", self.config), "A")
+        self.assertIsNone(response_cache.lookup("b", self.config))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import glob
+import json
+import os
+import unittest
+
+import response_parser
+
+RESPONSES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data", "responses")
+
+
+def _recorded_responses():
+    for path in sorted(glob.glob(os.path.join(RESPONSES_DIR, "*.txt"))):
+        with open(path, encoding="utf-8") as f:
+            yield os.path.basename(path), f.read()
+
+
+class TestParseTextToRecords(unittest.TestCase):
+    def setUp(self):
+        # CSV written by the pandas based parser for every recorded response.
+        with open(os.path.join(RESPONSES_DIR, "expected.json"), encoding="utf-8") as f:
+            self.expected = json.load(f)
+
+    def test_recorded_responses_match_previous_parser(self):
+        for name, text in _recorded_responses():
+            with self.subTest(name):
+                nodes, edges = response_parser.parse_text_to_records(text)
+                expected = self.expected[name]
+                if expected['nodes'] is None:
+                    self.assertIsNone(nodes)
+                    continue
+                self.assertEqual(response_parser.records_to_csv(nodes, edges), (expected['nodes'], expected['edges']))
+
+    def test_dataframe_adapter(self):
+        for name, text in _recorded_responses():
+            with self.subTest(name):
+                nodes, edges = response_parser.parse_text_to_dataframes(text)
+                expected = self.expected[name]
+                if expected['nodes'] is None:
+                    self.assertIsNone(nodes)
+                    continue
+                self.assertEqual(nodes.to_csv(index=True), expected['nodes'])
+                self.assertEqual(edges.to_csv(index=False), expected['edges'])
+
+    def test_orphans_removed_and_reindexed(self):
+        text = ("id,entity,category\n5,Alice,Person\n7,Orphan,Thing\n9,Bob,Person\n"
+                "source,target,relationship\n9,5,knows\n9,5,knows\n")
+        nodes, edges = response_parser.parse_text_to_records(text)
+
+        self.assertEqual(nodes, [(0, "Alice", "Person"), (1, "Bob", "Person")])
+        self.assertEqual(edges, [(1, 0, "knows")])
+
+    def test_invalid_edges_keep_nodes(self):
+        nodes, edges = response_parser.parse_text_to_records(
+            "id,entity,category\n0,Alice,Person\nsource,target,relationship\n0,1\n")
+
+        self.assertEqual(nodes, [(0, "Alice", "Person")])
+        self.assertIsNone(edges)
+
+
+class TestIncrementalParser(unittest.TestCase):
+    def _stream(self, text, piece_size=7):
+        parser = response_parser.IncrementalParser()
+        rows = []
+        for start in range(0, len(text), piece_size):
+            rows.extend(parser.feed(text[start:start + piece_size]))
+        rows.extend(parser.close())
+        return parser, rows
+
+    def test_streamed_rows_match_sections_of_full_parse(self):
+        for name, text in _recorded_responses():
+            with self.subTest(name):
+                parser, rows = self._stream(text)
+                nodes_lines, edges_lines = response_parser._split_sections(text.splitlines())
+                if parser.error:
+                    self.assertEqual(response_parser.parse_text_to_records(text), (None, None))
+                    continue
+                if nodes_lines:
+                    self.assertEqual(parser.nodes, response_parser._read_rows(nodes_lines, 3))
+                if edges_lines:
+                    self.assertEqual(parser.edges, response_parser._read_rows(edges_lines, 3))
+                self.assertEqual(rows, [('nodes', r) for r in parser.nodes] + [('edges', r) for r in parser.edges])
+
+    def test_rows_are_emitted_once_their_line_is_complete(self):
+        parser = response_parser.IncrementalParser()
+        self.assertEqual(parser.feed("```csv\nid,entity,category\n0,Ali"), [])
+        self.assertEqual(parser.feed("ce,Person\n1,"), [('nodes', ["0", "Alice", "Person"])])
+        self.assertEqual(parser.feed("Bob,Person"), [])
+        self.assertEqual(parser.close(), [('nodes', ["1", "Bob", "Person"])])
+
+    def test_stops_on_malformed_stream(self):
+        parser = response_parser.IncrementalParser()
+        parser.feed("id,entity,category\n0,Alice,Person\n0,Bob,Person\n1,Carol,Person\n")
+        self.assertIn("duplicate", parser.error)
+        self.assertEqual(parser.feed("source,target,relationship\n0,1,knows\n"), [])
+
+        parser = response_parser.IncrementalParser(max_invalid_rows=3)
+        parser.feed("id,entity,category\nthe model\nstarted to\n")
+        self.assertIsNone(parser.error)
+        parser.feed("ramble\n")
+        self.assertIsNotNone(parser.error)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import sqlite_support
+
+
+class TestContentCaches(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        sqlite_support._thread_local.connection = None
+        sqlite_support.set_database_path(os.path.join(self.tmp_dir.name, "db", "test.db"))
+
+    def tearDown(self):
+        sqlite_support.get_connection().close()
+        sqlite_support._thread_local.connection = None
+        self.tmp_dir.cleanup()
+
+    def test_page_cache_round_trip(self):
+        sqlite_support.insert_pages({"a": "page one\n", "b": "page two\n"})
+
+        self.assertEqual(sqlite_support.get_page_texts(["b", "c", "a", "b"]), {"a": "page one\n", "b": "page two\n"})
+
+    def test_response_reused_by_chunk_hash(self):
+        sqlite_support.insert_chunk_hash(1, 7, 3, "same")
+        sqlite_support.insert_response_L1(1, 3, 7, '"Alice", "Bob"')
+        sqlite_support.insert_chunk_hash(2, 7, 0, "same")
+
+        self.assertIsNotNone(sqlite_support.reuse_response_L1(2, 0, 7, "same"))
+        self.assertTrue(sqlite_support.response_exists_L1(2, 0, 7))
+        self.assertIsNone(sqlite_support.reuse_response_L1(2, 1, 7, "other"))
+        self.assertIsNone(sqlite_support.reuse_response(2, 0, 7, "same"))
+
+    def test_bulk_upsert_and_index_listing(self):
+        sqlite_support.insert_responses_bulk([(1, i, 7, "nodes", "edges") for i in range(5)])
+        sqlite_support.insert_responses_bulk([(1, 2, 7, "new nodes", "new edges")])
+
+        self.assertEqual(sqlite_support.get_response_chunk_indices(1, 7), set(range(5)))
+        self.assertEqual(sqlite_support.get_response_chunk_indices(1, 8), set())
+        responses = {r['chunk_index']: r['nodes'] for r in sqlite_support.get_all_responses_for(1, 7)}
+        self.assertEqual(responses[2], "new nodes")
+        self.assertEqual(len(responses), 5)
+
+
+class TestMigration(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "old.db")
+        sqlite_support._thread_local.connection = None
+
+    def tearDown(self):
+        sqlite_support.get_connection().close()
+        sqlite_support._thread_local.connection = None
+        self.tmp_dir.cleanup()
+
+    def test_old_database_is_deduplicated_and_indexed(self):
+        old = sqlite3.connect(self.db_path)
+        old.execute('''
+            CREATE TABLE Responses (
+                id INTEGER PRIMARY KEY, chunk_index INTEGER NOT NULL, document_id INTEGER NOT NULL,
+                config_id INTEGER NOT NULL, nodes TEXT NOT NULL, edges TEXT NOT NULL
+            )
+        ''')
+        old.executemany("INSERT INTO Responses (chunk_index, document_id, config_id, nodes, edges) VALUES (?, 1, 1, ?, '')",
+                        [(0, "first"), (0, "duplicate"), (1, "other")])
+        old.commit()
+        old.close()
+
+        sqlite_support.set_database_path(self.db_path)
+        conn = sqlite_support.get_connection()
+
+        rows = conn.execute("SELECT chunk_index, nodes FROM Responses ORDER BY chunk_index").fetchall()
+        self.assertEqual(rows, [(0, "first"), (1, "other")])
+        self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], sqlite_support.SCHEMA_VERSION)
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(conn.execute("PRAGMA busy_timeout").fetchone()[0], 30000)
+        with self.assertRaises(sqlite3.IntegrityError):
+            conn.execute("INSERT INTO Responses (chunk_index, document_id, config_id, nodes, edges) VALUES (1, 1, 1, '', '')")
+
+    def test_csv_responses_are_converted_to_typed_rows(self):
+        old = sqlite3.connect(self.db_path)
+        old.execute('''
+            CREATE TABLE Responses (
+                id INTEGER PRIMARY KEY, chunk_index INTEGER NOT NULL, document_id INTEGER NOT NULL,
+                config_id INTEGER NOT NULL, nodes TEXT NOT NULL, edges TEXT NOT NULL,
+                revision INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        old.execute("INSERT INTO Responses (chunk_index, document_id, config_id, nodes, edges) VALUES (0, 1, 1, ?, ?)",
+                    ("id,label,type\n0,Alice,Person\n1,Bob,\nx,Broken,Row\n", "source,target,label\n0,1,knows\n0,-1,bad\n"))
+        old.execute("CREATE UNIQUE INDEX idx_responses_key ON Responses (document_id, config_id, chunk_index)")
+        old.execute("PRAGMA user_version = 2")
+        old.commit()
+        old.close()
+
+        sqlite_support.set_database_path(self.db_path)
+        records = sqlite_support.get_response_records(1, 1, [0])
+
+        self.assertEqual(records[0]['nodes'], [(0, "Alice", "Person"), (1, "Bob", "")])
+        self.assertEqual(records[0]['edges'], [(0, 1, "knows")])
+
+        sqlite_support.insert_responses_bulk([(1, 0, 1, "id,label,type\n0,Carol,Person\n", "source,target,label\n")])
+        records = sqlite_support.get_response_records(1, 1, [0])
+        self.assertEqual(records[0], {'revision': 1, 'nodes': [(0, "Carol", "Person")], 'edges': []})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -16,6 +16,10 @@ def calculate_file_sha256(filepath):
         return None, f"{str(e)}"
 
 
+def calculate_text_sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
 def main():
     # 1d5db44864a398c6a6c4b615b6c6b6ff458115606ae6806319f4f472a0c9787d
     code, error_message = calculate_file_sha256("documents/snow2.pdf")
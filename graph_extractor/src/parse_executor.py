@@ -0,0 +1,56 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from log_utils import get_module_logger
+
+logger = get_module_logger("parse_executor")
+
+DEFAULT_KIND = 'thread'
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+PENDING_PER_WORKER = 2
+
+
+class ParseExecutor:
+    """Runs response parsing on a thread or process pool instead of the event loop.
+
+    kind is 'thread', 'process' or 'inline' (parse on the calling coroutine, as before).
+    At most workers * PENDING_PER_WORKER parse jobs are queued or running at once; further
+    callers wait for a slot, so a burst of completions holds back the task workers that
+    would otherwise start new requests instead of piling up unparsed responses.
+    """
+
+    def __init__(self, kind=DEFAULT_KIND, workers=DEFAULT_WORKERS):
+        self.kind = kind
+        self.workers = max(1, workers)
+
+        if kind == 'process':
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        elif kind == 'thread':
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="parser")
+        elif kind == 'inline':
+            self.executor = None
+        else:
+            raise ValueError(f"Unknown parse executor kind: {kind}")
+
+        self.semaphore = asyncio.Semaphore(self.workers * PENDING_PER_WORKER)
+        self.waits = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get('parse_executor', DEFAULT_KIND), config.get('parse_workers', DEFAULT_WORKERS))
+
+    async def run(self, fn, *args):
+        """Returns fn(*args); fn has to be a module level function when kind is 'process'."""
+        if self.executor is None:
+            return fn(*args)
+
+        if self.semaphore.locked():
+            self.waits += 1
+        async with self.semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.waits:
+            logger.info(f"{self.kind} parse pool: callers waited for a free slot {self.waits} times")
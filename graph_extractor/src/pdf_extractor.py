@@ -1,30 +1,185 @@
+import hashlib
+
 import pdfplumber
 import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pdfminer.pdftypes import PDFObjRef, PDFStream, resolve1
 import abort_manager
 
+PAGES_PER_TASK = 8
+ABORT_POLL_INTERVAL = 0.2
+
+
+def _page_text(txt):
+    return txt + "\n" if txt else ""
+
+
+def _extract_page_list(pdf_path, page_numbers):
+    # Runs in a worker process, so every worker opens its own copy of the PDF.
+    with pdfplumber.open(pdf_path) as pdf:
+        return page_numbers, [_page_text(pdf.pages[n].extract_text()) for n in page_numbers]
+
+
+def _report_progress(progress_callback, filename, pages_done, total_pages, action="Extracting"):
+    if progress_callback:
+        progress = pages_done / total_pages
+        progress_message = f"{action} {filename} - Progress: {progress:.0%}"
+        progress_callback(progress_message)
+
+
+def _extract_sequential(pdf, page_numbers, filename, progress_callback, page_texts):
+    total_pages = len(page_numbers)
+    for pages_done, n in enumerate(page_numbers, start=1):
+        if abort_manager.is_cancelled():
+            break
+
+        page_texts.append(_page_text(pdf.pages[n].extract_text()))
+        _report_progress(progress_callback, filename, pages_done, total_pages)
+
+
+def _map_parallel(page_list_fn, pdf_path, page_numbers, filename, workers, progress_callback, action="Extracting"):
+    """Runs page_list_fn over groups of PAGES_PER_TASK pages in worker processes.
+
+    Returns the results in page order; after an abort only the leading contiguous groups are kept.
+    """
+    page_groups = [
+        page_numbers[start:start + PAGES_PER_TASK]
+        for start in range(0, len(page_numbers), PAGES_PER_TASK)
+    ]
+
+    results = {}
+    pages_done = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {
+            executor.submit(page_list_fn, pdf_path, group)
+            for group in page_groups
+        }
+        while pending:
+            if abort_manager.is_cancelled():
+                for future in pending:
+                    future.cancel()
+                break
+
+            done, pending = wait(pending, timeout=ABORT_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                group, values = future.result()
+                results[group[0]] = values
+                pages_done += len(values)
+            if done:
+                _report_progress(progress_callback, filename, pages_done, len(page_numbers), action)
+
+    page_values = []
+    for group in page_groups:
+        if group[0] not in results:
+            break
+        page_values.extend(results[group[0]])
+    return page_values
+
+
+def _hash_object(sha, obj, seen):
+    """Feeds a PDF object into sha: dictionaries, arrays and stream contents recursively."""
+    if isinstance(obj, PDFObjRef):
+        # Objects shared between pages or with cycles back to a parent are hashed once per page.
+        if obj.objid in seen:
+            sha.update(f"ref {obj.objid};".encode())
+            return
+        seen.add(obj.objid)
+        obj = resolve1(obj)
+
+    if isinstance(obj, PDFStream):
+        _hash_object(sha, obj.attrs, seen)
+        sha.update(obj.get_data())
+    elif isinstance(obj, dict):
+        sha.update(b"<<")
+        for key in sorted(obj, key=str):
+            sha.update(f"/{key} ".encode())
+            _hash_object(sha, obj[key], seen)
+        sha.update(b">>")
+    elif isinstance(obj, (list, tuple)):
+        sha.update(b"[")
+        for item in obj:
+            _hash_object(sha, item, seen)
+        sha.update(b"]")
+    else:
+        sha.update(f"{obj!r};".encode())
+
 
-def extract_text_from_pdf(pdf_path, progress_callback=None):
-    extracted_text = ""
+def _hash_page(page):
+    """Hashes what the extracted text of a page depends on.
+
+    That is the content streams, the page boxes and the complete resources: fonts with their
+    encodings, widths, descendant fonts and ToUnicode maps, and form XObjects with their own
+    nested resources.
+    """
+    sha = hashlib.sha256()
+    page_obj = page.page_obj
+    seen = set()
+
+    for stream in page_obj.contents:
+        _hash_object(sha, stream, seen)
+
+    _hash_object(sha, [page_obj.mediabox, page_obj.cropbox, page_obj.rotate], seen)
+    _hash_object(sha, page_obj.resources, seen)
+
+    return sha.hexdigest()
+
+
+def _hash_page_list(pdf_path, page_numbers):
+    with pdfplumber.open(pdf_path) as pdf:
+        return page_numbers, [_hash_page(pdf.pages[n]) for n in page_numbers]
+
+
+def compute_page_hashes(pdf_path, progress_callback=None, workers=1):
+    """Returns one content hash per page without extracting any text.
+
+    Large documents are hashed in the same page groups and worker processes as extract_pages.
+    Returns None on errors and after an abort.
+    """
     try:
+        filename = os.path.basename(pdf_path)
         with pdfplumber.open(pdf_path) as pdf:
             total_pages = len(pdf.pages)
-            filename = os.path.basename(pdf_path)
-            for page_number, page in enumerate(pdf.pages, start=1):
-                if abort_manager.ABORT_FLAG:
-                    break
-
-                txt = page.extract_text()
-                if txt:
-                    extracted_text += txt + "\n"
-
-                if progress_callback:
-                    progress = page_number / total_pages
-                    progress_message = f"Extracting {filename} - Progress: {progress:.0%}"
-                    progress_callback(progress_message)
+            if workers <= 1 or total_pages <= PAGES_PER_TASK:
+                page_hashes = []
+                for pages_done, page in enumerate(pdf.pages, start=1):
+                    if abort_manager.is_cancelled():
+                        return None
+                    page_hashes.append(_hash_page(page))
+                    _report_progress(progress_callback, filename, pages_done, total_pages, "Hashing")
+                return page_hashes
+
+        page_hashes = _map_parallel(_hash_page_list, pdf_path, list(range(total_pages)), filename, workers,
+                                    progress_callback, "Hashing")
+        return page_hashes if len(page_hashes) == total_pages else None
+    except Exception as e:
+        print(f"Error hashing pages of {pdf_path}: {e}")
+        return None
+
+
+def extract_pages(pdf_path, page_numbers=None, progress_callback=None, workers=1):
+    """Returns the text of the given pages (all pages by default) in order.
+
+    After an abort the list holds only the pages extracted up to that point.
+    """
+    page_texts = []
+    try:
+        filename = os.path.basename(pdf_path)
+        with pdfplumber.open(pdf_path) as pdf:
+            if page_numbers is None:
+                page_numbers = list(range(len(pdf.pages)))
+            if workers <= 1 or len(page_numbers) <= PAGES_PER_TASK:
+                _extract_sequential(pdf, page_numbers, filename, progress_callback, page_texts)
+
+        if workers > 1 and len(page_numbers) > PAGES_PER_TASK:
+            page_texts = _map_parallel(_extract_page_list, pdf_path, page_numbers, filename, workers, progress_callback)
     except Exception as e:
         print(f"Error extracting text from {pdf_path}: {e}")
 
-    return extracted_text
+    return page_texts
+
+
+def extract_text_from_pdf(pdf_path, progress_callback=None, workers=1):
+    return ''.join(extract_pages(pdf_path, None, progress_callback, workers))
 
 
 def _test():
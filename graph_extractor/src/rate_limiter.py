@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+from log_utils import get_module_logger
+
+logger = get_module_logger("rate_limiter")
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class TokenBucket:
+    """Holds up to per_minute units and refills continuously at per_minute / 60 units per second.
+
+    take() always succeeds and may drive the level below zero; the returned delay is how long
+    the caller has to wait until its share has been refilled, so callers are served in order.
+    """
+
+    def __init__(self, per_minute, clock):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self.level = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, amount):
+        self._refill()
+        # A single request can never need more than a full bucket.
+        self.level -= min(amount, self.capacity)
+        return max(0.0, -self.level / self.rate)
+
+    def give_back(self, amount):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """Paces LLM requests to tokens-per-minute and requests-per-minute budgets.
+
+    reserve() charges the estimated tokens of a request (prompt plus completion budget) before
+    it is sent and waits until both buckets cover it; reconcile() refunds or charges the
+    difference to the tokens the provider reported. Either limit may be None.
+    """
+
+    def __init__(self, tokens_per_minute=None, requests_per_minute=None, clock=time.monotonic):
+        self.tokens = TokenBucket(tokens_per_minute, clock) if tokens_per_minute else None
+        self.requests = TokenBucket(requests_per_minute, clock) if requests_per_minute else None
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.tokens is not None or self.requests is not None
+
+    def take(self, estimated_tokens):
+        """Charges one request of estimated_tokens and returns how long to wait before sending it."""
+        with self.lock:
+            delay = 0.0
+            if self.tokens is not None:
+                delay = max(delay, self.tokens.take(estimated_tokens))
+            if self.requests is not None:
+                delay = max(delay, self.requests.take(1))
+            return delay
+
+    async def reserve(self, estimated_tokens):
+        """Waits until the budgets cover the request and returns the reservation for reconcile()."""
+        if not self.enabled:
+            return estimated_tokens
+
+        delay = self.take(estimated_tokens)
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.cancel(estimated_tokens)
+                raise
+        return estimated_tokens
+
+    def reconcile(self, reservation, used_tokens):
+        """Settles a reservation with the tokens actually used; None keeps the estimate."""
+        if self.tokens is None or used_tokens is None:
+            return
+        with self.lock:
+            if used_tokens < reservation:
+                self.tokens.give_back(reservation - used_tokens)
+            else:
+                self.tokens.take(used_tokens - reservation)
+
+    def cancel(self, reservation):
+        """Returns the budget of a request that was never sent."""
+        with self.lock:
+            if self.tokens is not None:
+                self.tokens.give_back(reservation)
+            if self.requests is not None:
+                self.requests.give_back(1)
+
+
+def get_rate_limiter(config):
+    """Returns the limiter shared by every run in this process that uses the same model and limits."""
+    key = (config['api'], config['model'], config.get('llm_tpm_limit'), config.get('llm_rpm_limit'))
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(config.get('llm_tpm_limit'), config.get('llm_rpm_limit'))
+            _limiters[key] = limiter
+            if limiter.enabled:
+                logger.info(f"Rate limit for {config['model']}: {key[2] or 'unlimited'} tokens and "
+                            f"{key[3] or 'unlimited'} requests per minute")
+    return limiter
@@ -0,0 +1,65 @@
+import hashlib
+import json
+import threading
+import sqlite_support
+from log_utils import get_module_logger
+
+logger = get_module_logger("response_cache")
+
+DEFAULT_MAX_ENTRIES = 100000
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def prompt_key(prompt, config):
+    """Hashes everything that determines the LLM answer to a prompt."""
+    key_fields = [config['api'], config['model'], config['temperature'], config['top_p'], prompt]
+    return hashlib.sha256(json.dumps(key_fields).encode('utf-8')).hexdigest()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def lookup(prompt, config, writer=None):
+    """Returns the cached response for this prompt and model settings, or None.
+
+    With a db_writer.ResponseWriter the hit is only read here; marking it as recently used
+    is queued on the writer, which applies the updates in batches.
+    """
+    key = prompt_key(prompt, config)
+    response = sqlite_support.get_cached_response(key, touch=writer is None)
+    if response is not None and writer is not None:
+        writer.touch_cached_response(key)
+    _count('hits' if response is not None else 'misses')
+    return response
+
+
+def store(prompt, config, response, writer=None):
+    """Caches a response; with a db_writer.ResponseWriter the write happens on its thread."""
+    max_entries = config.get('response_cache_max_entries', DEFAULT_MAX_ENTRIES)
+    if writer is not None:
+        writer.add_cached_response(prompt_key(prompt, config), response, max_entries)
+    else:
+        sqlite_support.insert_cached_responses([(prompt_key(prompt, config), response)], max_entries)
+
+
+def get_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+    return stats
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats['hits'] = 0
+        _stats['misses'] = 0
+
+
+def log_stats():
+    stats = get_stats()
+    logger.info(f"Response cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
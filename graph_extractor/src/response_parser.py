@@ -7,141 +7,268 @@ from io import StringIO
 logging = get_module_logger("response_parser")
 
 
-def parse_text_to_dataframes(text):
-    try:
-        lines = text.splitlines()
-        if not lines:
-            logging.warning("Input text is empty. Returning empty DataFrames.")
-            return pd.DataFrame(), pd.DataFrame()
+NODE_HEADER = 'id,entity,category'
+EDGE_HEADER = 'source,target,relationship'
+NODE_COLUMNS = ['id', 'label', 'type']
+EDGE_COLUMNS = ['source', 'target', 'label']
 
-        nodes_lines = []
-        edges_lines = []
-        in_nodes = False
-        in_edges = False
 
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            if line.startswith('id,entity,category'):
-                in_nodes = True
-                in_edges = False
-                nodes_lines.append(line)
-            elif line.startswith('source,target,relationship'):
-                in_nodes = False
-                in_edges = True
-                edges_lines.append(line)
-            elif line.startswith('#') or line.startswith('```'):
-                continue
-            elif in_nodes:
-                nodes_lines.append(line)
-            elif in_edges:
-                edges_lines.append(line)
-
-        nodes_df = pd.DataFrame(columns=['id', 'entity', 'category'])
-        edges_df = pd.DataFrame(columns=['source', 'target', 'relationship'])
+def _split_sections(lines):
+    """Returns the (nodes, edges) lines of a response, each list starting with its header line."""
+    nodes_lines = []
+    edges_lines = []
+    section = None
 
-        if nodes_lines:
-            nodes_csv = '\n'.join(nodes_lines)
-            valid_nodes_lines = validate_csv_rows(nodes_csv, ['id', 'entity', 'category'])
-            if valid_nodes_lines is None or len(valid_nodes_lines) <= 1:
-                logging.error("No valid node rows found after validation.")
-                return None, None
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith(NODE_HEADER):
+            section = nodes_lines
+            nodes_lines.append(line)
+        elif line.startswith(EDGE_HEADER):
+            section = edges_lines
+            edges_lines.append(line)
+        elif line.startswith('#') or line.startswith('```'):
+            continue
+        elif section is not None:
+            section.append(line)
 
-            try:
-                nodes_df = pd.read_csv(StringIO('\n'.join(valid_nodes_lines)))
-            except Exception as e:
-                logging.exception("Failed to read nodes CSV into DataFrame.")
-                return None, None
+    return nodes_lines, edges_lines
 
-            if nodes_df.empty:
-                logging.warning("Nodes DataFrame is empty after parsing.")
-            if nodes_df['id'].duplicated().any():
-                logging.error("Duplicate IDs found in nodes.")
-                return None, None
 
-            if not nodes_df['id'].apply(lambda x: isinstance(x, (int, str))).all():
-                logging.error("Inconsistent ID types found in nodes.")
-                return None, None
+def _read_rows(lines, column_count):
+    """Reads the data rows below a header line in one csv.reader pass; rows with the wrong field count are skipped.
+
+    Returns None if the header itself does not have column_count fields.
+    """
+    if len(lines[0].split(',')) != column_count:
+        logging.error(f"Header does not match the expected {column_count} columns: {lines[0]}")
+        return None
+
+    # A line with an unbalanced quote would make the reader continue the field on the next line.
+    balanced = []
+    for line in lines[1:]:
+        if line.count('"') % 2:
+            logging.warning(f"Invalid row (unbalanced quotes): {line}")
+        else:
+            balanced.append(line)
+
+    rows = []
+    for fields in csv.reader(balanced, skipinitialspace=True):
+        if len(fields) == column_count:
+            rows.append(fields)
+        else:
+            logging.warning(f"Invalid row: {fields}. Expected {column_count} columns.")
+    return rows
+
+
+def _node_key(value):
+    """Ids are matched between nodes and edges as integers where possible, like read_csv would type them."""
+    value = value.strip()
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def parse_text_to_records(text):
+    """Parses a graph response into (nodes, edges) lists of plain tuples without pandas.
 
-            try:
-                nodes_df = nodes_df.set_index("id")
-            except Exception as e:
-                logging.exception("Failed to set 'id' as index for nodes DataFrame.")
+    nodes holds (id, label, type) and edges (source, target, label). Duplicate edges and nodes
+    without edges are dropped and the remaining nodes are renumbered 0..n-1 in response order.
+    Returns (None, None) for unusable responses and (nodes, None) if only the edge rows are invalid.
+    """
+    try:
+        nodes_lines, edges_lines = _split_sections(text.splitlines())
+
+        nodes = []
+        if nodes_lines:
+            rows = _read_rows(nodes_lines, len(NODE_COLUMNS))
+            if not rows:
+                logging.error("No valid node rows found after validation.")
                 return None, None
+
+            seen = set()
+            for node_id, label, node_type in rows:
+                node_id = _node_key(node_id)
+                if node_id == '':
+                    logging.error("Node without id found.")
+                    return None, None
+                if node_id in seen:
+                    logging.error("Duplicate IDs found in nodes.")
+                    return None, None
+                seen.add(node_id)
+                nodes.append((node_id, label, node_type))
         else:
-            logging.warning("No node section found. Returning empty node DataFrame.")
+            logging.warning("No node section found. Returning empty nodes.")
 
+        edges = []
         if edges_lines:
-            edges_csv = '\n'.join(edges_lines)
-            valid_edges_lines = validate_csv_rows(edges_csv, ['source', 'target', 'relationship'])
-            if valid_edges_lines is None or len(valid_edges_lines) <= 1:
+            rows = _read_rows(edges_lines, len(EDGE_COLUMNS))
+            if not rows:
                 logging.error("No valid edge rows found after validation.")
-                return nodes_df, None
-
-            try:
-                edges_df = pd.read_csv(StringIO('\n'.join(valid_edges_lines)))
-            except Exception as e:
-                logging.error(f"Failed to read edges CSV into DataFrame. {e}")
-                return nodes_df, None
+                return nodes, None
+
+            seen = set()
+            for source, target, label in rows:
+                edge = (_node_key(source), _node_key(target), label)
+                if edge not in seen:
+                    seen.add(edge)
+                    edges.append(edge)
         else:
-            logging.warning("No edge section found. Returning empty edge DataFrame.")
-
-        try:
-            nodes_df = nodes_df.rename(columns={
-                'entity': 'label',
-                'category': 'type'
-            })
-            edges_df = edges_df.rename(columns={
-                'relationship': 'label'
-            })
-        except Exception as e:
-            logging.exception("Failed to rename columns.")
-            return None, None
-
-        edges_df.drop_duplicates(subset=['source', 'target', 'label'], inplace=True)
-
-        logging.info("---------------------------------------------------------------------")
-        logging.info(f"\n{nodes_df}")
-        logging.info(f"\n{edges_df}")
-        nodes_clean_df, edges_clean_df = remove_orphan_nodes_and_reindex(nodes_df, edges_df)
-        # nodes_clean_df, edges_clean_df = nodes_df, edges_df
-        logging.info(f"\n{nodes_clean_df}")
-        logging.info(f"\n{edges_clean_df}")
-
-        return nodes_clean_df, edges_clean_df
+            logging.warning("No edge section found. Returning empty edges.")
+
+        # Nodes without edges are dropped and the rest renumbered in response order.
+        referenced = {source for source, _, _ in edges} | {target for _, target, _ in edges}
+        new_ids = {}
+        kept_nodes = []
+        for node_id, label, node_type in nodes:
+            if node_id in referenced:
+                new_ids[node_id] = len(kept_nodes)
+                kept_nodes.append((new_ids[node_id], label, node_type))
+
+        kept_edges = []
+        for source, target, label in edges:
+            if source not in new_ids or target not in new_ids:
+                logging.error(f"Edge {source} -> {target} references an unknown node.")
+                return None, None
+            kept_edges.append((new_ids[source], new_ids[target], label))
 
-    except Exception as e:
-        logging.exception("An error occurred while parsing text to DataFrames.")
+        logging.info(f"Parsed {len(kept_nodes)} nodes and {len(kept_edges)} edges "
+                     f"({len(nodes) - len(kept_nodes)} orphan nodes removed).")
+        return kept_nodes, kept_edges
+
+    except Exception:
+        logging.exception("An error occurred while parsing text to records.")
         return None, None
 
 
-def validate_csv_rows(csv_text, expected_columns):
-    lines = csv_text.splitlines()
-    if not lines:
-        logging.error("CSV text is empty. Cannot validate.")
-        return None
+def records_to_dataframes(nodes, edges):
+    """DataFrame adapter: nodes indexed by 'id' with label/type columns, edges with source/target/label."""
+    nodes_df = None if nodes is None else pd.DataFrame(nodes, columns=NODE_COLUMNS).set_index('id')
+    edges_df = None if edges is None else pd.DataFrame(edges, columns=EDGE_COLUMNS)
+    return nodes_df, edges_df
 
-    header_fields = lines[0].strip().split(',')
-    if len(header_fields) != len(expected_columns):
-        logging.error(f"Header does not match expected columns. Expected: {expected_columns}, Got: {header_fields}")
-        return None
 
-    valid_lines = [lines[0]]
-    for i, line in enumerate(lines[1:], start=2):
-        line_stripped = line.strip()
-        if not line_stripped:
-            logging.warning(f"Empty or whitespace-only line at {i}. Skipping.")
-            continue
-        fields = next(csv.reader([line_stripped], skipinitialspace=True))
-        if len(fields) != len(expected_columns):
-            logging.warning(f"Invalid row at line {i}: {line}. Expected {len(expected_columns)} columns.")
-            continue
-        valid_lines.append(line_stripped)
+def records_to_csv(nodes, edges):
+    """Writes parsed records as the same (nodes, edges) CSV text the DataFrames' to_csv produced."""
+    nodes_buffer = StringIO()
+    writer = csv.writer(nodes_buffer, lineterminator='\n')
+    writer.writerow(NODE_COLUMNS)
+    writer.writerows(nodes)
+
+    edges_buffer = StringIO()
+    writer = csv.writer(edges_buffer, lineterminator='\n')
+    writer.writerow(EDGE_COLUMNS)
+    writer.writerows(edges)
 
-    if len(valid_lines) == 1:
-        logging.warning("No valid data rows found in the CSV after validation.")
-    return valid_lines
+    return nodes_buffer.getvalue(), edges_buffer.getvalue()
+
+
+def parse_text_to_csv(text):
+    """Returns (nodes, edges, (nodes_csv, edges_csv)); the CSV pair is None if the response is unusable.
+
+    Parsing and serializing in one call lets a parse pool do all of the per-response work.
+    """
+    nodes, edges = parse_text_to_records(text)
+    if nodes is None or edges is None:
+        return nodes, edges, None
+    return nodes, edges, records_to_csv(nodes, edges)
+
+
+def parse_text_to_dataframes(text):
+    nodes, edges = parse_text_to_records(text)
+    return records_to_dataframes(nodes, edges)
+
+
+class MalformedResponse(Exception):
+    """A streamed response was abandoned because it could no longer produce a usable graph; the request can be sent again."""
+
+
+class IncrementalParser:
+    """Reads a streamed graph response line by line as the text arrives.
+
+    feed() returns the ('nodes' | 'edges', fields) rows completed by the new text. Section
+    headers are detected the same way parse_text_to_records does. Once the stream can no
+    longer produce a usable graph (a header with the wrong columns, a duplicate node id or
+    max_invalid_rows unreadable rows before the first valid row of a section) error is set
+    and the caller can stop reading. The complete text is still parsed with
+    parse_text_to_records afterwards.
+    """
+
+    def __init__(self, max_invalid_rows=10):
+        self.max_invalid_rows = max_invalid_rows
+        self.error = None
+        self.nodes = []
+        self.edges = []
+        self._buffer = ''
+        self._section = None
+        self._node_ids = set()
+        self._section_rows = 0
+        self._invalid_rows = 0
+
+    def feed(self, text):
+        if self.error:
+            return []
+
+        lines = (self._buffer + text).split('\n')
+        self._buffer = lines.pop()
+        rows = []
+        for line in lines:
+            row = self._read_line(line)
+            if self.error:
+                break
+            if row is not None:
+                rows.append(row)
+        return rows
+
+    def close(self):
+        """Reads the last line, which has no line break after it."""
+        text, self._buffer = self._buffer, ''
+        return self.feed(text + '\n') if text else []
+
+    def _fail(self, reason):
+        self.error = reason
+        logging.warning(f"Stopping streamed response early: {reason}")
+
+    def _read_line(self, line):
+        line = line.strip()
+        if not line:
+            return None
+
+        for header, section, column_count in [(NODE_HEADER, 'nodes', len(NODE_COLUMNS)),
+                                              (EDGE_HEADER, 'edges', len(EDGE_COLUMNS))]:
+            if line.startswith(header):
+                if len(line.split(',')) != column_count:
+                    self._fail(f"header does not match the expected columns: {line}")
+                self._section = section
+                self._section_rows = 0
+                self._invalid_rows = 0
+                return None
+
+        if line.startswith('#') or line.startswith('```') or self._section is None:
+            return None
+
+        fields = next(csv.reader([line], skipinitialspace=True)) if line.count('"') % 2 == 0 else []
+        if len(fields) != 3:
+            # Once a section has a valid row, invalid ones are only skipped, as parse_text_to_records does.
+            self._invalid_rows += 1
+            if self._section_rows == 0 and self._invalid_rows >= self.max_invalid_rows:
+                self._fail(f"{self._invalid_rows} unreadable rows and no valid {self._section} row")
+            return None
+        self._section_rows += 1
+
+        if self._section == 'nodes':
+            node_id = _node_key(fields[0])
+            if node_id in self._node_ids:
+                self._fail(f"duplicate node id {node_id}")
+                return None
+            self._node_ids.add(node_id)
+            self.nodes.append(fields)
+        else:
+            self.edges.append(fields)
+        return self._section, fields
 
 
 def parse_nodes(response):
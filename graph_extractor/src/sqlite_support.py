@@ -1,5 +1,9 @@
+import csv
+import hashlib
 import sqlite3
 import os
+import json
+from io import StringIO
 import threading
 from log_utils import get_module_logger
 
@@ -11,6 +15,21 @@ _db_initialized = {}
 
 _database_path = None
 
+SQL_VARIABLE_BATCH_SIZE = 500
+
+# Bumped whenever _migrate_database learns a new step; stored in PRAGMA user_version.
+SCHEMA_VERSION = 5
+
+CONNECTION_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -65536",  # 64 MiB page cache (negative means KiB)
+    "PRAGMA temp_store = MEMORY",
+    # The writer thread and the merge/cache threads share the file; wait for the lock
+    # this long (ms) instead of failing a write after sqlite3's default 5 s.
+    "PRAGMA busy_timeout = 30000",
+]
+
 
 def set_database_path(db_path):
     global _database_path
@@ -20,6 +39,11 @@ def set_database_path(db_path):
 def get_connection():
     conn = getattr(_thread_local, 'connection', None)
 
+    # Pooled worker threads outlive a run; reconnect when the database path has changed since.
+    if conn is not None and getattr(_thread_local, 'path', None) != _database_path:
+        conn.close()
+        conn = _thread_local.connection = None
+
     if conn is None:
         if _database_path is None:
             logging.error('Database path needs to be set first! Use "set_database_path()" !')
@@ -29,7 +53,9 @@ def get_connection():
             os.makedirs(os.path.dirname(_database_path), exist_ok=True)
 
             conn = sqlite3.connect(_database_path, check_same_thread=False)
+            _configure_connection(conn)
             _thread_local.connection = conn
+            _thread_local.path = _database_path
 
             if _database_path not in _db_initialized:
                 initialize_database(conn)
@@ -43,6 +69,164 @@ def get_connection():
     return conn
 
 
+def _configure_connection(conn):
+    # WAL lets readers run next to the writer, and with WAL synchronous=NORMAL
+    # only syncs at checkpoints while staying consistent after a crash.
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+
+
+def _parse_index(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not 0 <= number < float('inf'):
+        return None
+    return int(number)
+
+
+def _csv_records(nodes_csv, edges_csv):
+    """Parses the nodes (id,label,type) and edges (source,target,label) CSV of a response or graph.
+
+    Rows with a missing or negative id are dropped and missing labels become empty strings,
+    so the typed tables only ever hold validated rows.
+    """
+    node_rows = []
+    for row in csv.DictReader(StringIO(nodes_csv or '')):
+        node_id = _parse_index(row.get('id'))
+        if node_id is not None:
+            node_rows.append((node_id, row.get('label') or '', row.get('type') or ''))
+
+    edge_rows = []
+    for row in csv.DictReader(StringIO(edges_csv or '')):
+        source, target = _parse_index(row.get('source')), _parse_index(row.get('target'))
+        if source is not None and target is not None:
+            edge_rows.append((source, target, row.get('label') or ''))
+
+    return node_rows, edge_rows
+
+
+def _replace_response_records(conn, rows):
+    """Rewrites the typed nodes and edges of (document_id, chunk_index, config_id, nodes, edges) rows."""
+    keys = [(document_id, config_id, chunk_index) for document_id, chunk_index, config_id, _, _ in rows]
+    conn.executemany('DELETE FROM ResponseNodes WHERE document_id = ? AND config_id = ? AND chunk_index = ?', keys)
+    conn.executemany('DELETE FROM ResponseEdges WHERE document_id = ? AND config_id = ? AND chunk_index = ?', keys)
+
+    node_rows, edge_rows = [], []
+    for document_id, chunk_index, config_id, nodes, edges in rows:
+        nodes, edges = _csv_records(nodes, edges)
+        node_rows.extend((document_id, config_id, chunk_index, *node) for node in nodes)
+        edge_rows.extend((document_id, config_id, chunk_index, *edge) for edge in edges)
+
+    conn.executemany('''
+        INSERT INTO ResponseNodes (document_id, config_id, chunk_index, node_id, label, type)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', node_rows)
+    conn.executemany('''
+        INSERT INTO ResponseEdges (document_id, config_id, chunk_index, source, target, label)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', edge_rows)
+
+
+def _replace_graph_records(conn, document_id, config_id, nodes, edges):
+    conn.execute('DELETE FROM GraphNodes WHERE document_id = ? AND config_id = ?', (document_id, config_id))
+    conn.execute('DELETE FROM GraphEdges WHERE document_id = ? AND config_id = ?', (document_id, config_id))
+
+    node_rows, edge_rows = _csv_records(nodes, edges)
+    conn.executemany('''
+        INSERT INTO GraphNodes (document_id, config_id, node_id, label, type)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(document_id, config_id, *node) for node in node_rows])
+    conn.executemany('''
+        INSERT INTO GraphEdges (document_id, config_id, source, target, label)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(document_id, config_id, *edge) for edge in edge_rows])
+
+
+def _graph_content_hash(nodes, edges):
+    return hashlib.sha256(f"{nodes}\0{edges}".encode('utf-8')).hexdigest()
+
+
+def _deduplicate(cursor, table, key_columns):
+    """Keeps the oldest row per key, which is the one the lookups have always returned."""
+    keys = ', '.join(key_columns)
+    cursor.execute(f'''
+        DELETE FROM {table}
+        WHERE id NOT IN (
+            SELECT MIN(id)
+            FROM {table}
+            GROUP BY {keys}
+        )
+    ''')
+    if cursor.rowcount > 0:
+        logging.info(f"Removed {cursor.rowcount} duplicate rows from {table}.")
+
+
+def _migrate_database(conn):
+    cursor = conn.cursor()
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+
+    if version < 1:
+        logging.info("Migrating database to schema version 1: unique lookup indexes.")
+        _deduplicate(cursor, "Responses", ["document_id", "config_id", "chunk_index"])
+        _deduplicate(cursor, "Responses_L1", ["document_id", "config_id", "chunk_index"])
+        _deduplicate(cursor, "Graphs", ["document_id", "config_id"])
+
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_responses_key
+            ON Responses (document_id, config_id, chunk_index)
+        ''')
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_responses_l1_key
+            ON Responses_L1 (document_id, config_id, chunk_index)
+        ''')
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_graphs_key
+            ON Graphs (document_id, config_id)
+        ''')
+
+    if version < 2:
+        logging.info("Migrating database to schema version 2: response revisions.")
+        # Every rewrite of a response bumps its revision, so merges can tell which chunks changed.
+        cursor.execute("ALTER TABLE Responses ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+
+    if version < 3:
+        logging.info("Migrating database to schema version 3: typed response and graph rows.")
+        responses = cursor.execute("SELECT document_id, chunk_index, config_id, nodes, edges FROM Responses").fetchall()
+        _replace_response_records(conn, responses)
+        graphs = cursor.execute("SELECT document_id, config_id, nodes, edges FROM Graphs").fetchall()
+        for document_id, config_id, nodes, edges in graphs:
+            _replace_graph_records(conn, document_id, config_id, nodes, edges)
+        logging.info(f"Converted {len(responses)} responses and {len(graphs)} graphs to typed rows.")
+
+    if version < 4:
+        logging.info("Migrating database to schema version 4: graph content hashes.")
+        # Composite graphs are cached per member graph content, so a rewritten graph is noticed.
+        cursor.execute("ALTER TABLE Graphs ADD COLUMN content_hash TEXT")
+        graphs = cursor.execute("SELECT id, nodes, edges FROM Graphs").fetchall()
+        cursor.executemany("UPDATE Graphs SET content_hash = ? WHERE id = ?",
+                           [(_graph_content_hash(nodes, edges), graph_id) for graph_id, nodes, edges in graphs])
+
+    if version < 5:
+        logging.info("Migrating database to schema version 5: merge state rows.")
+        # Entity and edge counts are kept as rows, so a merge only rewrites the ones it changed.
+        states = cursor.execute("SELECT document_id, config_id, state FROM GraphMergeState").fetchall()
+        for document_id, config_id, state in states:
+            state = json.loads(state)
+            entities = state.get('entities', {})
+            edges = {(source, target, label): count for source, target, label, count in state.get('edges', [])}
+            _write_merge_rows(conn, document_id, config_id, entities, edges)
+            cursor.execute("UPDATE GraphMergeState SET state = ? WHERE document_id = ? AND config_id = ?",
+                           (json.dumps({'next_id': state.get('next_id', 0)}), document_id, config_id))
+        logging.info(f"Converted {len(states)} merge states to rows.")
+
+    cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.commit()
+
+
 def initialize_database(conn):
     try:
         cursor = conn.cursor()
@@ -106,12 +290,204 @@ def initialize_database(conn):
             )
         ''')
 
+        # Parsed nodes and edges of every response and graph, so merges read typed rows instead of CSV.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ResponseNodes (
+                document_id INTEGER NOT NULL,
+                config_id INTEGER NOT NULL,
+                chunk_index INTEGER NOT NULL,
+                node_id INTEGER NOT NULL,
+                label TEXT NOT NULL,
+                type TEXT NOT NULL,
+                FOREIGN KEY (document_id) REFERENCES Documents(id),
+                FOREIGN KEY (config_id) REFERENCES Configurations(id)
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_response_nodes_key
+            ON ResponseNodes (document_id, config_id, chunk_index)
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ResponseEdges (
+                document_id INTEGER NOT NULL,
+                config_id INTEGER NOT NULL,
+                chunk_index INTEGER NOT NULL,
+                source INTEGER NOT NULL,
+                target INTEGER NOT NULL,
+                label TEXT NOT NULL,
+                FOREIGN KEY (document_id) REFERENCES Documents(id),
+                FOREIGN KEY (config_id) REFERENCES Configurations(id)
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_response_edges_key
+            ON ResponseEdges (document_id, config_id, chunk_index)
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS GraphNodes (
+                document_id INTEGER NOT NULL,
+                config_id INTEGER NOT NULL,
+                node_id INTEGER NOT NULL,
+                label TEXT NOT NULL,
+                type TEXT NOT NULL,
+                FOREIGN KEY (document_id) REFERENCES Documents(id),
+                FOREIGN KEY (config_id) REFERENCES Configurations(id)
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_graph_nodes_key
+            ON GraphNodes (document_id, config_id)
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS GraphEdges (
+                document_id INTEGER NOT NULL,
+                config_id INTEGER NOT NULL,
+                source INTEGER NOT NULL,
+                target INTEGER NOT NULL,
+                label TEXT NOT NULL,
+                FOREIGN KEY (document_id) REFERENCES Documents(id),
+                FOREIGN KEY (config_id) REFERENCES Configurations(id)
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_graph_edges_key
+            ON GraphEdges (document_id, config_id)
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS Pages (
+                page_hash TEXT PRIMARY KEY,
+                page_text TEXT NOT NULL
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS DocumentPages (
+                document_id INTEGER NOT NULL,
+                page_number INTEGER NOT NULL,
+                page_hash TEXT NOT NULL,
+                PRIMARY KEY (document_id, page_number),
+                FOREIGN KEY (document_id) REFERENCES Documents(id),
+                FOREIGN KEY (page_hash) REFERENCES Pages(page_hash)
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS Chunks (
+                document_id INTEGER NOT NULL,
+                config_id INTEGER NOT NULL,
+                chunk_index INTEGER NOT NULL,
+                text_hash TEXT NOT NULL,
+                PRIMARY KEY (document_id, config_id, chunk_index),
+                FOREIGN KEY (document_id) REFERENCES Documents(id),
+                FOREIGN KEY (config_id) REFERENCES Configurations(id)
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_chunks_text_hash
+            ON Chunks (config_id, text_hash)
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS GraphMergeState (
+                document_id INTEGER NOT NULL,
+                config_id INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                PRIMARY KEY (document_id, config_id),
+                FOREIGN KEY (document_id) REFERENCES Documents(id),
+                FOREIGN KEY (config_id) REFERENCES Configurations(id)
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS MergeContributions (
+                document_id INTEGER NOT NULL,
+                config_id INTEGER NOT NULL,
+                chunk_index INTEGER NOT NULL,
+                revision INTEGER NOT NULL,
+                nodes TEXT NOT NULL,
+                edges TEXT NOT NULL,
+                PRIMARY KEY (document_id, config_id, chunk_index),
+                FOREIGN KEY (document_id) REFERENCES Documents(id),
+                FOREIGN KEY (config_id) REFERENCES Configurations(id)
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS MergeEntities (
+                document_id INTEGER NOT NULL,
+                config_id INTEGER NOT NULL,
+                entity_key TEXT NOT NULL,
+                entity_id INTEGER NOT NULL,
+                label TEXT NOT NULL,
+                types TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (document_id, config_id, entity_key),
+                FOREIGN KEY (document_id) REFERENCES Documents(id),
+                FOREIGN KEY (config_id) REFERENCES Configurations(id)
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS MergeEdges (
+                document_id INTEGER NOT NULL,
+                config_id INTEGER NOT NULL,
+                source TEXT NOT NULL,
+                target TEXT NOT NULL,
+                label TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (document_id, config_id, source, target, label),
+                FOREIGN KEY (document_id) REFERENCES Documents(id),
+                FOREIGN KEY (config_id) REFERENCES Configurations(id)
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS CompositeGraphs (
+                composite_key TEXT PRIMARY KEY,
+                members TEXT NOT NULL,
+                state TEXT NOT NULL,
+                last_used INTEGER NOT NULL
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS PromptCache (
+                prompt_hash TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                last_used INTEGER NOT NULL
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_prompt_cache_last_used
+            ON PromptCache (last_used)
+        ''')
+
         conn.commit()
 
+        _migrate_database(conn)
+
     except sqlite3.Error as e:
+        conn.rollback()
         logging.error(f"An error occurred while initializing the database: {e}")
 
 
+def close_connection():
+    conn = getattr(_thread_local, 'connection', None)
+    if conn is not None:
+        conn.close()
+        _thread_local.connection = None
+
+
 def get_or_create_config_id(api, model, temperature, top_p, chunk_size, padding_size):
     conn = get_connection()
     if conn is None:
@@ -238,41 +614,35 @@ def insert_document(sha_256_hash, text, name):
         return None
 
 
-def print_database_summary():
+def get_page_texts(page_hashes):
     conn = get_connection()
     if conn is None:
         logging.error("Database connection is not available.")
-        return
+        return {}
 
+    unique_hashes = list(dict.fromkeys(page_hashes))
+    page_texts = {}
     try:
         cursor = conn.cursor()
-
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tables = cursor.fetchall()
-
-        if not tables:
-            logging.info("No tables found in the database.")
-            return
-
-        logging.info("Database Summary:")
-        for (table_name,) in tables:
-            logging.info(f"\nTable: {table_name}")
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            columns = cursor.fetchall()
-
-            for col in columns:
-                col_id, col_name, col_type, col_notnull, col_default, col_pk = col
-                logging.info(
-                    f"  Column: {col_name} | Type: {col_type} | "
-                    f"NotNull: {'Yes' if col_notnull else 'No'} | "
-                    f"Primary Key: {'Yes' if col_pk else 'No'}"
-                )
+        for start in range(0, len(unique_hashes), SQL_VARIABLE_BATCH_SIZE):
+            batch = unique_hashes[start:start + SQL_VARIABLE_BATCH_SIZE]
+            placeholders = ', '.join('?' for _ in batch)
+            cursor.execute(f'''
+                SELECT page_hash, page_text
+                FROM Pages
+                WHERE page_hash IN ({placeholders})
+            ''', batch)
+            page_texts.update(cursor.fetchall())
+
+        logging.info(f"Found {len(page_texts)} of {len(unique_hashes)} pages in cache.")
+        return page_texts
 
     except sqlite3.Error as e:
-        logging.error(f"An error occurred while printing the database summary: {e}")
+        logging.error(f"An error occurred while retrieving cached pages: {e}")
+        return {}
 
 
-def response_exists_L1(document_id, chunk_index, config_id):
+def insert_pages(page_texts):
     conn = get_connection()
     if conn is None:
         logging.error("Database connection is not available.")
@@ -280,28 +650,20 @@ def response_exists_L1(document_id, chunk_index, config_id):
 
     try:
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT 1 
-            FROM Responses_L1 
-            WHERE document_id = ? 
-              AND chunk_index = ?
-              AND config_id = ?
-        ''', (document_id, chunk_index, config_id))
-        result = cursor.fetchone()
-
-        if result:
-            logging.info(f"L1 - Response exists for document ID={document_id}, chunk_index={chunk_index}, config_id={config_id}.")
-            return True
-        else:
-            logging.info(f"L1 - No response found for document ID={document_id}, chunk_index={chunk_index}, config_id={config_id}.")
-            return False
+        cursor.executemany('''
+            INSERT OR IGNORE INTO Pages (page_hash, page_text)
+            VALUES (?, ?)
+        ''', page_texts.items())
+        conn.commit()
+        logging.info(f"Inserted {len(page_texts)} pages into the page cache.")
+        return True
 
     except sqlite3.Error as e:
-        logging.error(f"An error occurred while checking L1 response existence: {e}")
+        logging.error(f"An error occurred while inserting pages: {e}")
         return False
 
 
-def response_exists(document_id, chunk_index, config_id):
+def insert_document_pages(document_id, page_hashes):
     conn = get_connection()
     if conn is None:
         logging.error("Database connection is not available.")
@@ -309,121 +671,546 @@ def response_exists(document_id, chunk_index, config_id):
 
     try:
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT 1 
-            FROM Responses
-            WHERE document_id = ?
-              AND chunk_index = ?
-              AND config_id = ?
-        ''', (document_id, chunk_index, config_id))
-        result = cursor.fetchone()
-
-        if result:
-            logging.info(f"L2 - Response exists for document ID={document_id}, chunk_index={chunk_index}, config_id={config_id}.")
-            return True
-        else:
-            logging.info(f"L2 - No response found for document ID={document_id}, chunk_index={chunk_index}, config_id={config_id}.")
-            return False
+        cursor.executemany('''
+            INSERT OR REPLACE INTO DocumentPages (document_id, page_number, page_hash)
+            VALUES (?, ?, ?)
+        ''', [(document_id, page_number, page_hash) for page_number, page_hash in enumerate(page_hashes)])
+        conn.commit()
+        logging.info(f"Linked {len(page_hashes)} pages to document ID {document_id}.")
+        return True
 
     except sqlite3.Error as e:
-        logging.error(f"An error occurred while checking L2 response existence: {e}")
+        logging.error(f"An error occurred while linking pages to document ID {document_id}: {e}")
         return False
 
 
-def insert_response_L1(document_id, chunk_index, config_id, nodes):
+def insert_chunk_hash(document_id, config_id, chunk_index, text_hash):
     conn = get_connection()
     if conn is None:
         logging.error("Database connection is not available.")
-        return None
+        return False
 
     try:
         cursor = conn.cursor()
-
-        # Check if there's an existing row
         cursor.execute('''
-            SELECT id 
-            FROM Responses_L1 
-            WHERE document_id = ? 
-              AND chunk_index = ?
-              AND config_id = ?
-        ''', (document_id, chunk_index, config_id))
-        existing_response = cursor.fetchone()
-
-        if existing_response:
-            response_id = existing_response[0]
-            cursor.execute('''
-                UPDATE Responses_L1
-                SET nodes = ?
-                WHERE document_id = ?
-                  AND chunk_index = ?
-                  AND config_id = ?
-            ''', (nodes, document_id, chunk_index, config_id))
-            conn.commit()
-            logging.info(f"L1 - Updated response with ID {response_id} for doc={document_id}, chunk_index={chunk_index}, config_id={config_id}.")
-            logging.info(f"L1 - {nodes}")
-            return response_id
-        else:
-            cursor.execute('''
-                INSERT INTO Responses_L1 (document_id, chunk_index, config_id, nodes)
-                VALUES (?, ?, ?, ?)
-            ''', (document_id, chunk_index, config_id, nodes))
-            conn.commit()
-            response_id = cursor.lastrowid
-            logging.info(f"L1 - Inserted response with ID {response_id} for doc={document_id}, chunk_index={chunk_index}, config_id={config_id}.")
-            logging.info(f"L1 - {nodes}")
-            return response_id
+            INSERT OR REPLACE INTO Chunks (document_id, config_id, chunk_index, text_hash)
+            VALUES (?, ?, ?, ?)
+        ''', (document_id, config_id, chunk_index, text_hash))
+        conn.commit()
+        return True
 
     except sqlite3.Error as e:
-        logging.error(f"L1 - Error while inserting/updating response for doc={document_id}, chunk_index={chunk_index}, config_id={config_id}: {e}")
-        return None
+        logging.error(f"An error occurred while storing hash of chunk {chunk_index} for document ID {document_id}: {e}")
+        return False
 
 
-def insert_response(document_id, chunk_index, config_id, nodes, edges):
+def get_chunk_hashes(document_id, config_id):
+    """Returns {chunk_index: text_hash} of the chunks the stored responses were made from."""
     conn = get_connection()
     if conn is None:
         logging.error("Database connection is not available.")
-        return None
+        return {}
 
     try:
         cursor = conn.cursor()
-
         cursor.execute('''
-            SELECT id 
-            FROM Responses
+            SELECT chunk_index, text_hash
+            FROM Chunks
             WHERE document_id = ?
-              AND chunk_index = ?
               AND config_id = ?
-        ''', (document_id, chunk_index, config_id))
-        existing_response = cursor.fetchone()
-
-        if existing_response:
-            response_id = existing_response[0]
-            cursor.execute('''
-                UPDATE Responses
-                SET nodes = ?, edges = ?
-                WHERE document_id = ?
-                  AND chunk_index = ?
-                  AND config_id = ?
-            ''', (nodes, edges, document_id, chunk_index, config_id))
-            conn.commit()
-            logging.info(f"L2 - Updated response with ID {response_id} for doc={document_id}, chunk_index={chunk_index}, config_id={config_id}.")
-            return response_id
-        else:
-            cursor.execute('''
-                INSERT INTO Responses (document_id, chunk_index, config_id, nodes, edges)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (document_id, chunk_index, config_id, nodes, edges))
-            conn.commit()
-            response_id = cursor.lastrowid
-            logging.info(f"L2 - Inserted response with ID {response_id} for doc={document_id}, chunk_index={chunk_index}, config_id={config_id}.")
-            return response_id
+        ''', (document_id, config_id))
+        return dict(cursor.fetchall())
 
     except sqlite3.Error as e:
-        logging.error(f"L2 - Error while inserting/updating response for doc={document_id}, chunk_index={chunk_index}, config_id={config_id}: {e}")
-        return None
+        logging.error(f"An error occurred while reading chunk hashes for document ID {document_id}: {e}")
+        return {}
 
 
-def get_all_L1_responses_for(document_id, config_id):
+RESPONSE_TABLES = ["Responses", "Responses_L1", "ResponseNodes", "ResponseEdges"]
+
+
+def _delete_response_rows(conn, condition, params):
+    """Deletes the responses matching condition; returns how many response rows were removed."""
+    deleted = 0
+    for table in RESPONSE_TABLES:
+        cursor = conn.executemany(f'DELETE FROM {table} WHERE {condition}', params)
+        if table in ("Responses", "Responses_L1"):
+            deleted += max(cursor.rowcount, 0)
+    return deleted
+
+
+MERGE_STATE_TABLES = ("GraphMergeState", "MergeContributions", "MergeEntities", "MergeEdges")
+
+
+def _drop_merge_states(conn, keys):
+    # A response that is deleted and written again starts at revision 0, which the stored merge
+    # state could mistake for the old one; without a state the next merge starts from scratch.
+    for table in MERGE_STATE_TABLES:
+        conn.executemany(f'DELETE FROM {table} WHERE document_id = ? AND config_id = ?', keys)
+
+
+def delete_responses(keys):
+    """Deletes the L1 and L2 responses of (document_id, config_id, chunk_index) keys in one transaction."""
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return False
+
+    try:
+        with conn:
+            deleted = _delete_response_rows(conn, 'document_id = ? AND config_id = ? AND chunk_index = ?', keys)
+            if deleted:
+                _drop_merge_states(conn, list({(document_id, config_id) for document_id, config_id, _ in keys}))
+        if deleted:
+            logging.info(f"Deleted {deleted} responses made from outdated chunk text.")
+        return True
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while deleting {len(keys)} outdated responses: {e}")
+        return False
+
+
+def delete_responses_from(document_id, config_id, chunk_count):
+    """Deletes the responses and chunk hashes of chunk indices the document no longer has."""
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return False
+
+    try:
+        params = [(document_id, config_id, chunk_count)]
+        with conn:
+            deleted = _delete_response_rows(conn, 'document_id = ? AND config_id = ? AND chunk_index >= ?', params)
+            conn.executemany('DELETE FROM Chunks WHERE document_id = ? AND config_id = ? AND chunk_index >= ?', params)
+            if deleted:
+                _drop_merge_states(conn, [(document_id, config_id)])
+        if deleted:
+            logging.info(f"Deleted {deleted} responses past the last chunk ({chunk_count}) of document ID {document_id}.")
+        return True
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while deleting responses past chunk {chunk_count} of document ID {document_id}: {e}")
+        return False
+
+
+def get_cached_response(prompt_hash, touch=True):
+    """Returns the cached response; touch=False leaves the LRU update to touch_cached_responses()."""
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return None
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT response
+            FROM PromptCache
+            WHERE prompt_hash = ?
+        ''', (prompt_hash,))
+        result = cursor.fetchone()
+        if result is None:
+            return None
+
+        if touch:
+            cursor.execute('''
+                UPDATE PromptCache
+                SET last_used = (SELECT MAX(last_used) + 1 FROM PromptCache)
+                WHERE prompt_hash = ?
+            ''', (prompt_hash,))
+            conn.commit()
+        return result[0]
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while reading the prompt cache: {e}")
+        return None
+
+
+def touch_cached_responses(prompt_hashes):
+    """Marks the given entries as used, in order, in a single transaction."""
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return False
+
+    try:
+        with conn:
+            conn.executemany('''
+                UPDATE PromptCache
+                SET last_used = (SELECT MAX(last_used) + 1 FROM PromptCache)
+                WHERE prompt_hash = ?
+            ''', [(prompt_hash,) for prompt_hash in prompt_hashes])
+        return True
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while updating {len(prompt_hashes)} prompt cache entries: {e}")
+        return False
+
+
+def insert_cached_responses(rows, max_entries):
+    """Stores (prompt_hash, response) rows and evicts the least recently used entries beyond max_entries.
+
+    last_used is a logical clock rather than a timestamp, so the LRU order does not depend on timer resolution.
+    """
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return False
+
+    try:
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT OR REPLACE INTO PromptCache (prompt_hash, response, last_used)
+            VALUES (?, ?, (SELECT COALESCE(MAX(last_used), 0) + 1 FROM PromptCache))
+        ''', rows)
+
+        cursor.execute('''
+            DELETE FROM PromptCache
+            WHERE prompt_hash IN (
+                SELECT prompt_hash
+                FROM PromptCache
+                ORDER BY last_used
+                LIMIT max(0, (SELECT COUNT(*) FROM PromptCache) - ?)
+            )
+        ''', (max_entries,))
+        if cursor.rowcount > 0:
+            logging.info(f"Evicted {cursor.rowcount} entries from the prompt cache.")
+
+        conn.commit()
+        return True
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while writing the prompt cache: {e}")
+        return False
+
+
+def print_database_summary():
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return
+
+    try:
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        tables = cursor.fetchall()
+
+        if not tables:
+            logging.info("No tables found in the database.")
+            return
+
+        logging.info("Database Summary:")
+        for (table_name,) in tables:
+            logging.info(f"\nTable: {table_name}")
+            cursor.execute(f"PRAGMA table_info({table_name})")
+            columns = cursor.fetchall()
+
+            for col in columns:
+                col_id, col_name, col_type, col_notnull, col_default, col_pk = col
+                logging.info(
+                    f"  Column: {col_name} | Type: {col_type} | "
+                    f"NotNull: {'Yes' if col_notnull else 'No'} | "
+                    f"Primary Key: {'Yes' if col_pk else 'No'}"
+                )
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while printing the database summary: {e}")
+
+
+def response_exists_L1(document_id, chunk_index, config_id):
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return False
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT 1 
+            FROM Responses_L1 
+            WHERE document_id = ? 
+              AND chunk_index = ?
+              AND config_id = ?
+        ''', (document_id, chunk_index, config_id))
+        result = cursor.fetchone()
+
+        if result:
+            logging.info(f"L1 - Response exists for document ID={document_id}, chunk_index={chunk_index}, config_id={config_id}.")
+            return True
+        else:
+            logging.info(f"L1 - No response found for document ID={document_id}, chunk_index={chunk_index}, config_id={config_id}.")
+            return False
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while checking L1 response existence: {e}")
+        return False
+
+
+def response_exists(document_id, chunk_index, config_id):
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return False
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT 1 
+            FROM Responses
+            WHERE document_id = ?
+              AND chunk_index = ?
+              AND config_id = ?
+        ''', (document_id, chunk_index, config_id))
+        result = cursor.fetchone()
+
+        if result:
+            logging.info(f"L2 - Response exists for document ID={document_id}, chunk_index={chunk_index}, config_id={config_id}.")
+            return True
+        else:
+            logging.info(f"L2 - No response found for document ID={document_id}, chunk_index={chunk_index}, config_id={config_id}.")
+            return False
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while checking L2 response existence: {e}")
+        return False
+
+
+def get_response_chunk_indices(document_id, config_id):
+    """Returns the set of chunk indices that already have a response, in one query."""
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return set()
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT chunk_index
+            FROM Responses
+            WHERE document_id = ?
+              AND config_id = ?
+        ''', (document_id, config_id))
+        chunk_indices = {row[0] for row in cursor.fetchall()}
+        logging.info(f"Found {len(chunk_indices)} responses for document ID={document_id}, config_id={config_id}.")
+        return chunk_indices
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while listing responses: {e}")
+        return set()
+
+
+def get_response_L1_chunk_indices(document_id, config_id):
+    """Returns the set of chunk indices that already have an L1 response, in one query."""
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return set()
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT chunk_index
+            FROM Responses_L1
+            WHERE document_id = ?
+              AND config_id = ?
+        ''', (document_id, config_id))
+        chunk_indices = {row[0] for row in cursor.fetchall()}
+        logging.info(f"L1 - Found {len(chunk_indices)} responses for document ID={document_id}, config_id={config_id}.")
+        return chunk_indices
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while listing L1 responses: {e}")
+        return set()
+
+
+def insert_responses_bulk(rows):
+    """Upserts (document_id, chunk_index, config_id, nodes, edges) rows and their typed rows in a single transaction."""
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return False
+
+    try:
+        with conn:
+            conn.executemany('''
+                INSERT INTO Responses (document_id, chunk_index, config_id, nodes, edges)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (document_id, config_id, chunk_index)
+                DO UPDATE SET nodes = excluded.nodes, edges = excluded.edges, revision = revision + 1
+            ''', rows)
+            _replace_response_records(conn, rows)
+        logging.info(f"L2 - Saved {len(rows)} responses in one transaction.")
+        return True
+
+    except sqlite3.Error as e:
+        logging.error(f"L2 - Error while saving {len(rows)} responses: {e}")
+        return False
+
+
+def insert_responses_L1_bulk(rows):
+    """Upserts (document_id, chunk_index, config_id, nodes) rows in a single transaction."""
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return False
+
+    try:
+        with conn:
+            conn.executemany('''
+                INSERT INTO Responses_L1 (document_id, chunk_index, config_id, nodes)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (document_id, config_id, chunk_index)
+                DO UPDATE SET nodes = excluded.nodes
+            ''', rows)
+        logging.info(f"L1 - Saved {len(rows)} responses in one transaction.")
+        return True
+
+    except sqlite3.Error as e:
+        logging.error(f"L1 - Error while saving {len(rows)} responses: {e}")
+        return False
+
+
+def insert_chunk_hashes_bulk(rows):
+    """Stores (document_id, config_id, chunk_index, text_hash) rows in a single transaction."""
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return False
+
+    try:
+        with conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO Chunks (document_id, config_id, chunk_index, text_hash)
+                VALUES (?, ?, ?, ?)
+            ''', rows)
+        return True
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while storing {len(rows)} chunk hashes: {e}")
+        return False
+
+
+def insert_response_L1(document_id, chunk_index, config_id, nodes):
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return None
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO Responses_L1 (document_id, chunk_index, config_id, nodes)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (document_id, config_id, chunk_index)
+            DO UPDATE SET nodes = excluded.nodes
+            RETURNING id
+        ''', (document_id, chunk_index, config_id, nodes))
+        response_id = cursor.fetchone()[0]
+        conn.commit()
+        logging.info(f"L1 - Saved response with ID {response_id} for doc={document_id}, chunk_index={chunk_index}, config_id={config_id}.")
+        logging.info(f"L1 - {nodes}")
+        return response_id
+
+    except sqlite3.Error as e:
+        logging.error(f"L1 - Error while inserting/updating response for doc={document_id}, chunk_index={chunk_index}, config_id={config_id}: {e}")
+        return None
+
+
+def insert_response(document_id, chunk_index, config_id, nodes, edges):
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return None
+
+    try:
+        with conn:
+            cursor = conn.execute('''
+                INSERT INTO Responses (document_id, chunk_index, config_id, nodes, edges)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (document_id, config_id, chunk_index)
+                DO UPDATE SET nodes = excluded.nodes, edges = excluded.edges, revision = revision + 1
+                RETURNING id
+            ''', (document_id, chunk_index, config_id, nodes, edges))
+            response_id = cursor.fetchone()[0]
+            _replace_response_records(conn, [(document_id, chunk_index, config_id, nodes, edges)])
+        logging.info(f"L2 - Saved response with ID {response_id} for doc={document_id}, chunk_index={chunk_index}, config_id={config_id}.")
+        return response_id
+
+    except sqlite3.Error as e:
+        logging.error(f"L2 - Error while inserting/updating response for doc={document_id}, chunk_index={chunk_index}, config_id={config_id}: {e}")
+        return None
+
+
+def reuse_response_L1(document_id, chunk_index, config_id, text_hash):
+    """Copies the L1 response of another chunk with identical text onto this chunk and returns its nodes."""
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return None
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT R.nodes
+            FROM Chunks C
+            JOIN Responses_L1 R
+              ON R.document_id = C.document_id
+             AND R.config_id = C.config_id
+             AND R.chunk_index = C.chunk_index
+            WHERE C.config_id = ?
+              AND C.text_hash = ?
+              AND NOT (C.document_id = ? AND C.chunk_index = ?)
+            LIMIT 1
+        ''', (config_id, text_hash, document_id, chunk_index))
+        result = cursor.fetchone()
+
+    except sqlite3.Error as e:
+        logging.error(f"L1 - Error while looking up reusable response for chunk_index={chunk_index}: {e}")
+        return None
+
+    if not result:
+        return None
+
+    if insert_response_L1(document_id, chunk_index, config_id, result[0]) is None:
+        return None
+    return result[0]
+
+
+def reuse_response(document_id, chunk_index, config_id, text_hash):
+    """Copies the response of another chunk with identical text onto this chunk."""
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return None
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT R.nodes, R.edges
+            FROM Chunks C
+            JOIN Responses R
+              ON R.document_id = C.document_id
+             AND R.config_id = C.config_id
+             AND R.chunk_index = C.chunk_index
+            WHERE C.config_id = ?
+              AND C.text_hash = ?
+              AND NOT (C.document_id = ? AND C.chunk_index = ?)
+            LIMIT 1
+        ''', (config_id, text_hash, document_id, chunk_index))
+        result = cursor.fetchone()
+
+    except sqlite3.Error as e:
+        logging.error(f"L2 - Error while looking up reusable response for chunk_index={chunk_index}: {e}")
+        return None
+
+    if not result:
+        return None
+
+    nodes, edges = result
+    return insert_response(document_id, chunk_index, config_id, nodes, edges)
+
+
+def get_all_L1_responses_for(document_id, config_id):
     conn = get_connection()
     if conn is None:
         logging.error("Database connection is not available.")
@@ -489,6 +1276,460 @@ def get_all_responses_for(document_id, config_id):
         return []
 
 
+def get_response_revisions(document_id, config_id):
+    """Returns {chunk_index: revision} without loading the response payloads."""
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return {}
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT chunk_index, revision
+            FROM Responses
+            WHERE document_id = ?
+              AND config_id = ?
+        ''', (document_id, config_id))
+        return dict(cursor.fetchall())
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while reading response revisions for document_id={document_id}: {e}")
+        return {}
+
+
+def get_response_records(document_id, config_id, chunk_indices):
+    """Returns {chunk_index: {'revision', 'nodes', 'edges'}} with the typed rows of the given chunks.
+
+    nodes holds (node_id, label, type) and edges (source, target, label) tuples in response order.
+    """
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return {}
+
+    chunk_indices = list(chunk_indices)
+    records = {}
+    try:
+        cursor = conn.cursor()
+        for start in range(0, len(chunk_indices), SQL_VARIABLE_BATCH_SIZE):
+            batch = chunk_indices[start:start + SQL_VARIABLE_BATCH_SIZE]
+            placeholders = ', '.join('?' for _ in batch)
+            params = (document_id, config_id, *batch)
+
+            cursor.execute(f'''
+                SELECT chunk_index, revision
+                FROM Responses
+                WHERE document_id = ?
+                  AND config_id = ?
+                  AND chunk_index IN ({placeholders})
+            ''', params)
+            for chunk_index, revision in cursor.fetchall():
+                records[chunk_index] = {'revision': revision, 'nodes': [], 'edges': []}
+
+            cursor.execute(f'''
+                SELECT chunk_index, node_id, label, type
+                FROM ResponseNodes
+                WHERE document_id = ?
+                  AND config_id = ?
+                  AND chunk_index IN ({placeholders})
+                ORDER BY rowid
+            ''', params)
+            for chunk_index, node_id, label, node_type in cursor.fetchall():
+                records[chunk_index]['nodes'].append((node_id, label, node_type))
+
+            cursor.execute(f'''
+                SELECT chunk_index, source, target, label
+                FROM ResponseEdges
+                WHERE document_id = ?
+                  AND config_id = ?
+                  AND chunk_index IN ({placeholders})
+                ORDER BY rowid
+            ''', params)
+            for chunk_index, source, target, label in cursor.fetchall():
+                records[chunk_index]['edges'].append((source, target, label))
+
+        logging.info(f"Retrieved {len(records)} of {len(chunk_indices)} requested responses for document_id={document_id}.")
+        return records
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while retrieving responses for document_id={document_id}: {e}")
+        return {}
+
+
+def get_merge_revisions(document_id, config_id):
+    """Returns {chunk_index: revision} of the chunks in the stored incremental merge, or None without one."""
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return None
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT 1
+            FROM GraphMergeState
+            WHERE document_id = ?
+              AND config_id = ?
+        ''', (document_id, config_id))
+        if cursor.fetchone() is None:
+            return None
+
+        cursor.execute('''
+            SELECT chunk_index, revision
+            FROM MergeContributions
+            WHERE document_id = ?
+              AND config_id = ?
+        ''', (document_id, config_id))
+        return dict(cursor.fetchall())
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while reading the merge revisions for document_id={document_id}: {e}")
+        return None
+
+
+def get_merge_state(document_id, config_id):
+    """Returns the stored merge state {'next_id', 'entities', 'edges'}, or None.
+
+    entities maps entity keys to {'id', 'label', 'types', 'count'}, edges maps
+    (source key, target key, label) to its count.
+    """
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return None
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT state
+            FROM GraphMergeState
+            WHERE document_id = ?
+              AND config_id = ?
+        ''', (document_id, config_id))
+        result = cursor.fetchone()
+        if result is None:
+            return None
+        state = {'next_id': json.loads(result[0])['next_id'], 'entities': {}, 'edges': {}}
+
+        cursor.execute('''
+            SELECT entity_key, entity_id, label, types, count
+            FROM MergeEntities
+            WHERE document_id = ?
+              AND config_id = ?
+        ''', (document_id, config_id))
+        for key, entity_id, label, types, count in cursor.fetchall():
+            state['entities'][key] = {'id': entity_id, 'label': label, 'types': json.loads(types), 'count': count}
+
+        cursor.execute('''
+            SELECT source, target, label, count
+            FROM MergeEdges
+            WHERE document_id = ?
+              AND config_id = ?
+        ''', (document_id, config_id))
+        state['edges'] = {(source, target, label): count for source, target, label, count in cursor.fetchall()}
+        return state
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while reading the merge state for document_id={document_id}: {e}")
+        return None
+
+
+def get_merge_contributions(document_id, config_id, chunk_indices):
+    """Returns {chunk_index: (nodes, edges)} of what the given chunks added to the merge state."""
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return {}
+
+    chunk_indices = list(chunk_indices)
+    contributions = {}
+    try:
+        cursor = conn.cursor()
+        for start in range(0, len(chunk_indices), SQL_VARIABLE_BATCH_SIZE):
+            batch = chunk_indices[start:start + SQL_VARIABLE_BATCH_SIZE]
+            placeholders = ', '.join('?' for _ in batch)
+            cursor.execute(f'''
+                SELECT chunk_index, nodes, edges
+                FROM MergeContributions
+                WHERE document_id = ?
+                  AND config_id = ?
+                  AND chunk_index IN ({placeholders})
+            ''', (document_id, config_id, *batch))
+            for chunk_index, nodes, edges in cursor.fetchall():
+                contributions[chunk_index] = (json.loads(nodes), json.loads(edges))
+        return contributions
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while reading merge contributions for document_id={document_id}: {e}")
+        return {}
+
+
+def _write_merge_rows(conn, document_id, config_id, entities, edges):
+    """Upserts entity and edge count rows; an entity of None or an edge count of 0 deletes the row."""
+    conn.executemany('''
+        DELETE FROM MergeEntities
+        WHERE document_id = ?
+          AND config_id = ?
+          AND entity_key = ?
+    ''', [(document_id, config_id, key) for key, entity in entities.items() if entity is None])
+    conn.executemany('''
+        INSERT OR REPLACE INTO MergeEntities (document_id, config_id, entity_key, entity_id, label, types, count)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [(document_id, config_id, key, entity['id'], entity['label'], json.dumps(entity['types']), entity['count'])
+          for key, entity in entities.items() if entity is not None])
+
+    conn.executemany('''
+        DELETE FROM MergeEdges
+        WHERE document_id = ?
+          AND config_id = ?
+          AND source = ?
+          AND target = ?
+          AND label = ?
+    ''', [(document_id, config_id, *edge) for edge, count in edges.items() if not count])
+    conn.executemany('''
+        INSERT OR REPLACE INTO MergeEdges (document_id, config_id, source, target, label, count)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(document_id, config_id, *edge, count) for edge, count in edges.items() if count])
+
+
+def save_merge_state(document_id, config_id, next_id, entities, edges, contributions, removed_chunks):
+    """Stores the changed parts of the merge state together with the chunk contributions in one transaction.
+
+    entities and edges only hold the rows the merge touched, as {key: entity or None} and
+    {(source, target, label): count}; contributions holds (chunk_index, revision, nodes, edges) rows.
+    """
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return False
+
+    try:
+        with conn:
+            conn.execute('''
+                INSERT INTO GraphMergeState (document_id, config_id, state)
+                VALUES (?, ?, ?)
+                ON CONFLICT (document_id, config_id) DO UPDATE SET state = excluded.state
+            ''', (document_id, config_id, json.dumps({'next_id': next_id})))
+            _write_merge_rows(conn, document_id, config_id, entities, edges)
+            conn.executemany('''
+                DELETE FROM MergeContributions
+                WHERE document_id = ?
+                  AND config_id = ?
+                  AND chunk_index = ?
+            ''', [(document_id, config_id, chunk_index) for chunk_index in removed_chunks])
+            conn.executemany('''
+                INSERT OR REPLACE INTO MergeContributions
+                (document_id, config_id, chunk_index, revision, nodes, edges)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [(document_id, config_id, chunk_index, revision, json.dumps(nodes), json.dumps(edges))
+                  for chunk_index, revision, nodes, edges in contributions])
+        logging.info(f"Saved merge state for document ID {document_id} ({len(contributions)} chunks updated, "
+                     f"{len(removed_chunks)} removed, {len(entities)} entities and {len(edges)} edges changed).")
+        return True
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while saving the merge state for document ID {document_id}: {e}")
+        return False
+
+
+def delete_merge_state(document_id, config_id):
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return False
+
+    try:
+        with conn:
+            _drop_merge_states(conn, [(document_id, config_id)])
+        return True
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while deleting the merge state for document ID {document_id}: {e}")
+        return False
+
+
+def iter_graphs(document_ids, config_id):
+    """Yields (document_id, nodes, edges) of the stored document graphs one document at a time.
+
+    nodes holds (node_id, label, type) and edges (source, target, label) tuples.
+    """
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return
+
+    for document_id in document_ids:
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT 1
+                FROM Graphs
+                WHERE document_id = ?
+                  AND config_id = ?
+            ''', (document_id, config_id))
+            if cursor.fetchone() is None:
+                logging.warning(f"No stored graph for document ID {document_id}, config_id={config_id}.")
+                continue
+
+            cursor.execute('''
+                SELECT node_id, label, type
+                FROM GraphNodes
+                WHERE document_id = ?
+                  AND config_id = ?
+                ORDER BY rowid
+            ''', (document_id, config_id))
+            nodes = cursor.fetchall()
+
+            cursor.execute('''
+                SELECT source, target, label
+                FROM GraphEdges
+                WHERE document_id = ?
+                  AND config_id = ?
+                ORDER BY rowid
+            ''', (document_id, config_id))
+            edges = cursor.fetchall()
+
+        except sqlite3.Error as e:
+            logging.error(f"An error occurred while reading the graph of document ID {document_id}: {e}")
+            continue
+
+        yield document_id, nodes, edges
+
+
+def get_graph_hashes(document_ids, config_id):
+    """Returns {document_id: content_hash} of the documents that have a stored graph."""
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return {}
+
+    document_ids = list(document_ids)
+    hashes = {}
+    try:
+        cursor = conn.cursor()
+        for start in range(0, len(document_ids), SQL_VARIABLE_BATCH_SIZE):
+            batch = document_ids[start:start + SQL_VARIABLE_BATCH_SIZE]
+            placeholders = ', '.join('?' for _ in batch)
+            cursor.execute(f'''
+                SELECT document_id, content_hash
+                FROM Graphs
+                WHERE config_id = ?
+                  AND document_id IN ({placeholders})
+            ''', (config_id, *batch))
+            hashes.update(cursor.fetchall())
+        return hashes
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while reading graph hashes: {e}")
+        return {}
+
+
+def get_composite(composite_key):
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return None
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT state
+            FROM CompositeGraphs
+            WHERE composite_key = ?
+        ''', (composite_key,))
+        result = cursor.fetchone()
+        if result is None:
+            return None
+
+        cursor.execute('''
+            UPDATE CompositeGraphs
+            SET last_used = (SELECT MAX(last_used) + 1 FROM CompositeGraphs)
+            WHERE composite_key = ?
+        ''', (composite_key,))
+        conn.commit()
+        return json.loads(result[0])
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while reading composite graph {composite_key}: {e}")
+        return None
+
+
+def get_composite_members():
+    """Returns {composite_key: members} of all cached composites, without their states."""
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return {}
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT composite_key, members FROM CompositeGraphs')
+        return {key: json.loads(members) for key, members in cursor.fetchall()}
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while listing composite graphs: {e}")
+        return {}
+
+
+def save_composite(composite_key, members, state, max_entries):
+    """Stores a composite merge state and evicts the least recently used composites beyond max_entries."""
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return False
+
+    try:
+        with conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO CompositeGraphs (composite_key, members, state, last_used)
+                VALUES (?, ?, ?, (SELECT COALESCE(MAX(last_used), 0) + 1 FROM CompositeGraphs))
+            ''', (composite_key, json.dumps(members), json.dumps(state)))
+            conn.execute('''
+                DELETE FROM CompositeGraphs
+                WHERE composite_key IN (
+                    SELECT composite_key
+                    FROM CompositeGraphs
+                    ORDER BY last_used
+                    LIMIT max(0, (SELECT COUNT(*) FROM CompositeGraphs) - ?)
+                )
+            ''', (max_entries,))
+        logging.info(f"Saved composite graph {composite_key} with {len(members)} documents.")
+        return True
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while saving composite graph {composite_key}: {e}")
+        return False
+
+
+def update_graph_metadata(document_id, config_id, metadata):
+    """Sets the metadata of a stored graph; the row is only written when the metadata differs."""
+    conn = get_connection()
+    if conn is None:
+        logging.error("Database connection is not available.")
+        return False
+
+    if not isinstance(metadata, str):
+        metadata = json.dumps(metadata)
+
+    try:
+        with conn:
+            cursor = conn.execute('''
+                UPDATE Graphs
+                SET metadata = ?
+                WHERE document_id = ?
+                  AND config_id = ?
+                  AND metadata IS NOT ?
+            ''', (metadata, document_id, config_id, metadata))
+        if cursor.rowcount > 0:
+            logging.info(f"Updated the graph metadata of document ID {document_id}.")
+        return True
+
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while updating the graph metadata of document ID {document_id}: {e}")
+        return False
+
+
 def insert_graph(document_id, config_id, nodes, edges, metadata):
     logging.info(f"Insert graph. Document ID {document_id} config_id {config_id}")
     conn = get_connection()
@@ -496,6 +1737,9 @@ def insert_graph(document_id, config_id, nodes, edges, metadata):
         logging.error("Database connection is not available.")
         return None
 
+    if not isinstance(metadata, str):
+        metadata = json.dumps(metadata)
+
     try:
         cursor = conn.cursor()
 
@@ -518,9 +1762,10 @@ def insert_graph(document_id, config_id, nodes, edges, metadata):
             logging.info(f"Deleted existing graph with ID {existing_id} for document ID {document_id}.")
 
         cursor.execute('''
-            INSERT INTO Graphs (document_id, config_id, nodes, edges, metadata)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (document_id, config_id, nodes, edges, metadata))
+            INSERT INTO Graphs (document_id, config_id, nodes, edges, metadata, content_hash)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (document_id, config_id, nodes, edges, metadata, _graph_content_hash(nodes, edges)))
+        _replace_graph_records(conn, document_id, config_id, nodes, edges)
         conn.commit()
         graph_id = cursor.lastrowid
         logging.info(f"Inserted new graph with ID {graph_id} for document ID {document_id}.")